@@ -0,0 +1,25 @@
+"""Add item (owner_id, id) index
+
+Revision ID: 3f9a1c7d2b64
+Revises: d4867f3a4c0a
+Create Date: 2026-10-17 12:45:10.215934
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "3f9a1c7d2b64"
+down_revision = "d4867f3a4c0a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_item_owner_id_id", "item", ["owner_id", "id"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index("ix_item_owner_id_id", table_name="item")
@@ -0,0 +1,35 @@
+"""Drop unused indexes
+
+Primary keys are already indexed, and no query filters or sorts by
+item title/description or user full name; item lookups by owner go
+through ix_item_owner_id_id.
+
+Revision ID: 8b2e5d0f4a17
+Revises: 3f9a1c7d2b64
+Create Date: 2026-10-17 15:02:41.538201
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "8b2e5d0f4a17"
+down_revision = "3f9a1c7d2b64"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index("ix_item_title", table_name="item")
+    op.drop_index("ix_item_id", table_name="item")
+    op.drop_index("ix_item_description", table_name="item")
+    op.drop_index("ix_user_id", table_name="user")
+    op.drop_index("ix_user_full_name", table_name="user")
+
+
+def downgrade():
+    op.create_index("ix_user_full_name", "user", ["full_name"], unique=False)
+    op.create_index("ix_user_id", "user", ["id"], unique=False)
+    op.create_index("ix_item_description", "item", ["description"], unique=False)
+    op.create_index("ix_item_id", "item", ["id"], unique=False)
+    op.create_index("ix_item_title", "item", ["title"], unique=False)
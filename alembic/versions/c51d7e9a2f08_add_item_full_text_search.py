@@ -0,0 +1,32 @@
+"""Add item full-text search
+
+The generated column and its GIN index are not part of the mapped
+metadata (see ITEM_SEARCH_DDL in src/adapters/orm.py).
+
+Revision ID: c51d7e9a2f08
+Revises: 8b2e5d0f4a17
+Create Date: 2026-10-17 16:20:07.904113
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "c51d7e9a2f08"
+down_revision = "8b2e5d0f4a17"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "ALTER TABLE item ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+        "(to_tsvector('english', coalesce(title, '') || ' ' || "
+        "coalesce(description, ''))) STORED"
+    )
+    op.execute("CREATE INDEX ix_item_search_vector ON item USING gin (search_vector)")
+
+
+def downgrade():
+    op.drop_index("ix_item_search_vector", table_name="item")
+    op.drop_column("item", "search_vector")
@@ -0,0 +1,38 @@
+"""Add item_owner_count
+
+Revision ID: e7a4b6c81d39
+Revises: c51d7e9a2f08
+Create Date: 2026-10-17 17:41:26.118420
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e7a4b6c81d39"
+down_revision = "c51d7e9a2f08"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "item_owner_count",
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["owner_id"],
+            ["user.id"],
+        ),
+        sa.PrimaryKeyConstraint("owner_id"),
+    )
+    op.execute(
+        "INSERT INTO item_owner_count (owner_id, count) "
+        "SELECT owner_id, COUNT(*) FROM item "
+        "WHERE owner_id IS NOT NULL GROUP BY owner_id"
+    )
+
+
+def downgrade():
+    op.drop_table("item_owner_count")
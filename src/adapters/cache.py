@@ -0,0 +1,146 @@
+"""Caches: in-process LRU and a shared Redis-backed one."""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import json
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from src.config import settings
+
+
+class AbstractCache(ABC):
+    """Cache interface"""
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any, expires_at: float = None) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: Hashable) -> None:
+        raise NotImplementedError
+
+
+class LRUCache(AbstractCache):
+    """Thread-safe bounded LRU cache with per-entry expiration.
+
+    Every entry lives at most `ttl` seconds; a caller may shorten that
+    by passing an absolute `expires_at` timestamp (e.g. a JWT `exp` claim).
+    A cache with `maxsize` or `ttl` set to 0 is disabled.
+    """
+
+    def __init__(
+        self, maxsize: int, ttl: float, timer: Callable[[], float] = time.time
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._data = OrderedDict()  # type: OrderedDict[Hashable, Tuple[Any, float]]
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a live value or None."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at <= self.timer():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: float = None) -> None:
+        """Store a value, evicting the least recently used one when full."""
+        if not self.enabled:
+            return
+
+        deadline = self.timer() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+
+        with self._lock:
+            self._data[key] = (value, deadline)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisCache(AbstractCache):
+    """Cache shared between processes.
+
+    Values must be JSON-serializable. `client` is anything with the
+    `get`, `set(name, value, ex=...)` and `delete` methods of `redis.Redis`,
+    so a local fake can be used in tests.
+    """
+
+    def __init__(self, client: Any, ttl: int, prefix: str = ""):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.prefix}{key}"
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        raw = self.client.get(self._key(key))
+        if raw is None:
+            return None
+
+        return json.loads(raw)
+
+    def set(self, key: Hashable, value: Any, expires_at: float = None) -> None:
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, int(expires_at - time.time()))
+        if ttl <= 0:
+            return
+
+        self.client.set(self._key(key), json.dumps(value), ex=ttl)
+
+    def delete(self, key: Hashable) -> None:
+        self.client.delete(self._key(key))
+
+
+def create_cache(
+    backend: str, maxsize: int, ttl: int, prefix: str = ""
+) -> AbstractCache:
+    """Create a cache by backend name: "memory", "redis" or "none"."""
+    if backend == "memory":
+        return LRUCache(maxsize=maxsize, ttl=ttl)
+
+    if backend == "redis":
+        import redis  # optional dependency
+
+        client = redis.Redis.from_url(settings.REDIS_URL)
+        return RedisCache(client, ttl=ttl, prefix=prefix)
+
+    if backend == "none":
+        return LRUCache(maxsize=0, ttl=0)
+
+    raise ValueError(f"Unknown cache backend: {backend}")
@@ -0,0 +1,86 @@
+"""Index usage statistics of the database."""
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import exc, inspect, text
+from sqlalchemy.engine import Connection
+
+
+class IndexStats(NamedTuple):
+    table: str
+    name: str
+    # on-disk size, None when the database can't tell
+    size_bytes: Optional[int]
+    # index scans since the statistics were reset, None when not tracked
+    scans: Optional[int]
+    # backs a primary key or unique constraint, so needed even when not scanned
+    unique: bool
+
+    @property
+    def unused(self) -> bool:
+        return self.scans == 0 and not self.unique
+
+
+_POSTGRES_QUERY = text(
+    """
+    SELECT s.relname AS table_name,
+           s.indexrelname AS index_name,
+           pg_relation_size(s.indexrelid) AS size_bytes,
+           s.idx_scan AS scans,
+           i.indisunique AS is_unique
+    FROM pg_stat_user_indexes s
+    JOIN pg_index i ON i.indexrelid = s.indexrelid
+    ORDER BY size_bytes DESC, table_name, index_name
+    """
+)
+
+
+def _postgres_index_stats(connection: Connection) -> List[IndexStats]:
+    return [
+        IndexStats(
+            table=row.table_name,
+            name=row.index_name,
+            size_bytes=row.size_bytes,
+            scans=row.scans,
+            unique=row.is_unique,
+        )
+        for row in connection.execute(_POSTGRES_QUERY)
+    ]
+
+
+def _sqlite_index_stats(connection: Connection) -> List[IndexStats]:
+    """SQLite keeps no scan counts; sizes need the `dbstat` table compiled in."""
+    try:
+        sizes = dict(
+            connection.execute(
+                text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+            ).fetchall()
+        )
+    except exc.OperationalError:
+        sizes = {}
+
+    stats = []
+    for table in inspect(connection).get_table_names():
+        index_list = connection.execute(text(f'PRAGMA index_list("{table}")'))
+        for row in index_list.mappings():
+            stats.append(
+                IndexStats(
+                    table=table,
+                    name=row["name"],
+                    size_bytes=sizes.get(row["name"]),
+                    scans=None,
+                    unique=bool(row["unique"]),
+                )
+            )
+
+    return sorted(stats, key=lambda s: (-(s.size_bytes or 0), s.table, s.name))
+
+
+def index_stats(connection: Connection) -> List[IndexStats]:
+    """Indexes of the user tables, largest first."""
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        return _postgres_index_stats(connection)
+    if dialect == "sqlite":
+        return _sqlite_index_stats(connection)
+
+    raise NotImplementedError(f"No index statistics for {dialect}")
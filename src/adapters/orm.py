@@ -1,13 +1,20 @@
 """Adapters to ORM."""
 
 from sqlalchemy import (
+    DDL,
+    BigInteger,
     Boolean,
     Column,
+    DateTime,
     ForeignKey,
+    Index,
     Integer,
     MetaData,
     String,
     Table,
+    Text,
+    event,
+    func,
 )
 from sqlalchemy.orm import mapper, relationship
 
@@ -20,8 +27,8 @@ metadata = MetaData()
 users = Table(
     "user",
     metadata,
-    Column("id", Integer, primary_key=True, index=True),
-    Column("full_name", String, index=True),
+    Column("id", Integer, primary_key=True),
+    Column("full_name", String),
     Column("email", String, unique=True, index=True, nullable=False),
     Column("hashed_password", String, nullable=False),
     Column("is_active", Boolean, default=True),
@@ -32,27 +39,90 @@ users = Table(
 items = Table(
     "item",
     metadata,
-    Column("id", Integer, primary_key=True, index=True),
-    Column("title", String, index=True),
-    Column("description", String, index=True),
+    Column("id", Integer, primary_key=True),
+    Column("title", String),
+    Column("description", String),
     Column("owner_id", Integer, ForeignKey("user.id")),
+    # keyset pagination of `list_by_owner`: owner_id = ? AND id > ? ORDER BY id,
+    # also serves lookups by owner_id alone
+    Index("ix_item_owner_id_id", "owner_id", "id"),
 )
 
+# item count per owner, maintained by the item service for estimated totals
+item_owner_counts = Table(
+    "item_owner_count",
+    metadata,
+    Column("owner_id", Integer, ForeignKey("user.id"), primary_key=True),
+    Column("count", Integer, nullable=False, default=0),
+)
+
+# events written in the transaction of the change they describe,
+# published by the outbox relay and deleted once sent
+outbox = Table(
+    "outbox",
+    metadata,
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True),
+    Column("topic", String, nullable=False),
+    Column("event", String, nullable=False),
+    Column("payload", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False, server_default=func.now()),
+)
+
+
+# Full-text search over item title and description, kept out of the mapping:
+# a generated `tsvector` column on PostgreSQL (see the alembic revision),
+# an external-content FTS5 table maintained by triggers on SQLite.
+ITEM_SEARCH_DDL = {
+    "postgresql": [
+        "ALTER TABLE item ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+        "(to_tsvector('english', coalesce(title, '') || ' ' || "
+        "coalesce(description, ''))) STORED",
+        "CREATE INDEX ix_item_search_vector ON item USING gin (search_vector)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE item_fts USING fts5("
+        "title, description, content='item', content_rowid='id')",
+        "CREATE TRIGGER item_fts_insert AFTER INSERT ON item BEGIN "
+        "INSERT INTO item_fts (rowid, title, description) "
+        "VALUES (new.id, new.title, new.description); END",
+        "CREATE TRIGGER item_fts_delete AFTER DELETE ON item BEGIN "
+        "INSERT INTO item_fts (item_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END",
+        "CREATE TRIGGER item_fts_update AFTER UPDATE ON item BEGIN "
+        "INSERT INTO item_fts (item_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO item_fts (rowid, title, description) "
+        "VALUES (new.id, new.title, new.description); END",
+    ],
+}
+
+for dialect, statements in ITEM_SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(items, "after_create", DDL(statement).execute_if(dialect=dialect))
+
 
 def start_mappers():
-    """Run classical mapping"""
+    """Run classical mapping
+
+    Relationships are never lazy loaded: repository methods returning them
+    load them eagerly, touching them otherwise raises.
+    """
     mapper(
         User,
         users,
         properties={
-            "items": relationship(Item, back_populates="owner"),
+            "items": relationship(
+                Item, back_populates="owner", lazy="raise", order_by=items.c.id
+            ),
         },
+        eager_defaults=True,
     )
 
     mapper(
         Item,
         items,
         properties={
-            "owner": relationship(User, back_populates="items"),
+            "owner": relationship(User, back_populates="items", lazy="raise"),
         },
+        eager_defaults=True,
     )
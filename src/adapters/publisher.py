@@ -0,0 +1,135 @@
+"""Process-wide Pub/Sub publisher."""
+import asyncio
+from concurrent.futures import CancelledError, Future
+import functools
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Union
+
+from fastapi.concurrency import run_in_threadpool
+from google.cloud import pubsub_v1
+
+from src.config import settings
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class Publisher:
+    """One PublisherClient, so one gRPC channel, shared by the process.
+
+    The client batches messages per topic by `batch_settings` and bounds
+    those not yet sent by `flow_control`. `publish` hands back the client
+    future at once; the outcome is counted and failures are logged from
+    its done callback, nothing waits for it unless the caller does.
+    """
+
+    def __init__(
+        self,
+        batch_settings: pubsub_v1.types.BatchSettings,
+        flow_control: pubsub_v1.types.PublishFlowControl,
+        client_factory: Callable[..., Any] = pubsub_v1.PublisherClient,
+    ):
+        self.batch_settings = batch_settings
+        self.flow_control = flow_control
+        self.client_factory = client_factory
+        self._client = None  # type: Any
+        self._pid = None  # type: Optional[int]
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.published = 0
+        self.failed = 0
+
+    @property
+    def client(self) -> Any:
+        # created lazily, and again in a forked child: a gRPC channel
+        # can't be shared across fork
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                self._client = self.client_factory(
+                    batch_settings=self.batch_settings,
+                    publisher_options=pubsub_v1.types.PublisherOptions(
+                        flow_control=self.flow_control
+                    ),
+                )
+                self._pid = os.getpid()
+            return self._client
+
+    def publish(
+        self, project_id: str, topic_id: str, data: Union[str, bytes], **attrs: str
+    ) -> Future:
+        """Queue a message for its topic batch, the future gets its message id.
+
+        Blocks only while flow control holds back too many unsent messages
+        (with the default "block" behavior).
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        topic_path = self.client_factory.topic_path(project_id, topic_id)
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self.client.publish(topic_path, data, **attrs)
+        except Exception:
+            with self._lock:
+                self.pending -= 1
+                self.failed += 1
+            raise
+
+        future.add_done_callback(functools.partial(self._done, topic_path))
+        return future
+
+    async def publish_async(
+        self, project_id: str, topic_id: str, data: Union[str, bytes], **attrs: str
+    ) -> "asyncio.Future[str]":
+        """`publish` for the event loop, returns an awaitable of the message id."""
+        # queued from the threadpool, flow control may block
+        future = await run_in_threadpool(
+            self.publish, project_id, topic_id, data, **attrs
+        )
+        return asyncio.wrap_future(future)
+
+    def _done(self, topic_path: str, future: Future) -> None:
+        error = CancelledError() if future.cancelled() else future.exception()
+        with self._lock:
+            self.pending -= 1
+            if error is None:
+                self.published += 1
+            else:
+                self.failed += 1
+
+        if error is not None:
+            logger.error("Publishing to %s failed: %r", topic_path, error)
+
+    def stats(self) -> Dict[str, int]:
+        """Messages awaiting their outcome, published and failed."""
+        with self._lock:
+            return {
+                "pending": self.pending,
+                "published": self.published,
+                "failed": self.failed,
+            }
+
+    def stop(self) -> None:
+        """Send the batches still open and stop the client."""
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.stop()
+            self._client = None
+
+
+publisher = Publisher(
+    batch_settings=pubsub_v1.types.BatchSettings(
+        max_messages=settings.PUBSUB_BATCH_MAX_MESSAGES,
+        max_bytes=settings.PUBSUB_BATCH_MAX_BYTES,
+        max_latency=settings.PUBSUB_BATCH_MAX_LATENCY_MS / 1000,
+    ),
+    flow_control=pubsub_v1.types.PublishFlowControl(
+        message_limit=settings.PUBSUB_FLOW_CONTROL_MAX_MESSAGES,
+        byte_limit=settings.PUBSUB_FLOW_CONTROL_MAX_BYTES,
+        limit_exceeded_behavior=pubsub_v1.types.LimitExceededBehavior(
+            settings.PUBSUB_FLOW_CONTROL_BEHAVIOR
+        ),
+    ),
+)
@@ -1,10 +1,107 @@
 """Item repositories."""
 from abc import ABC, abstractmethod
-from typing import List, Optional, Set
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
+from sqlalchemy import (
+    and_,
+    bindparam,
+    cast,
+    column,
+    delete,
+    func,
+    inspect,
+    or_,
+    select,
+    table,
+)
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+
+from .sql import (
+    cached_statement,
+    copy_insert,
+    estimated_row_count,
+    export_statement,
+    get_by_id,
+    increment_statement,
+    upsert_statement,
+)
+from src.adapters.orm import item_owner_counts, items
 from src.domain.item import Item
 
 
+# full-text search objects created next to the `item` table (see orm.py)
+_item_search_vector = column("search_vector")
+_item_fts = table("item_fts", column("rowid"))
+
+
+def _fts5_query(text: str) -> str:
+    """Match all words of `text`, each quoted so no FTS5 syntax gets through."""
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in text.split())
+
+
+@cached_statement
+def _get():
+    return select(Item).where(Item.id == bindparam("id"))
+
+
+def _page(stmt, after: bool):
+    if after:
+        stmt = stmt.where(Item.id > bindparam("after_id"))
+
+    return stmt.order_by(Item.id).offset(bindparam("skip")).limit(bindparam("limit"))
+
+
+@cached_statement
+def _list():
+    return _page(select(Item), after=False)
+
+
+@cached_statement
+def _list_after():
+    return _page(select(Item), after=True)
+
+
+@cached_statement
+def _list_by_owner():
+    return _page(select(Item).where(Item.owner_id == bindparam("owner_id")), False)
+
+
+@cached_statement
+def _list_by_owner_after():
+    return _page(select(Item).where(Item.owner_id == bindparam("owner_id")), True)
+
+
+@cached_statement
+def _remove():
+    return (
+        delete(Item)
+        .where(Item.id == bindparam("id"))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _row(item: Item) -> dict:
+    return {
+        "id": item.id,
+        "title": item.title,
+        "description": item.description,
+        "owner_id": item.owner_id,
+    }
+
+
 class AbstractRepository(ABC):
     """Item repository interface"""
 
@@ -20,20 +117,81 @@ class AbstractRepository(ABC):
     def _add(self, item: Item):
         raise NotImplementedError
 
+    def add_many(self, items: List[Item]) -> List[Item]:
+        self._add_many(items)
+        self.modified.update(items)
+        return items
+
+    @abstractmethod
+    def _add_many(self, items: List[Item]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def import_rows(self, rows: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
     @abstractmethod
     def get(self, id: int) -> Optional[Item]:
         raise NotImplementedError
 
     @abstractmethod
-    def list(self, offset: int, limit: int) -> List[Item]:
+    def list(self, skip: int, limit: int, after_id: int = None) -> List[Item]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_by_owner(
+        self, owner_id: int, skip: int, limit: int, after_id: int = None
+    ) -> List[Item]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_with_owner(
+        self, skip: int, limit: int, after_id: int = None, owner_id: int = None
+    ) -> List[Item]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_by_ids(self, ids: Iterable[int], owner_id: int = None) -> List[Item]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self, owner_id: int = None) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def estimated_count(self, owner_id: int = None) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def change_owner_count(self, owner_id: int, delta: int) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(
+        self,
+        text: str,
+        limit: int,
+        owner_id: int = None,
+        after: Tuple[float, int] = None,
+    ) -> List[Tuple[Item, float]]:
         raise NotImplementedError
 
     @abstractmethod
-    def list_by_owner(self, owner_id: int, offset: int, limit: int) -> List[Item]:
+    def existing_ids(self, ids: Iterable[int]) -> Set[int]:
         raise NotImplementedError
 
     @abstractmethod
-    def remove(self, id: int) -> Optional[Item]:
+    def remove(self, id: int) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove_many(self, ids: Iterable[int], owner_id: int = None) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stream_rows(
+        self, columns: Sequence[str], batch_size: int
+    ) -> Iterator[List[Dict[str, Any]]]:
         raise NotImplementedError
 
 
@@ -43,43 +201,225 @@ class SqlAlchemyRepository(AbstractRepository):
         self.session = session
 
     def _add(self, item: Item):
-        """Create/update Item."""
-        if self.get(item.id):
-            self._update(item)
-        else:
-            self.session.add(item)
-
-    def _update(self, item: Item):
-        """Update User."""
-        self.session.query(Item).filter_by(id=item.id).update(
-            {
-                Item.title: item.title,
-                Item.description: item.description,
-                Item.owner_id: item.owner_id,
-            }
-        )
+        """Create/update Item without reading it first.
+
+        Loaded items are written by the flush (changed columns only),
+        new ones are inserted; an item built with an explicit id is upserted.
+        """
+        if inspect(item).transient and item.id is not None:
+            self.session.execute(
+                upsert_statement(self.session.get_bind().dialect, items, _row(item))
+            )
+            make_transient_to_detached(item)
+
+        self.session.add(item)
+
+    def _add_many(self, items: List[Item]):
+        """Insert new Items, batched by the flush into one multi-row statement."""
+        self.session.add_all(items)
+        self.session.flush(items)
+
+    def import_rows(self, rows: List[Dict[str, Any]]) -> None:
+        """Insert item rows (title, description, owner_id) in bulk.
+
+        The rows are not loaded as Items, so nothing is returned
+        or kept in the session.
+        """
+        copy_insert(self.session, items, ["title", "description", "owner_id"], rows)
 
     def get(self, id: int) -> Optional[Item]:
         """Get Item by id."""
-        return self.session.query(Item).get(id)
+        return get_by_id(self.session, Item, id, _get())
 
-    def list(self, skip: int, limit: int) -> List[Item]:
-        """Get Items."""
-        return (
-            self.session.query(Item).order_by(Item.id).offset(skip).limit(limit).all()
+    def list(self, skip: int, limit: int, after_id: int = None) -> List[Item]:
+        """Get Items, seeking past `after_id` if given."""
+        params = {"skip": skip, "limit": limit}
+        if after_id is None:
+            stmt = _list()
+        else:
+            stmt = _list_after()
+            params["after_id"] = after_id
+
+        return self.session.execute(stmt, params).scalars().all()
+
+    def list_by_owner(
+        self, owner_id: int, skip: int, limit: int, after_id: int = None
+    ) -> List[Item]:
+        """Get Items by owner, seeking past `after_id` if given."""
+        params = {"owner_id": owner_id, "skip": skip, "limit": limit}
+        if after_id is None:
+            stmt = _list_by_owner()
+        else:
+            stmt = _list_by_owner_after()
+            params["after_id"] = after_id
+
+        return self.session.execute(stmt, params).scalars().all()
+
+    def list_with_owner(
+        self, skip: int, limit: int, after_id: int = None, owner_id: int = None
+    ) -> List[Item]:
+        """Get Items (of `owner_id` if given) with their owner joined in."""
+        stmt = select(Item).options(joinedload(Item.owner))
+        if owner_id is not None:
+            stmt = stmt.where(Item.owner_id == owner_id)
+        if after_id is not None:
+            stmt = stmt.where(Item.id > after_id)
+
+        result = self.session.execute(
+            stmt.order_by(Item.id).offset(skip).limit(limit)
         )
+        return result.scalars().all()
+
+    def list_by_ids(self, ids: Iterable[int], owner_id: int = None) -> List[Item]:
+        """Get Items by ids, only those of `owner_id` if given."""
+        ids = list(ids)
+        if not ids:
+            return []
+
+        query = self.session.query(Item).filter(Item.id.in_(ids))
+        if owner_id is not None:
+            query = query.filter_by(owner_id=owner_id)
+
+        return query.order_by(Item.id).all()
+
+    def count(self, owner_id: int = None) -> int:
+        """Count Items, only those of `owner_id` if given."""
+        query = self.session.query(func.count(Item.id))
+        if owner_id is not None:
+            query = query.filter(Item.owner_id == owner_id)
+
+        return query.scalar()
 
-    def list_by_owner(self, owner_id: int, skip: int, limit: int) -> List[Item]:
-        """Get Items by owner."""
-        return (
-            self.session.query(Item)
-            .filter_by(owner_id=owner_id)
-            .order_by(Item.id)
-            .offset(skip)
-            .limit(limit)
-            .all()
+    def estimated_count(self, owner_id: int = None) -> int:
+        """Count Items without scanning them.
+
+        Per owner from the maintained counters, in total from planner
+        statistics (exactly if there are none).
+        """
+        if owner_id is not None:
+            count = self.session.execute(
+                select(item_owner_counts.c.count).where(
+                    item_owner_counts.c.owner_id == owner_id
+                )
+            ).scalar()
+            return count or 0
+
+        estimate = estimated_row_count(self.session, items)
+        return self.count() if estimate is None else estimate
+
+    def change_owner_count(self, owner_id: int, delta: int) -> None:
+        """Add `delta` to the item counter of `owner_id`."""
+        self.session.execute(
+            increment_statement(
+                self.session.get_bind().dialect,
+                item_owner_counts,
+                {"owner_id": owner_id},
+                "count",
+                delta,
+            )
         )
 
+    def search(
+        self,
+        text: str,
+        limit: int,
+        owner_id: int = None,
+        after: Tuple[float, int] = None,
+    ) -> List[Tuple[Item, float]]:
+        """Full-text search Items, best match first, with their rank.
+
+        `after` is the (rank, id) of the last result of the previous page.
+        """
+        if not text.split():
+            return []
+
+        dialect = self.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            tsquery = func.websearch_to_tsquery("english", text)
+            rank = cast(func.ts_rank(_item_search_vector, tsquery), DOUBLE_PRECISION)
+            query = self.session.query(Item, rank.label("rank")).filter(
+                _item_search_vector.op("@@")(tsquery)
+            )
+        elif dialect == "sqlite":
+            rank = -func.bm25(column("item_fts"))
+            query = (
+                self.session.query(Item, rank.label("rank"))
+                .join(_item_fts, _item_fts.c.rowid == Item.id)
+                .filter(column("item_fts").op("MATCH")(_fts5_query(text)))
+            )
+        else:
+            raise NotImplementedError(f"No full-text search for {dialect}")
+
+        if owner_id is not None:
+            query = query.filter(Item.owner_id == owner_id)
+        if after is not None:
+            after_rank, after_id = after
+            query = query.filter(
+                or_(rank < after_rank, and_(rank == after_rank, Item.id > after_id))
+            )
+
+        return [
+            (item, item_rank)
+            for item, item_rank in query.order_by(rank.desc(), Item.id).limit(limit)
+        ]
+
+    def existing_ids(self, ids: Iterable[int]) -> Set[int]:
+        """Get which of the ids exist."""
+        ids = list(ids)
+        if not ids:
+            return set()
+
+        rows = self.session.query(Item.id).filter(Item.id.in_(ids))
+        return {row.id for row in rows}
+
     def remove(self, item_id: int) -> None:
         """Delete an item."""
-        self.session.query(Item).filter_by(id=item_id).delete()
+        self.session.execute(_remove(), {"id": item_id})
+        # what synchronize_session="evaluate" would do, it can't see the `:id`
+        item = self.session.identity_map.get(identity_key(Item, item_id))
+        if item is not None:
+            self.session.expunge(item)
+
+    def remove_many(self, ids: Iterable[int], owner_id: int = None) -> int:
+        """Delete Items by ids, only those of `owner_id` if given."""
+        ids = list(ids)
+        query = self.session.query(Item).filter(Item.id.in_(ids))
+        if owner_id is not None:
+            query = query.filter_by(owner_id=owner_id)
+
+        return query.delete()
+
+    def stream_rows(
+        self, columns: Sequence[str], batch_size: int
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """All rows as `columns` values in batches, never the whole table at once."""
+        result = self.session.execute(export_statement(items, columns))
+        for partition in result.mappings().partitions(batch_size):
+            yield [dict(row) for row in partition]
+
+
+class AbstractAsyncRepository(ABC):
+    """Item repository interface for the asyncio stack
+
+    Services run on the sync repositories through the async unit of work,
+    only what must stream on the event loop is here.
+    """
+
+    @abstractmethod
+    def stream_rows(
+        self, columns: Sequence[str], batch_size: int
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        raise NotImplementedError
+
+
+class AsyncSqlAlchemyRepository(AbstractAsyncRepository):
+    def __init__(self, session):
+        self.session = session
+
+    async def stream_rows(
+        self, columns: Sequence[str], batch_size: int
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """All rows as `columns` values in batches, never the whole table at once."""
+        result = await self.session.stream(export_statement(items, columns))
+        async for partition in result.mappings().partitions(batch_size):
+            yield [dict(row) for row in partition]
@@ -0,0 +1,80 @@
+"""Outbox repositories."""
+from abc import ABC, abstractmethod
+from typing import Any, Iterable, List, NamedTuple, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy import delete, insert, select
+
+from src.adapters.orm import outbox
+
+
+class OutboxMessage(NamedTuple):
+    id: int
+    topic: str
+    event: str
+    payload: str
+
+
+class AbstractRepository(ABC):
+    """Outbox repository interface
+
+    Events are queued by `add` and written by `write_pending` when the
+    unit of work commits, after the flush gave new entities their ids.
+    """
+
+    def __init__(self):
+        self.pending = []  # type: List[Tuple[str, str, Type[BaseModel], Any]]
+
+    def add(self, topic: str, event: str, schema: Type[BaseModel], obj: Any) -> None:
+        """Queue `obj` to be published to `topic` as `schema` JSON."""
+        self.pending.append((topic, event, schema, obj))
+
+    def write_pending(self) -> None:
+        rows = [
+            {"topic": topic, "event": event, "payload": schema.from_orm(obj).json()}
+            for topic, event, schema, obj in self.pending
+        ]
+        self.pending.clear()
+        if rows:
+            self._add_many(rows)
+
+    @abstractmethod
+    def _add_many(self, rows: List[dict]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim(self, limit: int) -> List[OutboxMessage]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove_many(self, ids: Iterable[int]) -> None:
+        raise NotImplementedError
+
+
+class SqlAlchemyRepository(AbstractRepository):
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+
+    def _add_many(self, rows: List[dict]) -> None:
+        self.session.execute(insert(outbox), rows)
+
+    def claim(self, limit: int) -> List[OutboxMessage]:
+        """Lock the oldest `limit` messages no other relay has locked.
+
+        The locks are held until the transaction ends (PostgreSQL only,
+        SQLite has a single writer anyway).
+        """
+        result = self.session.execute(
+            select(outbox.c.id, outbox.c.topic, outbox.c.event, outbox.c.payload)
+            .order_by(outbox.c.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return [OutboxMessage(*row) for row in result]
+
+    def remove_many(self, ids: Iterable[int]) -> None:
+        """Delete messages by ids."""
+        ids = list(ids)
+        if ids:
+            self.session.execute(delete(outbox).where(outbox.c.id.in_(ids)))
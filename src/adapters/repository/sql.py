@@ -0,0 +1,156 @@
+"""SQL helpers shared by repositories."""
+import functools
+import io
+from typing import Any, Callable, Dict, List, Optional, Sequence, Type, TypeVar
+
+from sqlalchemy import Table, insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Dialect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.sql import Executable, Select
+from sqlalchemy.sql.dml import Insert
+
+T = TypeVar("T")
+
+
+def cached_statement(build: Callable[[], Executable]) -> Callable[[], Executable]:
+    """Build a fixed-shape statement once, on first use, and reuse it.
+
+    Values are passed as bound parameters at execution. Building lazily
+    lets the statement refer to classes mapped by `start_mappers`; reusing
+    it spares constructing the query and its compiled-cache key per call.
+    """
+    return functools.lru_cache(maxsize=None)(build)
+
+
+def get_by_id(
+    session: Session, entity: Type[T], id: Any, statement: Executable
+) -> Optional[T]:
+    """Entity from the identity map, or loaded by `statement` taking `:id`."""
+    obj = session.identity_map.get(identity_key(entity, id))
+    if obj is not None:
+        return obj
+
+    return session.execute(statement, {"id": id}).scalar_one_or_none()
+
+
+def _insert(dialect: Dialect) -> Callable[[Table], Insert]:
+    if dialect.name == "postgresql":
+        return postgresql.insert
+    if dialect.name == "sqlite":
+        return sqlite.insert
+
+    raise NotImplementedError(f"Upsert is not supported for {dialect.name}")
+
+
+def export_statement(table: Table, columns: Sequence[str]) -> Select:
+    """SELECT of `columns` in primary key order, read by a server-side cursor."""
+    return (
+        select(*[table.c[name] for name in columns])
+        .order_by(*table.primary_key.columns)
+        .execution_options(stream_results=True)
+    )
+
+
+def upsert_statement(dialect: Dialect, table: Table, values: Dict[str, Any]) -> Insert:
+    """INSERT of a row that updates the existing one on primary key conflict."""
+    primary_key = [column.name for column in table.primary_key]
+    stmt = _insert(dialect)(table).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=primary_key,
+        set_={
+            name: stmt.excluded[name] for name in values if name not in primary_key
+        },
+    )
+
+
+def increment_statement(
+    dialect: Dialect, table: Table, key: Dict[str, Any], column: str, delta: int
+) -> Insert:
+    """INSERT of a counter row that adds `delta` to the existing one instead."""
+    stmt = _insert(dialect)(table).values(**key, **{column: delta})
+    return stmt.on_conflict_do_update(
+        index_elements=list(key),
+        set_={column: table.c[column] + stmt.excluded[column]},
+    )
+
+
+def estimated_row_count(session: Session, table: Table) -> Optional[int]:
+    """Row count of `table` as last seen by the PostgreSQL planner statistics.
+
+    None when the dialect keeps no such statistics or the table was never
+    analyzed.
+    """
+    dialect = session.get_bind().dialect
+    if dialect.name != "postgresql":
+        return None
+
+    reltuples = session.execute(
+        text("SELECT reltuples FROM pg_class WHERE oid = CAST(:name AS regclass)"),
+        {"name": dialect.identifier_preparer.quote(table.name)},
+    ).scalar()
+    if reltuples is None or reltuples < 0:
+        return None
+
+    return int(reltuples)
+
+
+def _copy_value(value: Any) -> str:
+    """A value in the COPY text format."""
+    if value is None:
+        return "\\N"
+
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy_text(rows: List[Dict[str, Any]], columns: Sequence[str]) -> io.StringIO:
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(row[name]) for name in columns) + "\n")
+    buffer.seek(0)
+    return buffer
+
+
+def copy_insert(
+    session: Session, table: Table, columns: Sequence[str], rows: List[Dict[str, Any]]
+) -> None:
+    """INSERT many rows of `columns` into `table` in the session transaction.
+
+    With psycopg2 the rows are loaded by `COPY FROM STDIN`
+    into a temporary staging table and merged with one INSERT ... SELECT,
+    elsewhere they are inserted by a single executemany.
+    """
+    if not rows:
+        return
+
+    dialect = session.get_bind().dialect
+    if dialect.driver != "psycopg2":
+        session.execute(
+            insert(table), [{name: row[name] for name in columns} for row in rows]
+        )
+        return
+
+    quote = dialect.identifier_preparer.quote
+    target = quote(table.name)
+    staging = quote(f"{table.name}_staging")
+    names = ", ".join(quote(name) for name in columns)
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {staging} ON COMMIT DELETE ROWS "
+            f"AS SELECT {names} FROM {target} WITH NO DATA"
+        )
+        cursor.copy_expert(
+            f"COPY {staging} ({names}) FROM STDIN", _copy_text(rows, columns)
+        )
+        cursor.execute(f"INSERT INTO {target} ({names}) SELECT {names} FROM {staging}")
+        cursor.execute(f"TRUNCATE {staging}")
+    finally:
+        cursor.close()
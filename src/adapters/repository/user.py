@@ -1,10 +1,60 @@
 """User repositories."""
 from abc import ABC, abstractmethod
-from typing import List, Optional, Set
-
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Set
+
+from sqlalchemy import bindparam, func, inspect, select
+from sqlalchemy.orm import make_transient_to_detached, selectinload
+
+from .sql import (
+    cached_statement,
+    estimated_row_count,
+    export_statement,
+    get_by_id,
+    upsert_statement,
+)
+from src.adapters.orm import users
 from src.domain.user import User
 
 
+@cached_statement
+def _get():
+    return select(User).where(User.id == bindparam("id"))
+
+
+@cached_statement
+def _get_by_email():
+    return select(User).where(User.email == bindparam("email"))
+
+
+def _page(after: bool):
+    stmt = select(User)
+    if after:
+        stmt = stmt.where(User.id > bindparam("after_id"))
+
+    return stmt.order_by(User.id).offset(bindparam("skip")).limit(bindparam("limit"))
+
+
+@cached_statement
+def _list():
+    return _page(after=False)
+
+
+@cached_statement
+def _list_after():
+    return _page(after=True)
+
+
+def _row(user: User) -> dict:
+    return {
+        "id": user.id,
+        "full_name": user.full_name,
+        "email": user.email,
+        "hashed_password": user.hashed_password,
+        "is_active": user.is_active,
+        "is_superuser": user.is_superuser,
+    }
+
+
 class AbstractRepository(ABC):
     """User repository interface"""
 
@@ -28,7 +78,27 @@ class AbstractRepository(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    def list(self, skip: int, limit: int) -> List[User]:
+    def list(self, skip: int, limit: int, after_id: int = None) -> List[User]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_with_items(
+        self, skip: int, limit: int, after_id: int = None
+    ) -> List[User]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def estimated_count(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stream_rows(
+        self, columns: Sequence[str], batch_size: int
+    ) -> Iterator[List[Dict[str, Any]]]:
         raise NotImplementedError
 
 
@@ -38,34 +108,100 @@ class SqlAlchemyRepository(AbstractRepository):
         self.session = session
 
     def _add(self, user: User):
-        """Create/update User."""
-        if self.get(user.id):
-            self._update(user)
-        else:
-            self.session.add(user)
-
-    def _update(self, user: User):
-        """Update User."""
-        self.session.query(User).filter_by(id=user.id).update(
-            {
-                User.full_name: user.full_name,
-                User.email: user.email,
-                User.hashed_password: user.hashed_password,
-                User.is_active: user.is_active,
-                User.is_superuser: user.is_superuser,
-            }
-        )
+        """Create/update User without reading it first.
+
+        Loaded users are written by the flush (changed columns only),
+        new ones are inserted; a user built with an explicit id is upserted.
+        """
+        if inspect(user).transient and user.id is not None:
+            self.session.execute(
+                upsert_statement(self.session.get_bind().dialect, users, _row(user))
+            )
+            make_transient_to_detached(user)
+
+        self.session.add(user)
 
     def get(self, id: int) -> Optional[User]:
         """Get User by id."""
-        return self.session.query(User).get(id)
+        return get_by_id(self.session, User, id, _get())
 
     def get_by_email(self, email: str) -> Optional[User]:
         """Get User by email."""
-        return self.session.query(User).filter_by(email=email).one_or_none()
+        result = self.session.execute(_get_by_email(), {"email": email})
+        return result.scalar_one_or_none()
+
+    def list(self, skip: int, limit: int, after_id: int = None) -> List[User]:
+        """Get Users, seeking past `after_id` if given."""
+        params = {"skip": skip, "limit": limit}
+        if after_id is None:
+            stmt = _list()
+        else:
+            stmt = _list_after()
+            params["after_id"] = after_id
+
+        return self.session.execute(stmt, params).scalars().all()
+
+    def list_with_items(
+        self, skip: int, limit: int, after_id: int = None
+    ) -> List[User]:
+        """Get Users with their items, loaded by one more query for the page."""
+        stmt = select(User).options(selectinload(User.items))
+        if after_id is not None:
+            stmt = stmt.where(User.id > after_id)
 
-    def list(self, skip: int, limit: int) -> List[User]:
-        """Get Users."""
-        return (
-            self.session.query(User).order_by(User.id).offset(skip).limit(limit).all()
+        result = self.session.execute(
+            stmt.order_by(User.id).offset(skip).limit(limit)
         )
+        return result.scalars().all()
+
+    def count(self) -> int:
+        """Count Users."""
+        return self.session.query(func.count(User.id)).scalar()
+
+    def estimated_count(self) -> int:
+        """Count Users from planner statistics, exactly if there are none."""
+        estimate = estimated_row_count(self.session, users)
+        return self.count() if estimate is None else estimate
+
+    def stream_rows(
+        self, columns: Sequence[str], batch_size: int
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """All rows as `columns` values in batches, never the whole table at once."""
+        result = self.session.execute(export_statement(users, columns))
+        for partition in result.mappings().partitions(batch_size):
+            yield [dict(row) for row in partition]
+
+
+class AbstractAsyncRepository(ABC):
+    """User repository interface for the asyncio stack
+
+    Services run on the sync repositories through the async unit of work,
+    only the principal lookup and what must stream on the event loop is here.
+    """
+
+    @abstractmethod
+    async def get(self, id: int) -> Optional[User]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stream_rows(
+        self, columns: Sequence[str], batch_size: int
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        raise NotImplementedError
+
+
+class AsyncSqlAlchemyRepository(AbstractAsyncRepository):
+    def __init__(self, session):
+        self.session = session
+
+    async def get(self, id: int) -> Optional[User]:
+        """Get User by id."""
+        return await self.session.get(User, id)
+
+    async def stream_rows(
+        self, columns: Sequence[str], batch_size: int
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """All rows as `columns` values in batches, never the whole table at once."""
+        result = await self.session.stream(export_statement(users, columns))
+        async for partition in result.mappings().partitions(batch_size):
+            yield [dict(row) for row in partition]
@@ -1,7 +1,370 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from collections import Counter, deque
+import contextlib
+import contextvars
+from datetime import datetime, timezone
+import itertools
+import sqlite3
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
 
 from src.config import settings
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class QueryStats:
+    """SQL statements run while serving one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None  # type: Optional[str]
+        # statements differing in parameter values only share a shape
+        self.shapes = Counter()  # type: Counter[str]
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total_time += duration
+            self.shapes[statement] += 1
+            if duration >= self.slowest_time:
+                self.slowest_time = duration
+                self.slowest_statement = statement
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Shapes run more than `threshold` times, likely N+1 queries."""
+        if threshold <= 0:
+            return []
+
+        return [
+            (shape, count)
+            for shape, count in self.shapes.most_common()
+            if count > threshold
+        ]
+
+
+_query_stats = contextvars.ContextVar("query_stats", default=None)
+
+
+@contextlib.contextmanager
+def collect_query_stats() -> Iterator[QueryStats]:
+    """Record statements of instrumented engines run in this context.
+
+    The context is inherited by threadpool calls and tasks started within.
+    """
+    stats = QueryStats()
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+def _parameter_shape(parameters: Any) -> Any:
+    """Types of bound parameters, their values are not kept."""
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+
+    return type(parameters).__name__
+
+
+def _explain(conn, statement: str, parameters: Any) -> List[str]:
+    """Plan of a statement, run on a cursor of its own to bypass the events."""
+    dialect = conn.dialect.name
+    # not WITH, its CTEs may write
+    is_select = statement.lstrip().upper().startswith("SELECT")
+    if dialect == "postgresql":
+        # ANALYZE executes the statement again, only done for reads
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) " if is_select else "EXPLAIN "
+    elif dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        return []
+
+    cursor = conn.connection.cursor()
+    try:
+        if dialect == "postgresql":
+            # a failing EXPLAIN must not abort the transaction of the statement,
+            # nor may anything ANALYZE executed (e.g. volatile functions) stay
+            cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception as e:  # pylint: disable=broad-except
+            return [f"EXPLAIN failed: {e}"]
+        finally:
+            if dialect == "postgresql":
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    finally:
+        cursor.close()
+
+    # PostgreSQL returns one line per row, SQLite (id, parent, notused, detail)
+    return [str(row[-1]) for row in rows]
+
+
+class SlowQueryLog:
+    """The last `maxlen` statements slower than `threshold` seconds."""
+
+    def __init__(self, threshold: float, maxlen: int):
+        self.threshold = threshold
+        self._entries = deque(maxlen=maxlen)  # type: Deque[Dict[str, Any]]
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0 and self._entries.maxlen > 0
+
+    def record(
+        self,
+        conn,
+        statement: str,
+        parameters: Any,
+        duration: float,
+        executemany: bool,
+    ) -> None:
+        entry = {
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "statement": statement,
+            "parameters": _parameter_shape(parameters),
+            "executemany": executemany,
+            # an executemany has no single plan
+            "plan": [] if executemany else _explain(conn, statement, parameters),
+        }
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Recorded statements, latest first."""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog(
+    threshold=settings.SLOW_QUERY_THRESHOLD_MS / 1000,
+    maxlen=settings.SLOW_QUERY_LOG_SIZE,
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # the PostgreSQL timeout is per statement, none may start past the deadline
+    time_left = _time_left()
+    if time_left is not None and time_left <= 0:
+        raise DeadlineExceeded()
+
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+    if slow_query_log.enabled and duration >= slow_query_log.threshold:
+        slow_query_log.record(conn, statement, parameters, duration, executemany)
+
+
+class DeadlineExceeded(Exception):
+    """The database time allowed to the current context ran out."""
+
+
+_deadline = contextvars.ContextVar("db_deadline", default=None)
+
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+@contextlib.contextmanager
+def db_deadline(timeout: float) -> Iterator[None]:
+    """Bound the statements of instrumented engines run in this context.
+
+    Past `timeout` seconds from now no statement is started, those running
+    are cancelled by the database, and DeadlineExceeded is raised; a timeout
+    of 0 sets no deadline.
+    """
+    token = _deadline.set(time.monotonic() + timeout if timeout > 0 else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _time_left() -> Optional[float]:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def _begin(conn) -> None:
+    """Limit each statement of a PostgreSQL transaction to the time left.
+
+    Statements starting later are stopped by `_before_cursor_execute`
+    once the deadline passed, one started just before may overrun it.
+    """
+    time_left = _time_left()
+    if time_left is None:
+        return
+    if time_left <= 0:
+        raise DeadlineExceeded()
+
+    conn.exec_driver_sql(
+        f"SET LOCAL statement_timeout = {max(int(time_left * 1000), 1)}"
+    )
+
+
+def _progress_handler() -> int:
+    """Called by SQLite while a statement runs, non-zero interrupts it."""
+    time_left = _time_left()
+    return int(time_left is not None and time_left <= 0)
+
+
+def _connect(dbapi_connection, connection_record) -> None:
+    # pysqlite only, the aiosqlite adapter has no progress handler
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.set_progress_handler(_progress_handler, 1000)
+
+
+def _handle_error(context) -> Optional[Exception]:
+    if context.connection is not None:
+        # the failed statement never reached _after_cursor_execute
+        start_times = context.connection.info.get("query_start_time")
+        if start_times:
+            start_times.pop()
+
+    if _deadline.get() is None:
+        return None
+
+    # query_canceled, or the SQLite progress handler returning non-zero
+    error = context.original_exception
+    if getattr(error, "pgcode", None) == "57014" or (
+        isinstance(error, sqlite3.OperationalError) and str(error) == "interrupted"
+    ):
+        return DeadlineExceeded(str(error))
+
+    return None
+
+
+def instrument_engine(engine: Engine) -> Engine:
+    """Feed statements run by `engine` into `QueryStats` and `slow_query_log`,
+    and bound them by the `db_deadline` of their context.
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error, retval=True)
+        if engine.dialect.name == "postgresql":
+            event.listen(engine, "begin", _begin)
+        elif engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", _connect)
+
+    return engine
+
+
+engine = instrument_engine(
+    create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+)
 DEFAULT_SESSION_FACTORY = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class ReplicaSet:
+    """Read replicas of the primary database, taken round-robin.
+
+    A replica failing to connect is skipped for `retry_after` seconds;
+    with no replica left the caller goes to the primary.
+    """
+
+    def __init__(
+        self,
+        engines: Iterable[Engine],
+        retry_after: float,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.engines = list(engines)
+        self.retry_after = retry_after
+        self.timer = timer
+        self._down_until = {}  # type: Dict[Engine, float]
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def is_up(self, engine: Engine) -> bool:
+        return self._down_until.get(engine, 0) <= self.timer()
+
+    def mark_down(self, engine: Engine) -> None:
+        with self._lock:
+            self._down_until[engine] = self.timer() + self.retry_after
+
+    def open_session(self, session_factory: sessionmaker) -> Optional[Session]:
+        """Session connected to a live replica, or None if there is none."""
+        if not self.engines:
+            return None
+
+        start = next(self._next)
+        for i in range(len(self.engines)):
+            replica = self.engines[(start + i) % len(self.engines)]
+            if not self.is_up(replica):
+                continue
+
+            session = session_factory(bind=replica)
+            try:
+                # connect now (pre-pinged by the pool) to fall back early
+                session.connection()
+            except exc.DBAPIError:
+                session.close()
+                self.mark_down(replica)
+                logger.warning("Replica %r is down", replica.url, exc_info=True)
+                continue
+
+            return session
+
+        return None
+
+
+REPLICAS = ReplicaSet(
+    [
+        instrument_engine(create_engine(uri, pool_pre_ping=True))
+        for uri in settings.SQLALCHEMY_REPLICA_URIS
+    ],
+    retry_after=settings.REPLICA_RETRY_SECONDS,
+)
+
+
+def create_async_session_factory(url: str) -> sessionmaker:
+    """Session factory for the asyncio stack (needs an async driver, e.g. asyncpg)."""
+    async_engine = create_async_engine(url, pool_pre_ping=True)
+    instrument_engine(async_engine.sync_engine)
+    return sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+        bind=async_engine,
+        class_=AsyncSession,
+    )
+
+
+ASYNC_SESSION_FACTORY = (
+    create_async_session_factory(settings.ASYNC_SQLALCHEMY_DATABASE_URI)
+    if settings.DB_ASYNC
+    else None
+)
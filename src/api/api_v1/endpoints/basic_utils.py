@@ -5,10 +5,15 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 import sh
 
+from src.adapters.publisher import publisher
+from src.adapters.session import slow_query_log
+from src.api import deps
+from src.api.deadlines import timeouts
 from src.config import settings
 from src.domain import schemas
+from src.domain.user import User
 from src.initial_data import main as init_data
-from src.utils import publish_with_err_handler
+from src.services.security import hashing_executor
 
 
 router = APIRouter()
@@ -54,6 +59,51 @@ def test_pubsub(
 ) -> Any:
     """
     Test pubsub worker.
+
+    The message is queued for publishing, the outcome shows in `/pubsub-stats`.
     """
-    publish_with_err_handler(settings.PUBSUB_PROJECT_ID, settings.TOPIC_ID, msg.msg)
+    publisher.publish(settings.PUBSUB_PROJECT_ID, settings.TOPIC_ID, msg.msg)
     return {"msg": "Word received"}
+
+
+@router.get("/pubsub-stats")
+def pubsub_stats(username: str = Depends(get_basic_http_username)) -> Any:
+    """
+    Messages of the shared publisher: pending, published and failed.
+    """
+    return publisher.stats()
+
+
+@router.get("/hashing-stats")
+def hashing_stats(username: str = Depends(get_basic_http_username)) -> Any:
+    """
+    Password hashing pool queue depth and latency.
+    """
+    if hashing_executor is None:
+        return {"enabled": False}
+
+    return {"enabled": True, **hashing_executor.stats()}
+
+
+@router.get("/slow-queries")
+def slow_queries(
+    current_user: User = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Latest statements slower than SLOW_QUERY_THRESHOLD_MS, with their plans.
+    """
+    return {
+        "enabled": slow_query_log.enabled,
+        "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "queries": slow_query_log.entries(),
+    }
+
+
+@router.get("/db-timeouts")
+def db_timeouts(
+    current_user: User = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Requests that ran out of database time, per route.
+    """
+    return {"deadline_ms": settings.DB_DEADLINE_MS, "timeouts": timeouts.counts()}
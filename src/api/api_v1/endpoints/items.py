@@ -1,64 +1,266 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
 
 from src.api import deps
+from src.api.deadlines import deadline
+from src.api.export import FORMAT_REGEX, export_response
+from src.api.pagination import (
+    add_next_page_headers,
+    decode_cursor,
+    decode_rank_cursor,
+)
 from src.domain import schemas
 from src.domain.user import User
 from src.services import item as item_service, unit_of_work
-from src.services.item import ItemNotFoundException, ItemPermissionException
+from src.services.item import (
+    ItemImportException,
+    ItemNotFoundException,
+    ItemPermissionException,
+)
 
 
 router = APIRouter()
 
 
-@router.get("/", response_model=List[schemas.Item])
-def read_items(
+@router.get(
+    "/", response_model=List[schemas.Item], dependencies=[Depends(deadline())]
+)
+async def read_items(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    count: Optional[str] = Query(None, regex="^(exact|estimated)$"),
     current_user: User = Depends(deps.get_current_active_user),
-    uow: unit_of_work.AbstractUnitOfWork = Depends(deps.get_uow),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
 ) -> Any:
     """
     Retrieve items.
+
+    Pass the `X-Next-Cursor` value of a full page as `cursor`
+    (or follow the `Link` header) to page by keyset instead of offset.
+    With `count` the total number of items is sent as `X-Total-Count`,
+    either "exact" or "estimated" (cheaper, may lag behind).
     """
+    after_id = None
+    if cursor is not None:
+        after_id = decode_cursor(cursor)
+        skip = 0
+
     if current_user.is_superuser:
-        items = item_service.get_list(uow, skip=skip, limit=limit)
+        items = await uow.run(
+            item_service.get_list, skip=skip, limit=limit, after_id=after_id
+        )
     else:
-        items = item_service.get_list_by_owner(
-            uow, owner_id=current_user.id, skip=skip, limit=limit
+        items = await uow.run(
+            item_service.get_list_by_owner,
+            owner_id=current_user.id,
+            skip=skip,
+            limit=limit,
+            after_id=after_id,
+        )
+
+    add_next_page_headers(request, response, items, limit)
+    if count is not None:
+        owner_id = None if current_user.is_superuser else current_user.id
+        total = await uow.run(
+            item_service.count, owner_id=owner_id, estimated=count == "estimated"
         )
+        response.headers["X-Total-Count"] = str(total)
+
     return items
 
 
 @router.post("/", response_model=schemas.Item)
-def create_item(
+async def create_item(
     item_in: schemas.ItemCreate,
     current_user: User = Depends(deps.get_current_active_user),
-    uow: unit_of_work.AbstractUnitOfWork = Depends(deps.get_uow),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
 ) -> Any:
     """
     Create new item.
     """
-    item = item_service.create(uow, obj_in=item_in, owner_id=current_user.id)
+    item = await uow.run(
+        item_service.create, obj_in=item_in, owner_id=current_user.id
+    )
     return item
 
 
+# declared before the "/{id}" routes, which would otherwise match their path
+@router.get("/export")
+async def export_items(
+    format: str = Query("ndjson", regex=FORMAT_REGEX),
+    current_user: User = Depends(deps.get_current_active_superuser),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
+) -> Any:
+    """
+    Stream all items as NDJSON or CSV.
+    """
+    if isinstance(uow, unit_of_work.AbstractAsyncUnitOfWork):
+        batches = item_service.export_rows_async(uow)
+    else:
+        batches = item_service.export_rows(uow)
+
+    return export_response(batches, item_service.EXPORT_COLUMNS, format, "items")
+
+
+@router.get(
+    "/with-owner",
+    response_model=List[schemas.ItemWithOwner],
+    dependencies=[Depends(deadline())],
+)
+async def read_items_with_owner(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(deps.get_current_active_user),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
+) -> Any:
+    """
+    Retrieve items along with their owner, paged like `GET /items/`.
+    """
+    after_id = None
+    if cursor is not None:
+        after_id = decode_cursor(cursor)
+        skip = 0
+
+    items = await uow.run(
+        item_service.get_list_with_owner,
+        skip=skip,
+        limit=limit,
+        after_id=after_id,
+        owner_id=None if current_user.is_superuser else current_user.id,
+    )
+
+    add_next_page_headers(request, response, items, limit)
+    return items
+
+
+@router.get(
+    "/search", response_model=List[schemas.Item], dependencies=[Depends(deadline())]
+)
+async def search_items(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1),
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(deps.get_current_active_user),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
+) -> Any:
+    """
+    Full-text search items by title and description, best match first.
+
+    Page with `cursor` like with `GET /items/`.
+    """
+    after = decode_rank_cursor(cursor) if cursor is not None else None
+    owner_id = None if current_user.is_superuser else current_user.id
+    results = await uow.run(
+        item_service.search, text=q, limit=limit, owner_id=owner_id, after=after
+    )
+
+    items = [item for item, _ in results]
+    last_rank = results[-1][1] if results else None
+    add_next_page_headers(request, response, items, limit, last_rank=last_rank)
+    return items
+
+
+@router.post("/bulk", response_model=List[schemas.ItemBulkResult])
+async def create_items(
+    items_in: List[schemas.ItemCreate],
+    current_user: User = Depends(deps.get_current_active_user),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
+) -> Any:
+    """
+    Create many items, reporting a status per item.
+    """
+    return await uow.run(
+        item_service.create_many, objs_in=items_in, owner_id=current_user.id
+    )
+
+
+@router.put("/bulk", response_model=List[schemas.ItemBulkResult])
+async def update_items(
+    items_in: List[schemas.ItemBulkUpdate],
+    current_user: User = Depends(deps.get_current_active_user),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
+) -> Any:
+    """
+    Update many items by their ids, reporting a status per item.
+    """
+    owner_id = None if current_user.is_superuser else current_user.id
+    return await uow.run(
+        item_service.update_many, objs_in=items_in, owner_id=owner_id
+    )
+
+
+@router.delete("/bulk", response_model=List[schemas.ItemBulkResult])
+async def delete_items(
+    ids: List[int] = Body(...),
+    current_user: User = Depends(deps.get_current_active_user),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
+) -> Any:
+    """
+    Delete many items by ids, reporting a status per item.
+    """
+    owner_id = None if current_user.is_superuser else current_user.id
+    return await uow.run(item_service.delete_many, ids=ids, owner_id=owner_id)
+
+
+@router.post("/import", response_model=schemas.ItemImportResult)
+async def import_items(
+    file: UploadFile = File(...),
+    format: str = Query("ndjson", regex=FORMAT_REGEX),
+    current_user: User = Depends(deps.get_current_active_user),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
+) -> Any:
+    """
+    Create items from an uploaded NDJSON or CSV file (with a header row).
+
+    Rows are read as they are loaded, invalid ones are counted as rejected.
+    A file that can't be read on (not UTF-8, malformed CSV) gets a 400
+    with the counts of the rows loaded until then.
+    """
+    try:
+        # binary lines, decoded by the service one at a time
+        return await uow.run(
+            item_service.import_items, file.file, format, owner_id=current_user.id
+        )
+    except ItemImportException as e:
+        raise HTTPException(
+            status_code=400, detail={"message": str(e), **e.result.dict()}
+        )
+
+
 @router.put("/{id}", response_model=schemas.Item)
-def update_item(
+async def update_item(
     id: int,
     item_in: schemas.ItemUpdate,
     current_user: User = Depends(deps.get_current_active_user),
-    uow: unit_of_work.AbstractUnitOfWork = Depends(deps.get_uow),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
 ) -> Any:
     """
     Update an item.
     """
     try:
         if current_user.is_superuser:
-            item = item_service.update(uow, id, item_in)
+            item = await uow.run(item_service.update, id, item_in)
         else:
-            item = item_service.update(uow, id, item_in, current_user.id)
+            item = await uow.run(item_service.update, id, item_in, current_user.id)
 
         return item
 
@@ -69,16 +271,18 @@ def update_item(
         raise HTTPException(status_code=400, detail="Not enough permissions")
 
 
-@router.get("/{id}", response_model=schemas.Item)
-def read_item(
+@router.get(
+    "/{id}", response_model=schemas.Item, dependencies=[Depends(deadline())]
+)
+async def read_item(
     id: int,
     current_user: User = Depends(deps.get_current_active_user),
-    uow: unit_of_work.AbstractUnitOfWork = Depends(deps.get_uow),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
 ) -> Any:
     """
     Get item by ID.
     """
-    item = item_service.get_by_id(uow, item_id=id)
+    item = await uow.run(item_service.get_by_id, item_id=id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
 
@@ -89,19 +293,21 @@ def read_item(
 
 
 @router.delete("/{id}", response_model=schemas.Item)
-def delete_item(
+async def delete_item(
     id: int,
     current_user: User = Depends(deps.get_current_active_user),
-    uow: unit_of_work.AbstractUnitOfWork = Depends(deps.get_uow),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
 ) -> Any:
     """
     Delete an item.
     """
     try:
         if current_user.is_superuser:
-            item = item_service.delete(uow, item_id=id)
+            item = await uow.run(item_service.delete, item_id=id)
         else:
-            item = item_service.delete(uow, item_id=id, owner_id=current_user.id)
+            item = await uow.run(
+                item_service.delete, item_id=id, owner_id=current_user.id
+            )
 
         return item
 
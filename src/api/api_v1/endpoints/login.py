@@ -8,34 +8,38 @@ from src.api import deps
 from src.domain import schemas
 from src.domain.user import User
 from src.services import unit_of_work
+from src.services.security import get_password_hash_async, verify_password_async
 from src.services.user import (
-    generate_auth_token,
+    create_auth_token,
+    get_login_user,
     recover_password,
     reset_password,
     InvalidTokenException,
     UserInactiveException,
     UserNotFoundException,
 )
+from src.utils import verify_password_reset_token
 
 
 router = APIRouter()
 
 
 @router.post("/login/access-token", response_model=schemas.Token)
-def login_access_token(
+async def login_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    uow: unit_of_work.AbstractUnitOfWork = Depends(deps.get_uow),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
 ) -> Any:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
     try:
-        token = generate_auth_token(
-            uow, email=form_data.username, password=form_data.password
-        )
+        user = await uow.run(get_login_user, email=form_data.username)
+        # awaited, so no threadpool thread waits for the hash
+        if not await verify_password_async(form_data.password, user.hashed_password):
+            raise UserNotFoundException()
 
         return {
-            "access_token": token,
+            "access_token": create_auth_token(user),
             "token_type": "bearer",
         }
     except UserNotFoundException:
@@ -45,7 +49,7 @@ def login_access_token(
 
 
 @router.post("/login/test-token", response_model=schemas.User)
-def test_token(current_user: User = Depends(deps.get_current_user)) -> Any:
+async def test_token(current_user: User = Depends(deps.get_current_user)) -> Any:
     """
     Test access token
     """
@@ -53,15 +57,15 @@ def test_token(current_user: User = Depends(deps.get_current_user)) -> Any:
 
 
 @router.post("/password-recovery/{email}", response_model=schemas.Msg)
-def password_recovery(
+async def password_recovery(
     email: str,
-    uow: unit_of_work.AbstractUnitOfWork = Depends(deps.get_uow),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
 ) -> Any:
     """
     Password Recovery
     """
     try:
-        recover_password(uow, email)
+        await uow.run(recover_password, email)
 
         return {"msg": "Password recovery email sent"}
 
@@ -73,16 +77,22 @@ def password_recovery(
 
 
 @router.post("/reset-password/", response_model=schemas.Msg)
-def password_reset(
+async def password_reset(
     token: str = Body(...),
     new_password: str = Body(...),
-    uow: unit_of_work.AbstractUnitOfWork = Depends(deps.get_uow),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
 ) -> Any:
     """
     Reset password
     """
+    if not verify_password_reset_token(token):
+        raise HTTPException(status_code=400, detail="Invalid token")
+
+    hashed_password = await get_password_hash_async(new_password)
     try:
-        reset_password(uow, token, new_password)
+        await uow.run(
+            reset_password, token, new_password, hashed_password=hashed_password
+        )
 
         return {"msg": "Password updated successfully"}
 
@@ -1,45 +1,123 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
 from fastapi.encoders import jsonable_encoder
 from pydantic.networks import EmailStr
 
 from src.api import deps
+from src.api.deadlines import deadline
+from src.api.export import FORMAT_REGEX, export_response
+from src.api.pagination import add_next_page_headers, decode_cursor
 from src.config import settings
 from src.domain import schemas
 from src.domain.user import User
 from src.services import user as user_service, unit_of_work
+from src.services.security import get_password_hash_async
 from src.services.user import UserAlreadyExistsException, UserNotFoundException
 
 
 router = APIRouter()
 
 
-@router.get("/", response_model=List[schemas.User])
-def read_users(
+@router.get(
+    "/", response_model=List[schemas.User], dependencies=[Depends(deadline())]
+)
+async def read_users(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    count: Optional[str] = Query(None, regex="^(exact|estimated)$"),
     current_user: User = Depends(deps.get_current_active_superuser),
-    uow: unit_of_work.AbstractUnitOfWork = Depends(deps.get_uow),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
 ) -> Any:
     """
     Retrieve users.
+
+    Pass the `X-Next-Cursor` value of a full page as `cursor`
+    (or follow the `Link` header) to page by keyset instead of offset.
+    With `count` the total number of users is sent as `X-Total-Count`,
+    either "exact" or "estimated" (cheaper, may lag behind).
     """
-    users = user_service.get_list(uow, skip=skip, limit=limit)
+    after_id = None
+    if cursor is not None:
+        after_id = decode_cursor(cursor)
+        skip = 0
+
+    users = await uow.run(
+        user_service.get_list, skip=skip, limit=limit, after_id=after_id
+    )
+
+    add_next_page_headers(request, response, users, limit)
+    if count is not None:
+        total = await uow.run(user_service.count, estimated=count == "estimated")
+        response.headers["X-Total-Count"] = str(total)
+
+    return users
+
+
+@router.get("/export")
+async def export_users(
+    format: str = Query("ndjson", regex=FORMAT_REGEX),
+    current_user: User = Depends(deps.get_current_active_superuser),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
+) -> Any:
+    """
+    Stream all users (without password hashes) as NDJSON or CSV.
+    """
+    if isinstance(uow, unit_of_work.AbstractAsyncUnitOfWork):
+        batches = user_service.export_rows_async(uow)
+    else:
+        batches = user_service.export_rows(uow)
+
+    return export_response(batches, user_service.EXPORT_COLUMNS, format, "users")
+
+
+@router.get(
+    "/with-items",
+    response_model=List[schemas.UserWithItems],
+    dependencies=[Depends(deadline())],
+)
+async def read_users_with_items(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(deps.get_current_active_superuser),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
+) -> Any:
+    """
+    Retrieve users along with their items, paged like `GET /users/`.
+    """
+    after_id = None
+    if cursor is not None:
+        after_id = decode_cursor(cursor)
+        skip = 0
+
+    users = await uow.run(
+        user_service.get_list_with_items, skip=skip, limit=limit, after_id=after_id
+    )
+
+    add_next_page_headers(request, response, users, limit)
     return users
 
 
 @router.post("/", response_model=schemas.User)
-def create_user(
+async def create_user(
     user_in: schemas.UserCreate,
     current_user: User = Depends(deps.get_current_active_superuser),
-    uow: unit_of_work.AbstractUnitOfWork = Depends(deps.get_uow),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
 ) -> Any:
     """
     Create new user.
     """
+    hashed_password = await get_password_hash_async(user_in.password)
     try:
-        user = user_service.create(uow, user_in)
+        user = await uow.run(
+            user_service.create, user_in, hashed_password=hashed_password
+        )
 
         return user
 
@@ -51,11 +129,11 @@ def create_user(
 
 
 @router.post("/open", response_model=schemas.User)
-def create_user_open(
+async def create_user_open(
     password: str = Body(...),
     email: EmailStr = Body(...),
     full_name: str = Body(None),
-    uow: unit_of_work.AbstractUnitOfWork = Depends(deps.get_uow),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
 ) -> Any:
     """
     Create new user without the need to be logged in.
@@ -69,7 +147,10 @@ def create_user_open(
         user_in = schemas.UserCreate(
             password=password, email=email, full_name=full_name
         )
-        user = user_service.create(uow, user_in)
+        hashed_password = await get_password_hash_async(password)
+        user = await uow.run(
+            user_service.create, user_in, hashed_password=hashed_password
+        )
 
         return user
 
@@ -81,7 +162,7 @@ def create_user_open(
 
 
 @router.get("/me", response_model=schemas.User)
-def read_user_me(
+async def read_user_me(
     current_user: User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
@@ -91,12 +172,12 @@ def read_user_me(
 
 
 @router.put("/me", response_model=schemas.User)
-def update_user_me(
+async def update_user_me(
     password: str = Body(None),
     full_name: str = Body(None),
     email: EmailStr = Body(None),
     current_user: User = Depends(deps.get_current_active_user),
-    uow: unit_of_work.AbstractUnitOfWork = Depends(deps.get_uow),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
 ) -> Any:
     """
     Update own user.
@@ -110,21 +191,31 @@ def update_user_me(
     if email is not None:
         user_in.email = email
 
-    user = user_service.update_by_id(uow, current_user.id, user_in)
+    hashed_password = None
+    if user_in.password:
+        hashed_password = await get_password_hash_async(user_in.password)
+    user = await uow.run(
+        user_service.update_by_id,
+        current_user.id,
+        user_in,
+        hashed_password=hashed_password,
+    )
 
     return user
 
 
-@router.get("/{user_id}", response_model=schemas.User)
-def read_user_by_id(
+@router.get(
+    "/{user_id}", response_model=schemas.User, dependencies=[Depends(deadline())]
+)
+async def read_user_by_id(
     user_id: int,
     current_user: User = Depends(deps.get_current_active_user),
-    uow: unit_of_work.AbstractUnitOfWork = Depends(deps.get_uow),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
 ) -> Any:
     """
     Get a specific user by id.
     """
-    user = user_service.get_by_id(uow, user_id=user_id)
+    user = await uow.run(user_service.get_by_id, user_id=user_id)
     if not user:
         raise HTTPException(
             status_code=404,
@@ -141,17 +232,25 @@ def read_user_by_id(
 
 
 @router.put("/{user_id}", response_model=schemas.User)
-def update_user(
+async def update_user(
     user_id: int,
     user_in: schemas.UserUpdate,
     current_user: User = Depends(deps.get_current_active_superuser),
-    uow: unit_of_work.AbstractUnitOfWork = Depends(deps.get_uow),
+    uow: unit_of_work.RequestUnitOfWork = Depends(deps.get_uow),
 ) -> Any:
     """
     Update a user.
     """
+    hashed_password = None
+    if user_in.password:
+        hashed_password = await get_password_hash_async(user_in.password)
     try:
-        user = user_service.update_by_id(uow, user_id, user_in)
+        user = await uow.run(
+            user_service.update_by_id,
+            user_id,
+            user_in,
+            hashed_password=hashed_password,
+        )
 
         return user
 
@@ -0,0 +1,76 @@
+"""Per-route deadlines for the database work of a request."""
+from collections import Counter
+import threading
+from typing import AsyncGenerator, Callable, Dict
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from src.adapters.session import DeadlineExceeded, db_deadline
+from src.config import settings
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class TimeoutCounter:
+    """Requests that ran out of database time, per route."""
+
+    def __init__(self):
+        self._counts = Counter()  # type: Counter[str]
+        self._lock = threading.Lock()
+
+    def record(self, route: str) -> None:
+        with self._lock:
+            self._counts[route] += 1
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+timeouts = TimeoutCounter()
+
+
+def deadline(timeout_ms: int = None) -> Callable[[], AsyncGenerator[None, None]]:
+    """Dependency bounding the database time of a request, in milliseconds.
+
+    Defaults to DB_DEADLINE_MS, 0 sets no deadline.
+    """
+
+    async def dependency() -> AsyncGenerator[None, None]:
+        timeout = settings.DB_DEADLINE_MS if timeout_ms is None else timeout_ms
+        # set in the request task, so inherited by its threadpool calls
+        with db_deadline(timeout / 1000):
+            yield
+
+    return dependency
+
+
+def _route(request: Request) -> str:
+    """Path template of the matched route, e.g. "GET /api/v1/items/{id}"."""
+    endpoint = request.scope.get("endpoint")
+    for route in request.app.routes:
+        if getattr(route, "endpoint", None) is endpoint:
+            return f"{request.method} {route.path}"
+
+    return f"{request.method} {request.url.path}"
+
+
+async def deadline_exceeded_handler(
+    request: Request, exc: DeadlineExceeded
+) -> JSONResponse:
+    """503 telling the client to come back, counted per route."""
+    route = _route(request)
+    timeouts.record(route)
+    logger.warning("Database deadline exceeded: %s", route)
+
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database deadline exceeded"},
+        headers={"Retry-After": str(settings.DB_DEADLINE_RETRY_AFTER_SECONDS)},
+    )
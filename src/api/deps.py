@@ -1,13 +1,15 @@
 """Service-like functions for authentication"""
+from typing import AsyncGenerator, Generator
+
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from pydantic import ValidationError
 
-from src.domain import schemas
 from src.config import settings
 from src.domain.user import User
-from src.services import security, unit_of_work
+from src.services import security, unit_of_work, user as user_service
 from tests.session import SQLITE_SESSION_FACTORY
 
 
@@ -16,36 +18,51 @@ reusable_oauth2 = OAuth2PasswordBearer(
 )
 
 
-def get_uow() -> unit_of_work.AbstractUnitOfWork:
-    return unit_of_work.SqlAlchemyUnitOfWork()
+async def get_uow() -> AsyncGenerator[unit_of_work.RequestUnitOfWork, None]:
+    """Unit of work shared by the dependencies and services of a request."""
+    if settings.DB_ASYNC:
+        async_uow = unit_of_work.AsyncRequestScopedUnitOfWork()
+        try:
+            yield async_uow
+        finally:
+            await async_uow.close()
+    else:
+        uow = unit_of_work.RequestScopedUnitOfWork()
+        try:
+            yield uow
+        finally:
+            await run_in_threadpool(uow.close)
 
 
-def get_uow_sqlite_memory() -> unit_of_work.AbstractUnitOfWork:
-    return unit_of_work.SqlAlchemyUnitOfWork(SQLITE_SESSION_FACTORY)
+def get_uow_sqlite_memory() -> Generator[unit_of_work.AbstractUnitOfWork, None, None]:
+    uow = unit_of_work.RequestScopedUnitOfWork(SQLITE_SESSION_FACTORY)
+    try:
+        yield uow
+    finally:
+        uow.close()
 
 
-def get_current_user(
-    uow: unit_of_work.AbstractUnitOfWork = Depends(get_uow),
+async def get_current_user(
+    uow: unit_of_work.RequestUnitOfWork = Depends(get_uow),
     token: str = Depends(reusable_oauth2),
 ) -> User:
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = schemas.TokenPayload(**payload)
+        token_data = security.decode_access_token(token)
     except (jwt.JWTError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    with uow:
-        user = uow.users.get(id=token_data.sub)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        return user
+    if isinstance(uow, unit_of_work.AbstractAsyncUnitOfWork):
+        user = await user_service.get_principal_async(uow, user_id=token_data.sub)
+    else:
+        user = await uow.run(user_service.get_principal, user_id=token_data.sub)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
 
 
-def get_current_active_user(
+async def get_current_active_user(
     current_user: User = Depends(get_current_user),
 ) -> User:
     if not current_user.is_active:
@@ -53,7 +70,7 @@ def get_current_active_user(
     return current_user
 
 
-def get_current_active_superuser(
+async def get_current_active_superuser(
     current_user: User = Depends(get_current_user),
 ) -> User:
     if not current_user.is_superuser:
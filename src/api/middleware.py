@@ -0,0 +1,77 @@
+"""ASGI middlewares."""
+import json
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.adapters.session import QueryStats, collect_query_stats
+from src.config import settings
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def _server_timing(stats: QueryStats, elapsed: float) -> str:
+    return (
+        f'db;dur={stats.total_time * 1000:.3f};desc="{stats.count} queries", '
+        f"db-slowest;dur={stats.slowest_time * 1000:.3f}, "
+        f"app;dur={elapsed * 1000:.3f}"
+    )
+
+
+class QueryStatsMiddleware:
+    """Report the SQL run for each request.
+
+    Statement count, DB time and the slowest statement go to a
+    `Server-Timing` header and a JSON log line; statements repeated more
+    than QUERY_REPEAT_THRESHOLD times are logged as likely N+1 queries.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        with collect_query_stats() as stats:
+
+            async def send_with_stats(message: Message) -> None:
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    headers = MutableHeaders(scope=message)
+                    elapsed = time.perf_counter() - start
+                    headers.append("Server-Timing", _server_timing(stats, elapsed))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_stats)
+            finally:
+                self._log(scope, status, stats, time.perf_counter() - start)
+
+    @staticmethod
+    def _log(scope: Scope, status: int, stats: QueryStats, elapsed: float) -> None:
+        line = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 3),
+            "db_queries": stats.count,
+            "db_time_ms": round(stats.total_time * 1000, 3),
+            "db_slowest_ms": round(stats.slowest_time * 1000, 3),
+            "db_slowest_statement": stats.slowest_statement,
+        }
+        repeated = stats.repeated(settings.QUERY_REPEAT_THRESHOLD)
+        if repeated:
+            line["n_plus_one"] = [
+                {"statement": shape, "count": count} for shape, count in repeated
+            ]
+            logger.warning(json.dumps(line))
+        else:
+            logger.info(json.dumps(line))
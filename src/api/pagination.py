@@ -0,0 +1,65 @@
+"""Keyset (cursor) pagination helpers."""
+import base64
+import json
+from typing import Any, Sequence, Tuple
+
+from fastapi import HTTPException, Request, Response
+
+
+def encode_cursor(last_id: int, rank: float = None) -> str:
+    """Opaque cursor pointing right after the row with `last_id`.
+
+    Pages ordered by a search rank also carry the `rank` of that row.
+    """
+    data = {"id": last_id}  # type: dict
+    if rank is not None:
+        data["rank"] = rank
+    raw = json.dumps(data).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (ValueError, TypeError):
+        data = None
+
+    if not isinstance(data, dict) or not isinstance(data.get("id"), int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return data
+
+
+def decode_cursor(cursor: str) -> int:
+    """Get the `after_id` seek value out of a cursor."""
+    return _decode(cursor)["id"]
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    """Get the (rank, id) seek values out of a cursor of ranked results."""
+    data = _decode(cursor)
+    rank = data.get("rank")
+    if not isinstance(rank, (int, float)) or isinstance(rank, bool):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return rank, data["id"]
+
+
+def add_next_page_headers(
+    request: Request,
+    response: Response,
+    page: Sequence[Any],
+    limit: int,
+    last_rank: float = None,
+) -> None:
+    """Set `X-Next-Cursor` and a `Link: rel="next"` header for a full page."""
+    if not page or len(page) < limit:
+        return
+
+    cursor = encode_cursor(page[-1].id, rank=last_rank)
+    next_url = request.url.remove_query_params("skip").include_query_params(
+        cursor=cursor, limit=limit
+    )
+    response.headers["X-Next-Cursor"] = cursor
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
@@ -9,6 +9,33 @@ class Settings(BaseSettings):
     SECRET_KEY: str = secrets.token_urlsafe(32)
     # 60 minutes * 24 hours * 8 days = 8 days
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
+    # verified access tokens are kept per process (never past their `exp`),
+    # 0 disables the cache
+    ACCESS_TOKEN_CACHE_SIZE: int = 1024
+    ACCESS_TOKEN_CACHE_TTL_SECONDS: int = 300
+    REDIS_URL: Optional[str] = None
+    # cached user flags checked on every authenticated request: "redis" (shared,
+    # the default with REDIS_URL set), "memory" (per process, the default
+    # otherwise) or "none". A change only evicts the entry of the process making
+    # it, so with "memory" the other processes (e.g. gunicorn workers) may serve
+    # the old flags for up to PRINCIPAL_CACHE_MEMORY_TTL_SECONDS
+    PRINCIPAL_CACHE_BACKEND: Optional[str] = None
+    PRINCIPAL_CACHE_SIZE: int = 1024
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MEMORY_TTL_SECONDS: int = 5
+
+    @validator("PRINCIPAL_CACHE_BACKEND", pre=True, always=True)
+    def default_principal_cache_backend(
+        cls, v: Optional[str], values: Dict[str, Any]
+    ) -> str:
+        if v:
+            return v
+        return "redis" if values.get("REDIS_URL") else "memory"
+
+    # processes hashing passwords outside of the request threadpool,
+    # 0 hashes inline
+    PASSWORD_HASHING_PROCESSES: int = 0
+    PASSWORD_HASHING_MAX_PENDING: int = 64
     SERVER_NAME: str
     SERVER_HOST: AnyHttpUrl
     # BACKEND_CORS_ORIGINS is a JSON-formatted list of origins
@@ -51,6 +78,59 @@ class Settings(BaseSettings):
             path=f"/{values.get('POSTGRES_DB') or ''}",
         )
 
+    # read replicas serving read-only services (comma-separated or a JSON list);
+    # a replica failing to connect is skipped for REPLICA_RETRY_SECONDS
+    SQLALCHEMY_REPLICA_URIS: Union[str, List[PostgresDsn]] = []
+    REPLICA_RETRY_SECONDS: int = 30
+
+    @validator("SQLALCHEMY_REPLICA_URIS", pre=True)
+    def assemble_replica_uris(cls, v: Union[str, List[str]]) -> Union[List[str], str]:
+        if isinstance(v, str) and not v.startswith("["):
+            return [i.strip() for i in v.split(",") if i.strip()]
+        elif isinstance(v, (list, str)):
+            return v
+        raise ValueError(v)
+
+    # flag a request running the same SQL statement more than this many times
+    # (likely N+1 queries), 0 disables
+    QUERY_REPEAT_THRESHOLD: int = 10
+    # keep the last SLOW_QUERY_LOG_SIZE statements slower than this along with
+    # their plan, 0 disables; on PostgreSQL a slow SELECT runs again for
+    # EXPLAIN ANALYZE
+    SLOW_QUERY_THRESHOLD_MS: int = 0
+    SLOW_QUERY_LOG_SIZE: int = 100
+
+    # database time allowed to a request of the routes bounding it, 0 disables;
+    # on timeout the client is told to retry after DB_DEADLINE_RETRY_AFTER_SECONDS
+    DB_DEADLINE_MS: int = 5000
+    DB_DEADLINE_RETRY_AFTER_SECONDS: int = 1
+
+    # reload every written entity after commit (one SELECT each) instead of
+    # keeping the state returned by the flush
+    UOW_REFRESH_ON_COMMIT: bool = False
+    # items written per transaction by the bulk endpoints
+    BULK_CHUNK_SIZE: int = 500
+    # rows fetched from the server-side cursor per chunk of an export
+    EXPORT_BATCH_SIZE: int = 1000
+    # rows validated and loaded per transaction by an import
+    IMPORT_CHUNK_SIZE: int = 5000
+
+    # serve requests through the asyncio engine instead of the blocking one
+    DB_ASYNC: bool = False
+    ASYNC_SQLALCHEMY_DATABASE_URI: Optional[str] = None
+
+    @validator("ASYNC_SQLALCHEMY_DATABASE_URI", pre=True)
+    def assemble_async_db_connection(
+        cls, v: Optional[str], values: Dict[str, Any]
+    ) -> Optional[str]:
+        if isinstance(v, str):
+            return v
+        sync_uri = values.get("SQLALCHEMY_DATABASE_URI")
+        if not sync_uri:
+            return None
+        rest = sync_uri.split("://", maxsplit=1)[1]
+        return f"postgresql+asyncpg://{rest}"
+
     SMTP_TLS: bool = True
     SMTP_PORT: Optional[int] = None
     SMTP_HOST: Optional[str] = None
@@ -94,6 +174,47 @@ class Settings(BaseSettings):
     PUBSUB_AUTOCREATE_TOPIC: Optional[bool] = False
     PUBSUB_AUTOCREATE_SUBSCRIPTION: Optional[bool] = False
 
+    # a batch is sent once it holds MAX_MESSAGES or MAX_BYTES, or is MAX_LATENCY_MS old
+    PUBSUB_BATCH_MAX_MESSAGES: int = 100
+    PUBSUB_BATCH_MAX_BYTES: int = 1000 * 1000
+    PUBSUB_BATCH_MAX_LATENCY_MS: int = 10
+    # messages not sent yet beyond these limits make publishing "block",
+    # raise an "error" or are let through with "ignore"
+    PUBSUB_FLOW_CONTROL_MAX_MESSAGES: int = 1000
+    PUBSUB_FLOW_CONTROL_MAX_BYTES: int = 10 * 1000 * 1000
+    PUBSUB_FLOW_CONTROL_BEHAVIOR: str = "block"
+
+    # topic of the domain events written to the outbox, unset records none
+    EVENTS_TOPIC_ID: Optional[str] = None
+    # messages claimed per relay transaction, and the pause once drained
+    OUTBOX_BATCH_SIZE: int = 500
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 1.0
+    OUTBOX_PUBLISH_TIMEOUT_SECONDS: int = 30
+    # run the relay in a thread of the Pub/Sub worker
+    OUTBOX_RELAY_IN_WORKER: bool = False
+
+    # worker threads handling messages, and the outstanding messages
+    # past which the worker stops pulling more
+    WORKER_THREADS: int = 10
+    WORKER_FLOW_CONTROL_MAX_MESSAGES: int = 1000
+    WORKER_FLOW_CONTROL_MAX_BYTES: int = 100 * 1024 * 1024
+    # messages of a batch handler are handled together once MAX_MESSAGES
+    # are pending or the first is MAX_LATENCY_MS old, 0 or 1 disables batching;
+    # those the handler rejects go to the dead-letter topic if set, as do
+    # those still failing at delivery attempt DEAD_LETTER_MAX_ATTEMPTS (known
+    # with a dead letter policy on the subscription); others are nacked
+    WORKER_BATCH_MAX_MESSAGES: int = 100
+    WORKER_BATCH_MAX_LATENCY_MS: int = 50
+    WORKER_DEAD_LETTER_TOPIC_ID: Optional[str] = None
+    WORKER_DEAD_LETTER_MAX_ATTEMPTS: int = 5
+    # subscriber processes run by `python -m src.worker` (--processes);
+    # with several, the supervisor logs their health, also written
+    # to WORKER_HEALTH_FILE as JSON if set
+    WORKER_PROCESSES: int = 1
+    WORKER_HEARTBEAT_SECONDS: int = 10
+    WORKER_HEALTH_INTERVAL_SECONDS: int = 30
+    WORKER_HEALTH_FILE: Optional[str] = None
+
     class Config:
         case_sensitive = True
 
@@ -1,4 +1,15 @@
-from .item import Item, ItemCreate, ItemInDB, ItemUpdate
+from .item import (
+    Item,
+    ItemBulkResult,
+    ItemBulkUpdate,
+    ItemCreate,
+    ItemImportResult,
+    ItemInDB,
+    ItemUpdate,
+    ItemWithOwner,
+)
 from .msg import Msg
 from .token import Token, TokenPayload
-from .user import User, UserCreate, UserInDB, UserUpdate
+from .user import User, UserCreate, UserInDB, UserUpdate, UserWithItems
+
+ItemWithOwner.update_forward_refs(User=User)
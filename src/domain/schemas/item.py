@@ -1,7 +1,10 @@
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 from pydantic import BaseModel
 
+if TYPE_CHECKING:
+    from .user import User
+
 
 # Shared properties
 class ItemBase(BaseModel):
@@ -19,6 +22,11 @@ class ItemUpdate(ItemBase):
     pass
 
 
+# Properties to receive for each item of a bulk update
+class ItemBulkUpdate(ItemUpdate):
+    id: int
+
+
 # Properties shared by models stored in DB
 class ItemInDBBase(ItemBase):
     id: int
@@ -37,3 +45,23 @@ class Item(ItemInDBBase):
 # Properties properties stored in DB
 class ItemInDB(ItemInDBBase):
     pass
+
+
+# Outcome of one entry of a bulk request, `index` is its position in the request;
+# status is "created", "updated", "deleted", "not_found" or "forbidden"
+class ItemBulkResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    status: str
+    item: Optional[Item] = None
+
+
+# Outcome of an import: rows loaded and rows that could not be parsed or validated
+class ItemImportResult(BaseModel):
+    accepted: int = 0
+    rejected: int = 0
+
+
+# Item returned along with its owner (`User` is resolved in __init__)
+class ItemWithOwner(Item):
+    owner: "User"
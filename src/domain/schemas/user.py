@@ -1,7 +1,9 @@
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, EmailStr
 
+from .item import Item
+
 
 # Shared properties
 class UserBase(BaseModel):
@@ -34,6 +36,11 @@ class User(UserInDBBase):
     pass
 
 
+# User returned along with their items
+class UserWithItems(User):
+    items: List[Item] = []
+
+
 # Additional properties stored in DB
 class UserInDB(UserInDBBase):
     hashed_password: str
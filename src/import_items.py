@@ -0,0 +1,51 @@
+"""Import items from a file, e.g.
+`python -m src.import_items items.csv --owner admin@example.com`.
+"""
+import argparse
+import logging
+import sys
+
+from src.adapters import orm
+from src.services import item as item_service, unit_of_work
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="NDJSON or CSV file, - for stdin")
+    parser.add_argument("--owner", required=True, help="email of the items owner")
+    parser.add_argument(
+        "--format",
+        choices=["ndjson", "csv"],
+        help="defaults to csv for a .csv file, ndjson otherwise",
+    )
+    args = parser.parse_args()
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+
+    orm.start_mappers()
+    uow = unit_of_work.SqlAlchemyUnitOfWork()
+    with uow:
+        owner = uow.users.get_by_email(args.owner)
+        owner_id = owner.id if owner is not None else None
+    if owner_id is None:
+        sys.exit(f"No user {args.owner}")
+
+    logger.info("Importing items from %s", args.path)
+    try:
+        # binary lines, decoded by the service one at a time
+        if args.path == "-":
+            result = item_service.import_items(uow, sys.stdin.buffer, fmt, owner_id)
+        else:
+            with open(args.path, "rb") as lines:
+                result = item_service.import_items(uow, lines, fmt, owner_id)
+    except item_service.ItemImportException as e:
+        logger.info("Accepted %d, rejected %d", e.result.accepted, e.result.rejected)
+        sys.exit(str(e))
+    logger.info("Accepted %d, rejected %d", result.accepted, result.rejected)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Report index sizes and usage, e.g. `python -m src.index_audit --unused`."""
+import argparse
+from typing import List, Optional
+
+from src.adapters.index_stats import IndexStats, index_stats
+from src.adapters.session import engine
+
+
+def _format(value: Optional[int]) -> str:
+    return "-" if value is None else str(value)
+
+
+def report(stats: List[IndexStats]) -> str:
+    lines = [f"{'table':<20} {'index':<32} {'size':>12} {'scans':>12}  notes"]
+    for s in stats:
+        notes = []
+        if s.unique:
+            notes.append("unique")
+        if s.unused:
+            notes.append("UNUSED")
+        lines.append(
+            f"{s.table:<20} {s.name:<32} {_format(s.size_bytes):>12} "
+            f"{_format(s.scans):>12}  {', '.join(notes)}"
+        )
+
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--unused", action="store_true", help="only list indexes never scanned"
+    )
+    args = parser.parse_args()
+
+    with engine.connect() as connection:
+        stats = index_stats(connection)
+
+    if args.unused:
+        stats = [s for s in stats if s.unused]
+
+    print(report(stats))
+
+
+if __name__ == "__main__":
+    main()
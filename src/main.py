@@ -5,7 +5,11 @@ from sqlalchemy.exc import ArgumentError
 
 from src import backend_pre_start
 from src.adapters import orm
+from src.adapters.publisher import publisher
+from src.adapters.session import DeadlineExceeded
 from src.api.api_v1.api import api_router
+from src.api.deadlines import deadline_exceeded_handler
+from src.api.middleware import QueryStatsMiddleware
 from src.config import settings
 
 backend_pre_start.main()
@@ -28,6 +32,16 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["Link", "X-Next-Cursor", "X-Total-Count"],
     )
 
+app.add_middleware(QueryStatsMiddleware)
+app.add_exception_handler(DeadlineExceeded, deadline_exceeded_handler)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
+
+
+@app.on_event("shutdown")
+def stop_publisher() -> None:
+    # send the batches still open
+    publisher.stop()
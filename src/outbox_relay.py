@@ -0,0 +1,26 @@
+"""Relay outbox messages to Pub/Sub until interrupted,
+e.g. `python -m src.outbox_relay`; run more for more throughput.
+"""
+import signal
+import threading
+
+from src import backend_pre_start
+from src.adapters.publisher import publisher
+from src.services import outbox as outbox_service, unit_of_work
+
+
+def main() -> None:
+    backend_pre_start.main()
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stop.set())
+
+    try:
+        outbox_service.relay(unit_of_work.SqlAlchemyUnitOfWork(), publisher, stop)
+    finally:
+        publisher.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Handlers of Pub/Sub messages, dispatched by their "event" attribute."""
+import json
+from typing import Callable, Collection, Dict, List, Mapping, Optional, Tuple
+
+from pydantic import ValidationError
+
+from . import item as item_service
+from .unit_of_work import AbstractUnitOfWork
+from src.domain import schemas
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+# handler(uow, data, attributes) returns False for the message to be redelivered
+Handler = Callable[[AbstractUnitOfWork, bytes, Mapping[str, str]], Optional[bool]]
+
+HANDLERS = {}  # type: Dict[str, Handler]
+
+# batch_handler(uow, messages) handles (data, attributes) messages in one
+# transaction, returns the indexes of those it rejected
+BatchHandler = Callable[
+    [AbstractUnitOfWork, List[Tuple[bytes, Mapping[str, str]]]],
+    Optional[Collection[int]],
+]
+
+BATCH_HANDLERS = {}  # type: Dict[str, BatchHandler]
+
+
+def handler(event: str) -> Callable[[Handler], Handler]:
+    """Register the decorated function for messages of `event`."""
+
+    def register(fn: Handler) -> Handler:
+        HANDLERS[event] = fn
+        return fn
+
+    return register
+
+
+def batch_handler(event: str) -> Callable[[BatchHandler], BatchHandler]:
+    """Register the decorated function for batches of `event` messages."""
+
+    def register(fn: BatchHandler) -> BatchHandler:
+        BATCH_HANDLERS[event] = fn
+        return fn
+
+    return register
+
+
+def log_message(
+    uow: AbstractUnitOfWork, data: bytes, attributes: Mapping[str, str]
+) -> None:
+    """Default handler, only logs the message (acked, whatever its data)."""
+    logger.info(
+        "Received message: '%s' %s",
+        data.decode("utf-8", errors="replace"),
+        dict(attributes),
+    )
+
+
+def dispatch(
+    uow: AbstractUnitOfWork,
+    data: bytes,
+    attributes: Mapping[str, str],
+    handlers: Mapping[str, Handler] = HANDLERS,
+    batch_handlers: Mapping[str, BatchHandler] = BATCH_HANDLERS,
+) -> bool:
+    """Run the handler of a message, whether it is done with (to be acked).
+
+    An event with only a batch handler gets a batch of one, messages
+    without a registered event go to `log_message`.
+    """
+    event = attributes.get("event", "")
+    if event not in handlers and event in batch_handlers:
+        return not batch_handlers[event](uow, [(data, attributes)])
+
+    fn = handlers.get(event, log_message)
+    return fn(uow, data, attributes) is not False
+
+
+@batch_handler("item.create")
+def create_items(
+    uow: AbstractUnitOfWork, messages: List[Tuple[bytes, Mapping[str, str]]]
+) -> List[int]:
+    """Create the items of {"owner_id": .., "title": .., ...} JSON messages."""
+    objs_in = []
+    rejected = []
+    for index, (data, _) in enumerate(messages):
+        try:
+            payload = json.loads(data)
+            objs_in.append(
+                (schemas.ItemCreate.parse_obj(payload), int(payload["owner_id"]))
+            )
+        except (ValueError, TypeError, KeyError, ValidationError):
+            rejected.append(index)
+
+    if objs_in:
+        item_service.create_batch(uow, objs_in)
+
+    return rejected
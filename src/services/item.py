@@ -1,9 +1,27 @@
 """Item services"""
-from typing import Any, Dict, List, Optional, Union
+from collections import Counter
+import csv
+import itertools
+import json
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
 
-from .unit_of_work import AbstractUnitOfWork
+from .outbox import record_event, recording_events
+from .unit_of_work import AbstractAsyncUnitOfWork, AbstractUnitOfWork, read_only
+from src.config import settings
 from src.domain import schemas
 from src.domain.item import Item
 
@@ -21,11 +39,14 @@ def create(
         item_obj = Item(**item_data)
 
         item = uow.items.add(item_obj)
+        uow.items.change_owner_count(owner_id, 1)
+        record_event(uow, "item.created", schemas.Item, item)
 
         uow.commit()
         return item
 
 
+@read_only
 def get_by_id(uow: AbstractUnitOfWork, item_id: int) -> Optional[Item]:
     """Get item information by ID."""
     with uow:
@@ -61,6 +82,7 @@ def update(
                 setattr(item, field, update_data[field])
 
         item = uow.items.add(item)
+        record_event(uow, "item.updated", schemas.Item, item)
 
         uow.commit()
 
@@ -78,26 +100,333 @@ def delete(uow: AbstractUnitOfWork, item_id: int, owner_id: int = None) -> Item:
             raise ItemPermissionException()
 
         uow.items.remove(item_id)
+        uow.items.change_owner_count(item.owner_id, -1)
+        record_event(uow, "item.deleted", schemas.Item, item)
 
         uow.commit()
 
         return item
 
 
-def get_list(uow: AbstractUnitOfWork, skip: int, limit: int) -> List[Item]:
+def _chunks(objs: Sequence) -> Iterator[Tuple[int, Sequence]]:
+    """Split into (start index, chunk) of BULK_CHUNK_SIZE."""
+    size = max(settings.BULK_CHUNK_SIZE, 1)
+    for start in range(0, len(objs), size):
+        end = start + size
+        yield start, objs[start:end]
+
+
+def create_many(
+    uow: AbstractUnitOfWork,
+    objs_in: Sequence[Union[schemas.ItemCreate, Dict[str, Any]]],
+    owner_id: int,
+) -> List[schemas.ItemBulkResult]:
+    """Create items, one transaction per chunk."""
+    results = []
+    for start, chunk in _chunks(objs_in):
+        with uow:
+            items = uow.items.add_many(
+                [
+                    Item(**jsonable_encoder(obj_in), owner_id=owner_id)
+                    for obj_in in chunk
+                ]
+            )
+            uow.items.change_owner_count(owner_id, len(items))
+            for item in items:
+                record_event(uow, "item.created", schemas.Item, item)
+
+            uow.commit()
+
+        results.extend(
+            schemas.ItemBulkResult(index=index, id=item.id, status="created", item=item)
+            for index, item in enumerate(items, start)
+        )
+
+    return results
+
+
+def create_batch(
+    uow: AbstractUnitOfWork,
+    objs_in: Sequence[Tuple[Union[schemas.ItemCreate, Dict[str, Any]], int]],
+) -> List[Item]:
+    """Create items of any owners, given as (item, owner id), in one transaction."""
+    with uow:
+        items = uow.items.add_many(
+            [
+                Item(**jsonable_encoder(obj_in), owner_id=owner_id)
+                for obj_in, owner_id in objs_in
+            ]
+        )
+        for owner_id, count in Counter(owner_id for _, owner_id in objs_in).items():
+            uow.items.change_owner_count(owner_id, count)
+        for item in items:
+            record_event(uow, "item.created", schemas.Item, item)
+
+        uow.commit()
+
+    return items
+
+
+def update_many(
+    uow: AbstractUnitOfWork,
+    objs_in: Sequence[Union[schemas.ItemBulkUpdate, Dict[str, Any]]],
+    owner_id: int = None,
+) -> List[schemas.ItemBulkResult]:
+    """Update items by their ids, one transaction per chunk.
+
+    With `owner_id` only that user's items are loaded (and so updated),
+    the others are reported as "forbidden" or "not_found".
+    """
+    results = []
+    for start, chunk in _chunks(objs_in):
+        update_data = [
+            obj_in if isinstance(obj_in, dict) else obj_in.dict(exclude_unset=True)
+            for obj_in in chunk
+        ]
+        ids = [data["id"] for data in update_data]
+
+        with uow:
+            found = {item.id: item for item in uow.items.list_by_ids(ids, owner_id)}
+            existing = uow.items.existing_ids(set(ids) - set(found))
+
+            chunk_results = []
+            for index, data in enumerate(update_data, start):
+                item = found.get(data["id"])
+                if item is None:
+                    status = "forbidden" if data["id"] in existing else "not_found"
+                    chunk_results.append((index, data["id"], status, None))
+                    continue
+
+                for field in schemas.ItemUpdate.__fields__:
+                    if field in data:
+                        setattr(item, field, data[field])
+
+                uow.items.add(item)
+                record_event(uow, "item.updated", schemas.Item, item)
+                chunk_results.append((index, item.id, "updated", item))
+
+            uow.commit()
+
+        results.extend(
+            schemas.ItemBulkResult(index=index, id=id, status=status, item=item)
+            for index, id, status, item in chunk_results
+        )
+
+    return results
+
+
+def delete_many(
+    uow: AbstractUnitOfWork, ids: Sequence[int], owner_id: int = None
+) -> List[schemas.ItemBulkResult]:
+    """Delete items by ids (also respecting their owner), a transaction per chunk."""
+    results = []
+    for start, chunk in _chunks(ids):
+        with uow:
+            found = {item.id: item for item in uow.items.list_by_ids(chunk, owner_id)}
+            existing = uow.items.existing_ids(set(chunk) - set(found))
+
+            if found:
+                uow.items.remove_many(found, owner_id)
+                deleted = Counter(item.owner_id for item in found.values())
+                for item_owner_id, count in deleted.items():
+                    uow.items.change_owner_count(item_owner_id, -count)
+                for item in found.values():
+                    record_event(uow, "item.deleted", schemas.Item, item)
+
+            uow.commit()
+
+        for index, item_id in enumerate(chunk, start):
+            item = found.get(item_id)
+            if item is not None:
+                status = "deleted"
+            elif item_id in existing:
+                status = "forbidden"
+            else:
+                status = "not_found"
+
+            results.append(
+                schemas.ItemBulkResult(
+                    index=index, id=item_id, status=status, item=item
+                )
+            )
+
+    return results
+
+
+def _parse_rows(lines: Iterable[Union[str, bytes]], fmt: str) -> Iterator[Any]:
+    """Rows of NDJSON or CSV (with a header) lines, None for unparsable ones.
+
+    Empty CSV fields are read as null, as the CSV export writes them.
+    Bytes lines are decoded as UTF-8 one at a time, so an undecodable
+    one fails only once the lines before it were read.
+    """
+    lines = (
+        line.decode("utf-8") if isinstance(line, bytes) else line for line in lines
+    )
+    if fmt == "csv":
+        for row in csv.DictReader(lines):
+            # values past the header are under the None key
+            yield {key: value or None for key, value in row.items() if key is not None}
+        return
+
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def import_items(
+    uow: AbstractUnitOfWork,
+    lines: Iterable[Union[str, bytes]],
+    fmt: str,
+    owner_id: int,
+) -> schemas.ItemImportResult:
+    """Create items of `owner_id` from NDJSON or CSV lines (str or UTF-8 bytes).
+
+    Rows are validated as ItemCreate and loaded IMPORT_CHUNK_SIZE at a time,
+    one transaction per chunk, so `lines` may be of any length. The bulk
+    load returns no ids, so while events are recorded the items are added
+    as entities instead, to record them with theirs; the unit of work lets
+    go of each chunk's entities once its block exits, memory stays flat.
+
+    Input that can't be read on (not UTF-8, malformed CSV) ends the import
+    with ItemImportException, once the rows read before are loaded.
+    """
+    result = schemas.ItemImportResult()
+    parsed = _parse_rows(lines, fmt)
+    error = None
+    while True:
+        chunk = []  # type: List[Any]
+        try:
+            for raw in itertools.islice(parsed, max(settings.IMPORT_CHUNK_SIZE, 1)):
+                chunk.append(raw)
+        except (UnicodeDecodeError, csv.Error) as e:
+            error = e
+
+        if not chunk and error is None:
+            return result
+
+        rows = []
+        for raw in chunk:
+            try:
+                obj_in = schemas.ItemCreate.parse_obj(raw)
+            except ValidationError:
+                result.rejected += 1
+                continue
+            rows.append(dict(obj_in.dict(), owner_id=owner_id))
+
+        if rows:
+            with uow:
+                if recording_events():
+                    items = uow.items.add_many([Item(**row) for row in rows])
+                    for item in items:
+                        record_event(uow, "item.created", schemas.Item, item)
+                else:
+                    uow.items.import_rows(rows)
+                uow.items.change_owner_count(owner_id, len(rows))
+
+                uow.commit()
+
+        result.accepted += len(rows)
+        if error is not None:
+            raise ItemImportException(f"Unreadable input: {error}", result)
+
+
+@read_only
+def search(
+    uow: AbstractUnitOfWork,
+    text: str,
+    limit: int,
+    owner_id: int = None,
+    after: Tuple[float, int] = None,
+) -> List[Tuple[Item, float]]:
+    """Items matching `text` (only of `owner_id` if given) with their rank"""
+    with uow:
+        results = uow.items.search(text, limit, owner_id=owner_id, after=after)
+
+        return results
+
+
+# fields of the exported rows
+EXPORT_COLUMNS = list(schemas.Item.__fields__)
+
+
+@read_only
+def export_rows(
+    uow: AbstractUnitOfWork, batch_size: int = None
+) -> Iterator[List[Dict[str, Any]]]:
+    """All items as EXPORT_COLUMNS rows, streamed in batches"""
+    with uow:
+        yield from uow.items.stream_rows(
+            EXPORT_COLUMNS, batch_size or settings.EXPORT_BATCH_SIZE
+        )
+
+
+async def export_rows_async(
+    uow: AbstractAsyncUnitOfWork, batch_size: int = None
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """`export_rows` for the asyncio stack."""
+    async with uow:
+        async for batch in uow.items.stream_rows(
+            EXPORT_COLUMNS, batch_size or settings.EXPORT_BATCH_SIZE
+        ):
+            yield batch
+
+
+@read_only
+def count(
+    uow: AbstractUnitOfWork, owner_id: int = None, estimated: bool = False
+) -> int:
+    """Number of items (of `owner_id` if given), estimated if asked to"""
+    with uow:
+        if estimated:
+            return uow.items.estimated_count(owner_id)
+
+        return uow.items.count(owner_id)
+
+
+@read_only
+def get_list(
+    uow: AbstractUnitOfWork, skip: int, limit: int, after_id: int = None
+) -> List[Item]:
     """List of items"""
     with uow:
-        items = uow.items.list(skip, limit)
+        items = uow.items.list(skip, limit, after_id=after_id)
 
         return items
 
 
+@read_only
+def get_list_with_owner(
+    uow: AbstractUnitOfWork,
+    skip: int,
+    limit: int,
+    after_id: int = None,
+    owner_id: int = None,
+) -> List[Item]:
+    """List of items with their owner (only of `owner_id` if given)"""
+    with uow:
+        items = uow.items.list_with_owner(
+            skip, limit, after_id=after_id, owner_id=owner_id
+        )
+
+        return items
+
+
+@read_only
 def get_list_by_owner(
-    uow: AbstractUnitOfWork, owner_id: int, skip: int, limit: int
+    uow: AbstractUnitOfWork,
+    owner_id: int,
+    skip: int,
+    limit: int,
+    after_id: int = None,
 ) -> List[Item]:
     """List of items"""
     with uow:
-        items = uow.items.list_by_owner(owner_id, skip, limit)
+        items = uow.items.list_by_owner(owner_id, skip, limit, after_id=after_id)
 
         return items
 
@@ -108,3 +437,11 @@ class ItemNotFoundException(Exception):
 
 class ItemPermissionException(Exception):
     ...
+
+
+class ItemImportException(Exception):
+    """An import ended early, `result` counts the rows handled until then."""
+
+    def __init__(self, message: str, result: schemas.ItemImportResult):
+        super().__init__(message)
+        self.result = result
@@ -0,0 +1,93 @@
+"""Outbox services: recording domain events and relaying them to Pub/Sub."""
+import threading
+from typing import Any, Type
+
+from pydantic import BaseModel
+
+from .unit_of_work import AbstractUnitOfWork
+from src.adapters.publisher import Publisher
+from src.config import settings
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def recording_events() -> bool:
+    """Whether `record_event` records anything, i.e. EVENTS_TOPIC_ID is set."""
+    return bool(settings.EVENTS_TOPIC_ID)
+
+
+def record_event(
+    uow: AbstractUnitOfWork, event: str, schema: Type[BaseModel], obj: Any
+) -> None:
+    """Publish `obj` as `schema` once the current transaction commits.
+
+    Nothing is recorded unless EVENTS_TOPIC_ID is set.
+    """
+    if recording_events():
+        uow.outbox.add(settings.EVENTS_TOPIC_ID, event, schema, obj)
+
+
+def relay_batch(uow: AbstractUnitOfWork, publisher: Publisher, batch_size: int) -> int:
+    """Publish up to `batch_size` outbox messages, return how many were sent.
+
+    The messages stay locked, so skipped by other relays, until they are
+    published and deleted; a failed one is kept to be retried.
+    """
+    with uow:
+        messages = uow.outbox.claim(batch_size)
+        # all published at once, the publisher batches them per topic
+        futures = [
+            (
+                message.id,
+                publisher.publish(
+                    settings.PUBSUB_PROJECT_ID,
+                    message.topic,
+                    message.payload,
+                    event=message.event,
+                ),
+            )
+            for message in messages
+        ]
+
+        sent = []
+        for message_id, future in futures:
+            try:
+                future.result(timeout=settings.OUTBOX_PUBLISH_TIMEOUT_SECONDS)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning("Outbox message %d not published: %r", message_id, e)
+            else:
+                sent.append(message_id)
+
+        uow.outbox.remove_many(sent)
+        uow.commit()
+
+    return len(sent)
+
+
+def relay(
+    uow: AbstractUnitOfWork,
+    publisher: Publisher,
+    stop: threading.Event,
+    batch_size: int = None,
+    poll_interval: float = None,
+) -> None:
+    """Relay outbox messages until `stop` is set.
+
+    Batches follow each other while they come back full, the outbox
+    is polled every `poll_interval` seconds once drained.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    if poll_interval is None:
+        poll_interval = settings.OUTBOX_POLL_INTERVAL_SECONDS
+
+    logger.info("Relaying outbox messages")
+    while not stop.is_set():
+        try:
+            sent = relay_batch(uow, publisher, batch_size)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Outbox relay failed")
+            sent = 0
+
+        if sent < batch_size:
+            stop.wait(poll_interval)
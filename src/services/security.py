@@ -1,17 +1,33 @@
 """Security-related services."""
+import asyncio
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union
+from functools import partial
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Union
 
+from fastapi.concurrency import run_in_threadpool
 from jose import jwt
 from passlib.context import CryptContext
+from sqlalchemy.util import await_only
 
+from src.adapters.cache import LRUCache
 from src.config import settings
+from src.domain import schemas
+from src.services.unit_of_work import in_async_bridge
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 ALGORITHM = "HS256"
 
+# raw token -> verified claims
+token_cache = LRUCache(
+    maxsize=settings.ACCESS_TOKEN_CACHE_SIZE,
+    ttl=settings.ACCESS_TOKEN_CACHE_TTL_SECONDS,
+)
+
 
 def create_access_token(
     subject: Union[str, Any], expires_delta: timedelta = None
@@ -27,9 +43,149 @@ def create_access_token(
     return encoded_jwt
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+def decode_access_token(token: str) -> schemas.TokenPayload:
+    """Verify the token and return its claims.
+
+    Tokens that passed verification once are served from the cache
+    until the cache TTL or the token's `exp`, whichever comes first.
+    Raises jwt.JWTError or ValidationError for invalid tokens.
+    """
+    token_data = token_cache.get(token)
+    if token_data is not None:
+        return token_data
+
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+    token_data = schemas.TokenPayload(**payload)
+    token_cache.set(token, token_data, expires_at=payload.get("exp"))
+
+    return token_data
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
-def get_password_hash(password: str) -> str:
+def _hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+class HashingExecutor:
+    """Bounded process pool for password hashing.
+
+    bcrypt keeps a thread busy for hundreds of milliseconds, so hashing
+    is moved out of the threadpool serving requests. At most `max_pending`
+    jobs are in flight, further submissions block until a slot frees up.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self._pool = None  # type: Optional[ProcessPoolExecutor]
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # created lazily so that forking app servers get a pool per worker
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        self._slots.acquire()
+        with self._lock:
+            self.pending += 1
+
+        # the latency includes handing the job over to the pool
+        started = time.perf_counter()
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except Exception:
+            self._done(started, None)
+            raise
+
+        future.add_done_callback(partial(self._done, started))
+        return future
+
+    def _done(self, started: float, future: Optional[Future]) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.pending -= 1
+            if future is not None:
+                self.completed += 1
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+        self._slots.release()
+
+    def stats(self) -> Dict[str, float]:
+        """Queue depth and hash latency (measured from submission)."""
+        with self._lock:
+            completed = self.completed
+            return {
+                "pending": self.pending,
+                "queue_depth": max(self.pending - self.max_workers, 0),
+                "completed": completed,
+                "avg_latency_ms": (
+                    1000 * self.total_seconds / completed if completed else 0.0
+                ),
+                "max_latency_ms": 1000 * self.max_seconds,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+hashing_executor = (
+    HashingExecutor(
+        max_workers=settings.PASSWORD_HASHING_PROCESSES,
+        max_pending=settings.PASSWORD_HASHING_MAX_PENDING,
+    )
+    if settings.PASSWORD_HASHING_PROCESSES
+    else None
+)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    # blocks its thread until hashed; endpoints await the _async versions
+    # instead, keeping threadpool threads free
+    if in_async_bridge():
+        return await_only(verify_password_async(plain_password, hashed_password))
+
+    if hashing_executor is None:
+        return _verify(plain_password, hashed_password)
+
+    return hashing_executor.submit(_verify, plain_password, hashed_password).result()
+
+
+def get_password_hash(password: str) -> str:
+    if in_async_bridge():
+        return await_only(get_password_hash_async(password))
+
+    if hashing_executor is None:
+        return _hash(password)
+
+    return hashing_executor.submit(_hash, password).result()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    if hashing_executor is None:
+        return await run_in_threadpool(_verify, plain_password, hashed_password)
+
+    future = await run_in_threadpool(
+        hashing_executor.submit, _verify, plain_password, hashed_password
+    )
+    return await asyncio.wrap_future(future)
+
+
+async def get_password_hash_async(password: str) -> str:
+    if hashing_executor is None:
+        return await run_in_threadpool(_hash, password)
+
+    future = await run_in_threadpool(hashing_executor.submit, _hash, password)
+    return await asyncio.wrap_future(future)
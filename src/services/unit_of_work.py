@@ -1,18 +1,85 @@
 # pylint: disable=attribute-defined-outside-init
 from __future__ import annotations
 from abc import ABC, abstractmethod
+import contextlib
+import contextvars
+import functools
+import inspect as pyinspect
+import itertools
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm.session import Session
 from src.adapters.repository import (
     user as user_repo,
     item as item_repo,
+    outbox as outbox_repo,
+)
+from src.adapters.session import (
+    ASYNC_SESSION_FACTORY,
+    DEFAULT_SESSION_FACTORY,
+    REPLICAS,
+    ReplicaSet,
 )
-from src.adapters.session import DEFAULT_SESSION_FACTORY
+from src.config import settings
+
+
+T = TypeVar("T")
+
+_async_bridge = contextvars.ContextVar("async_bridge", default=False)
+
+
+def in_async_bridge() -> bool:
+    """Whether sync service code is run by `AsyncSqlAlchemyUnitOfWork.run`.
+
+    Blocking calls other than DB access must then be awaited with
+    `sqlalchemy.util.await_only` to keep the event loop free.
+    """
+    return _async_bridge.get()
+
+
+def read_only(fn: Callable[..., T]) -> Callable[..., T]:
+    """Mark a service function `fn(uow, ...)` as not writing.
+
+    Its unit of work may then be served by a read replica. A generator
+    function keeps that mode until it is exhausted.
+    """
+    if pyinspect.isgeneratorfunction(fn):
+
+        @functools.wraps(fn)
+        def generator_wrapper(uow: AbstractUnitOfWork, *args: Any, **kwargs: Any):
+            with uow.for_reading():
+                yield from fn(uow, *args, **kwargs)
+
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(uow: AbstractUnitOfWork, *args: Any, **kwargs: Any) -> T:
+        with uow.for_reading():
+            return fn(uow, *args, **kwargs)
+
+    return wrapper
 
 
 class AbstractUnitOfWork(ABC):
     users: user_repo.AbstractRepository
     items: item_repo.AbstractRepository
+    outbox: outbox_repo.AbstractRepository
+
+    # set while a `read_only` service runs
+    reading = False
 
     def __enter__(self) -> AbstractUnitOfWork:
         return self
@@ -20,6 +87,18 @@ class AbstractUnitOfWork(ABC):
     def __exit__(self, *args):
         self.rollback()
 
+    @contextlib.contextmanager
+    def for_reading(self) -> Iterator[AbstractUnitOfWork]:
+        reading, self.reading = self.reading, True
+        try:
+            yield self
+        finally:
+            self.reading = reading
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call a service function `fn(uow, ...)` from async code."""
+        return await run_in_threadpool(fn, self, *args, **kwargs)
+
     @abstractmethod
     def commit(self):
         raise NotImplementedError
@@ -29,29 +108,240 @@ class AbstractUnitOfWork(ABC):
         raise NotImplementedError
 
 
+class AbstractAsyncUnitOfWork(ABC):
+    users: user_repo.AbstractAsyncRepository
+    items: item_repo.AbstractAsyncRepository
+
+    async def __aenter__(self) -> AbstractAsyncUnitOfWork:
+        return self
+
+    async def __aexit__(self, *args):
+        await self.rollback()
+
+    @abstractmethod
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def commit(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def rollback(self):
+        raise NotImplementedError
+
+
+# the unit of work of a request, per DB_ASYNC: services are called through
+# `run` on either, only the asyncio one can stream on the event loop
+RequestUnitOfWork = Union[AbstractUnitOfWork, AbstractAsyncUnitOfWork]
+
+
 class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
-    def __init__(self, session_factory=DEFAULT_SESSION_FACTORY):
+    """Unit of work on the primary database.
+
+    Read-only services go to one of `replicas` instead, until something
+    has been committed through this unit of work (read-your-writes).
+    """
+
+    def __init__(
+        self,
+        session_factory=DEFAULT_SESSION_FACTORY,
+        refresh_on_commit: bool = None,
+        replicas: ReplicaSet = None,
+    ):
         self.session_factory = session_factory
+        if refresh_on_commit is None:
+            refresh_on_commit = settings.UOW_REFRESH_ON_COMMIT
+        self.refresh_on_commit = refresh_on_commit
+        self.replicas = REPLICAS if replicas is None else replicas
+        self.wrote = False
 
     def __enter__(self):
-        self.session = self.session_factory()  # type: Session
-        self.users = user_repo.SqlAlchemyRepository(self.session)
-        self.items = item_repo.SqlAlchemyRepository(self.session)
+        self._open()
 
         return super().__enter__()
 
+    def _open(self):
+        session = None
+        if self.reading and not self.wrote:
+            session = self.replicas.open_session(self.session_factory)
+        if session is None:
+            session = self.session_factory()
+
+        self._use(session)
+
+    def _use(self, session: Session):
+        self.session = session
+        # unless refreshing, entities keep the state written by the flush:
+        # generated keys and defaults come back with the INSERT (RETURNING)
+        self.session.expire_on_commit = self.refresh_on_commit
+        self.users = user_repo.SqlAlchemyRepository(self.session)
+        self.items = item_repo.SqlAlchemyRepository(self.session)
+        self.outbox = outbox_repo.SqlAlchemyRepository(self.session)
+
     def __exit__(self, *args):
         self.session.expunge_all()
         super().__exit__(*args)
         self.session.close()
 
     def commit(self):
+        if self.outbox.pending:
+            # events are written once the flush gave new entities their ids
+            self.session.flush()
+            self.outbox.write_pending()
         self.session.commit()
-        for item in self.users.modified:
-            self.session.refresh(item)
+        self.wrote = True
+        for item in self._take_modified():
+            if self.refresh_on_commit:
+                self.session.refresh(item)
+            else:
+                # relationships are left to be loaded like on fetched entities
+                self.session.expire(item, inspect(item).mapper.relationships.keys())
 
-        for item in self.items.modified:
-            self.session.refresh(item)
+    def _take_modified(self) -> List[Any]:
+        """Entities written since the last commit or rollback, forgotten here."""
+        modified = list(itertools.chain(self.users.modified, self.items.modified))
+        self.users.modified.clear()
+        self.items.modified.clear()
+        return modified
 
     def rollback(self):
+        self.outbox.pending.clear()
+        self._take_modified()
         self.session.rollback()
+
+
+class RequestScopedUnitOfWork(SqlAlchemyUnitOfWork):
+    """Unit of work whose session lives as long as the request.
+
+    All `with uow:` blocks of a request (authentication, services) share
+    one session and connection, a block only rolls back when it raises.
+    Reads served by a replica share a second one.
+    `close()` ends the sessions once the request is served.
+    """
+
+    session = None  # type: Optional[Session]
+    primary_session = None  # type: Optional[Session]
+    replica_session = None  # type: Optional[Session]
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        # committed by the current block, expunged when it exits
+        self.committed = []  # type: List[Any]
+
+    def commit(self):
+        committed = list(itertools.chain(self.users.modified, self.items.modified))
+        super().commit()
+        self.committed.extend(committed)
+
+    def __enter__(self):
+        if self.reading and not self.wrote:
+            if self.replica_session is None:
+                self.replica_session = self.replicas.open_session(
+                    self.session_factory
+                ) or self._primary_session()
+            session = self.replica_session
+        else:
+            session = self._primary_session()
+
+        if session is not self.session:
+            self._use(session)
+
+        return self
+
+    def _primary_session(self) -> Session:
+        if self.primary_session is None:
+            self.primary_session = self.session_factory()
+
+        return self.primary_session
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is not None:
+            self.rollback()
+
+        # so the entities of a request's blocks don't pile up in its session,
+        # like the plain unit of work expunging all of them on exit
+        for entity in self.committed:
+            if entity in self.session:
+                self.session.expunge(entity)
+        self.committed.clear()
+
+    def close(self):
+        for session in {self.primary_session, self.replica_session}:
+            if session is not None:
+                session.expunge_all()
+                session.close()
+
+        self.session = self.primary_session = self.replica_session = None
+
+
+def _run_in_bridge(
+    session: Session, fn: Callable[..., T], args: Tuple, kwargs: Dict[str, Any]
+) -> T:
+    token = _async_bridge.set(True)
+    try:
+        # the async unit of work owns the session, the bridged one never closes it
+        uow = RequestScopedUnitOfWork(lambda: session, replicas=ReplicaSet([], 0))
+        return fn(uow, *args, **kwargs)
+    finally:
+        _async_bridge.reset(token)
+
+
+class AsyncSqlAlchemyUnitOfWork(AbstractAsyncUnitOfWork):
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory or ASYNC_SESSION_FACTORY
+
+    async def __aenter__(self):
+        self._open()
+
+        return await super().__aenter__()
+
+    def _open(self):
+        self.session = self.session_factory()  # type: AsyncSession
+        self.users = user_repo.AsyncSqlAlchemyRepository(self.session)
+        self.items = item_repo.AsyncSqlAlchemyRepository(self.session)
+
+    async def __aexit__(self, *args):
+        self.session.expunge_all()
+        await super().__aexit__(*args)
+        await self.session.close()
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call a sync service function `fn(uow, ...)` on the asyncio engine.
+
+        The service gets a regular unit of work bound to this session, and
+        SQLAlchemy's greenlet bridge awaits its queries on the event loop,
+        so no threadpool thread is taken.
+        """
+        async with self:
+            return await self.session.run_sync(_run_in_bridge, fn, args, kwargs)
+
+    async def commit(self):
+        await self.session.commit()
+
+    async def rollback(self):
+        await self.session.rollback()
+
+
+class AsyncRequestScopedUnitOfWork(AsyncSqlAlchemyUnitOfWork):
+    """`RequestScopedUnitOfWork` for the asyncio stack."""
+
+    session = None  # type: Optional[AsyncSession]
+
+    async def __aenter__(self):
+        if self.session is None:
+            self._open()
+
+        return self
+
+    async def __aexit__(self, exc_type, *args):
+        if exc_type is not None:
+            await self.rollback()
+
+    async def close(self):
+        if self.session is None:
+            return
+
+        self.session.expunge_all()
+        await self.session.close()
+        self.session = None
@@ -1,11 +1,13 @@
 """User services"""
 from datetime import timedelta
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
 
 from fastapi.encoders import jsonable_encoder
 
+from .outbox import record_event
 from .security import get_password_hash, verify_password
-from .unit_of_work import AbstractUnitOfWork
+from .unit_of_work import AbstractAsyncUnitOfWork, AbstractUnitOfWork, read_only
+from src.adapters.cache import create_cache
 from src.config import settings
 from src.domain import schemas
 from src.domain.user import User
@@ -21,9 +23,30 @@ from src.utils import (
 
 logger = get_logger(__name__)
 
+# user id -> principal data (see `get_principal`); a per-process cache isn't
+# evicted by changes made in other processes, so it keeps entries briefly
+principal_cache = create_cache(
+    settings.PRINCIPAL_CACHE_BACKEND,
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=(
+        settings.PRINCIPAL_CACHE_MEMORY_TTL_SECONDS
+        if settings.PRINCIPAL_CACHE_BACKEND == "memory"
+        else settings.PRINCIPAL_CACHE_TTL_SECONDS
+    ),
+    prefix="principal:",
+)
+
+
+def create(
+    uow: AbstractUnitOfWork, user_data: schemas.UserCreate, hashed_password: str = None
+) -> User:
+    """Create new user.
 
-def create(uow: AbstractUnitOfWork, user_data: schemas.UserCreate) -> User:
-    """Create new user."""
+    Async callers pass `hashed_password`, hashed without holding a thread.
+    """
+    if hashed_password is None:
+        # hash before a DB connection is checked out
+        hashed_password = get_password_hash(user_data.password)
 
     with uow:
         user = uow.users.get_by_email(email=user_data.email)
@@ -32,13 +55,14 @@ def create(uow: AbstractUnitOfWork, user_data: schemas.UserCreate) -> User:
 
         user = User(
             email=user_data.email,
-            hashed_password=get_password_hash(user_data.password),
+            hashed_password=hashed_password,
             full_name=user_data.full_name,
             is_active=user_data.is_active,
             is_superuser=user_data.is_superuser,
         )
 
         uow.users.add(user)
+        record_event(uow, "user.created", schemas.User, user)
         if settings.EMAILS_ENABLED and user.email:
             send_new_account_email(
                 email_to=user.email, username=user.email, password=user_data.password
@@ -50,6 +74,7 @@ def create(uow: AbstractUnitOfWork, user_data: schemas.UserCreate) -> User:
         return user
 
 
+@read_only
 def get_by_id(uow: AbstractUnitOfWork, user_id: int) -> Optional[User]:
     """Get user information by ID."""
     with uow:
@@ -58,19 +83,61 @@ def get_by_id(uow: AbstractUnitOfWork, user_id: int) -> Optional[User]:
         return user
 
 
+def get_principal(uow: AbstractUnitOfWork, user_id: int) -> Optional[User]:
+    """Get the authenticated user, served from the principal cache if possible.
+
+    A cached principal is a detached `User` carrying no password hash.
+    Misses are read from the primary: a lagging replica would cache flags
+    an update just changed for the whole TTL.
+    """
+    data = principal_cache.get(user_id)
+    if data is None:
+        with uow:
+            user = uow.users.get(id=user_id)
+            if not user:
+                return None
+
+            data = schemas.User.from_orm(user).dict()
+            principal_cache.set(user_id, data)
+
+    return User(hashed_password="", **data)
+
+
+async def get_principal_async(
+    uow: AbstractAsyncUnitOfWork, user_id: int
+) -> Optional[User]:
+    """`get_principal` for the asyncio stack."""
+    data = principal_cache.get(user_id)
+    if data is None:
+        async with uow:
+            user = await uow.users.get(id=user_id)
+            if not user:
+                return None
+
+            data = schemas.User.from_orm(user).dict()
+            principal_cache.set(user_id, data)
+
+    return User(hashed_password="", **data)
+
+
 def update_by_id(
     uow: AbstractUnitOfWork,
     user_id: int,
     obj_in: Union[schemas.UserUpdate, Dict[str, Any]],
+    hashed_password: str = None,
 ) -> User:
-    """Update user information."""
+    """Update user information.
+
+    Async callers pass the new password as `hashed_password` (see `create`).
+    """
     if isinstance(obj_in, dict):
-        update_data = obj_in
+        update_data = dict(obj_in)
     else:
         update_data = obj_in.dict(exclude_unset=True)
-    if update_data.get("password"):
+    if update_data.get("password") and hashed_password is None:
         hashed_password = get_password_hash(update_data["password"])
-        del update_data["password"]
+    update_data.pop("password", None)
+    if hashed_password is not None:
         update_data["hashed_password"] = hashed_password
 
     with uow:
@@ -86,23 +153,75 @@ def update_by_id(
                 setattr(user, field, update_data[field])
 
         uow.users.add(user)
+        record_event(uow, "user.updated", schemas.User, user)
 
         uow.commit()
+        principal_cache.delete(user.id)
         logger.info("User with id %d updated", user.id)
 
         return user
 
 
-def get_list(uow: AbstractUnitOfWork, skip: int, limit: int) -> List[User]:
+@read_only
+def get_list(
+    uow: AbstractUnitOfWork, skip: int, limit: int, after_id: int = None
+) -> List[User]:
     """List of users"""
     with uow:
-        users = uow.users.list(skip, limit)
+        users = uow.users.list(skip, limit, after_id=after_id)
 
         return users
 
 
-def generate_auth_token(uow: AbstractUnitOfWork, email: str, password: str) -> str:
-    """Ensure user exists and passwords match."""
+@read_only
+def get_list_with_items(
+    uow: AbstractUnitOfWork, skip: int, limit: int, after_id: int = None
+) -> List[User]:
+    """List of users with their items"""
+    with uow:
+        users = uow.users.list_with_items(skip, limit, after_id=after_id)
+
+        return users
+
+
+# fields of the exported rows
+EXPORT_COLUMNS = list(schemas.User.__fields__)
+
+
+@read_only
+def export_rows(
+    uow: AbstractUnitOfWork, batch_size: int = None
+) -> Iterator[List[Dict[str, Any]]]:
+    """All users as EXPORT_COLUMNS rows, streamed in batches"""
+    with uow:
+        yield from uow.users.stream_rows(
+            EXPORT_COLUMNS, batch_size or settings.EXPORT_BATCH_SIZE
+        )
+
+
+async def export_rows_async(
+    uow: AbstractAsyncUnitOfWork, batch_size: int = None
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """`export_rows` for the asyncio stack."""
+    async with uow:
+        async for batch in uow.users.stream_rows(
+            EXPORT_COLUMNS, batch_size or settings.EXPORT_BATCH_SIZE
+        ):
+            yield batch
+
+
+@read_only
+def count(uow: AbstractUnitOfWork, estimated: bool = False) -> int:
+    """Number of users, estimated if asked to"""
+    with uow:
+        if estimated:
+            return uow.users.estimated_count()
+
+        return uow.users.count()
+
+
+def get_login_user(uow: AbstractUnitOfWork, email: str) -> User:
+    """The active user of `email`, whose password is to be checked."""
     with uow:
         user = uow.users.get_by_email(email=email)
 
@@ -111,14 +230,27 @@ def generate_auth_token(uow: AbstractUnitOfWork, email: str, password: str) -> s
         elif not user.is_active:
             raise UserInactiveException()
 
-        if not verify_password(password, user.hashed_password):
-            raise UserNotFoundException()
+        return user
 
-        access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
 
-        return security.create_access_token(user.id, expires_delta=access_token_expires)
+def create_auth_token(user: User) -> str:
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
 
+    return security.create_access_token(user.id, expires_delta=access_token_expires)
 
+
+def generate_auth_token(uow: AbstractUnitOfWork, email: str, password: str) -> str:
+    """Ensure user exists and passwords match."""
+    user = get_login_user(uow, email)
+
+    # the connection is released while the password is being checked
+    if not verify_password(password, user.hashed_password):
+        raise UserNotFoundException()
+
+    return create_auth_token(user)
+
+
+@read_only
 def recover_password(uow: AbstractUnitOfWork, email: str) -> None:
     """Get user data and send recovery email."""
     with uow:
@@ -134,24 +266,36 @@ def recover_password(uow: AbstractUnitOfWork, email: str) -> None:
         )
 
 
-def reset_password(uow: AbstractUnitOfWork, token: str, new_password: str) -> None:
-    """Reset password on provided user input."""
-    with uow:
-        email = verify_password_reset_token(token)
-        if not email:
-            raise InvalidTokenException()
+def reset_password(
+    uow: AbstractUnitOfWork,
+    token: str,
+    new_password: str,
+    hashed_password: str = None,
+) -> None:
+    """Reset password on provided user input.
+
+    Async callers pass `hashed_password` (see `create`).
+    """
+    email = verify_password_reset_token(token)
+    if not email:
+        raise InvalidTokenException()
+
+    if hashed_password is None:
+        hashed_password = get_password_hash(new_password)
 
+    with uow:
         user = uow.users.get_by_email(email=email)
         if not user:
             raise UserNotFoundException()
         elif not user.is_active:
             raise UserInactiveException()
 
-        hashed_password = get_password_hash(new_password)
         user.hashed_password = hashed_password
         uow.users.add(user)
+        record_event(uow, "user.updated", schemas.User, user)
 
         uow.commit()
+        principal_cache.delete(user.id)
         logger.info("User with id %d updated", user.id)
 
 
@@ -161,9 +305,10 @@ def authenticate(uow: AbstractUnitOfWork, email: str, password: str) -> Optional
         user = uow.users.get_by_email(email=email)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
-            return None
-        return user
+
+    if not verify_password(password, user.hashed_password):
+        return None
+    return user
 
 
 class UserNotFoundException(Exception):
@@ -0,0 +1,189 @@
+"""Run a process function in N forked children, restarting crashed ones."""
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class ChildStatus:
+    """Heartbeat and message counts a child shares with the supervisor."""
+
+    def __init__(self, context: Any):
+        # heartbeat timestamp, acked, nacked
+        self._values = context.Array("d", 3)
+
+    def report(self, acked: int, nacked: int) -> None:
+        with self._values.get_lock():
+            self._values[:] = [time.time(), acked, nacked]
+
+    def read(self) -> Tuple[float, int, int]:
+        with self._values.get_lock():
+            heartbeat, acked, nacked = self._values[:]
+        return heartbeat, int(acked), int(nacked)
+
+    def reset(self) -> None:
+        with self._values.get_lock():
+            self._values[:] = [0, 0, 0]
+
+
+class Supervisor:
+    """Keeps `processes` children running `target(status)` until stopped.
+
+    Children are forked, so nothing holding sockets or threads (DB pools,
+    gRPC channels) must be opened before `run`. A child that exits is
+    started again after `restart_delay` seconds; on `stop` children get
+    SIGTERM and, past `shutdown_timeout`, SIGKILL. Message counts are kept
+    per slot across restarts: before a child is replaced its last report
+    is added to the slot's totals.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        target: Callable[[ChildStatus], None],
+        restart_delay: float = 1.0,
+        shutdown_timeout: float = 30.0,
+        stale_after: float = 60.0,
+        health_file: Optional[str] = None,
+        health_interval: float = 30.0,
+    ):
+        self.target = target
+        self.restart_delay = restart_delay
+        self.shutdown_timeout = shutdown_timeout
+        self.stale_after = stale_after
+        self.health_file = health_file
+        self.health_interval = health_interval
+        self._context = multiprocessing.get_context("fork")
+        self.children = [None] * processes  # type: List[Any]
+        self.statuses = [ChildStatus(self._context) for _ in range(processes)]
+        self.restarts = [0] * processes
+        self.acked = [0] * processes
+        self.nacked = [0] * processes
+        self._stop = threading.Event()
+
+    def _start(self, index: int) -> None:
+        process = self._context.Process(
+            target=self._child_main, args=(index,), name=f"worker-{index}"
+        )
+        process.start()
+        self.children[index] = process
+        logger.info("Started worker %d, pid %d", index, process.pid)
+
+    def _child_main(self, index: int) -> None:
+        # the target installs its own handlers, the supervisor's must go;
+        # Ctrl-C reaches the whole process group, children are stopped
+        # gracefully by the SIGTERM the supervisor then sends them
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        self.target(self.statuses[index])
+
+    def stop(self, *args: Any) -> None:
+        """Ask `run` to stop the children and return, usable as signal handler."""
+        self._stop.set()
+
+    def run(self) -> None:
+        for index in range(len(self.children)):
+            self._start(index)
+
+        next_health = time.monotonic()
+        while not self._stop.wait(self.restart_delay):
+            for index, process in enumerate(self.children):
+                if not process.is_alive():
+                    logger.warning(
+                        "Worker %d (pid %d) exited with %s, restarting",
+                        index,
+                        process.pid,
+                        process.exitcode,
+                    )
+                    self.restarts[index] += 1
+                    self._collect(index)
+                    self._start(index)
+
+            if time.monotonic() >= next_health:
+                self._report_health()
+                next_health = time.monotonic() + self.health_interval
+
+        self._shutdown()
+
+    def _collect(self, index: int) -> None:
+        # the exited child's counts would be lost when its successor reports
+        _, acked, nacked = self.statuses[index].read()
+        self.acked[index] += acked
+        self.nacked[index] += nacked
+        self.statuses[index].reset()
+
+    def _shutdown(self) -> None:
+        for process in self.children:
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for process in self.children:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning("Worker pid %d did not stop, killing it", process.pid)
+                process.kill()
+                process.join()
+
+        logger.info("Workers stopped")
+
+    def health(self) -> Dict[str, Any]:
+        """Liveness of the children and their summed message counts.
+
+        Counts include those of earlier, restarted children. Healthy when
+        every child is alive and reported within `stale_after`.
+        """
+        now = time.time()
+        children = []
+        for index, (process, status) in enumerate(zip(self.children, self.statuses)):
+            heartbeat, acked, nacked = status.read()
+            children.append(
+                {
+                    "index": index,
+                    "pid": process.pid if process is not None else None,
+                    "alive": process is not None and process.is_alive(),
+                    "restarts": self.restarts[index],
+                    "heartbeat_age": now - heartbeat if heartbeat else None,
+                    "acked": self.acked[index] + acked,
+                    "nacked": self.nacked[index] + nacked,
+                }
+            )
+
+        return {
+            "healthy": all(
+                child["alive"]
+                and child["heartbeat_age"] is not None
+                and child["heartbeat_age"] < self.stale_after
+                for child in children
+            ),
+            "processes": len(children),
+            "alive": sum(child["alive"] for child in children),
+            "restarts": sum(self.restarts),
+            "acked": sum(child["acked"] for child in children),
+            "nacked": sum(child["nacked"] for child in children),
+            "children": children,
+        }
+
+    def _report_health(self) -> None:
+        health = self.health()
+        logger.info(
+            "Workers %d/%d alive, %d restarts, %d acked, %d nacked",
+            health["alive"],
+            health["processes"],
+            health["restarts"],
+            health["acked"],
+            health["nacked"],
+        )
+        if self.health_file:
+            # replaced at once, so a probe never reads it half written
+            tmp_path = f"{self.health_file}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(health, f)
+            os.replace(tmp_path, self.health_file)
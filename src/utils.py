@@ -2,7 +2,6 @@ from datetime import datetime, timedelta
 import logging
 from logging.handlers import TimedRotatingFileHandler
 from pathlib import Path
-import time
 from typing import Any, Dict, Optional
 
 import emails
@@ -201,34 +200,3 @@ def create_pull_subscription(
             str(subscription_path),
             str(topic_path),
         )
-
-
-def publish_with_err_handler(project_id: str, topic_id: str, data: str) -> None:
-    """Publish a message to the topic specified."""
-    publisher = pubsub_v1.PublisherClient()
-    topic_path = publisher.topic_path(project_id, topic_id)
-
-    futures = dict()
-
-    def get_callback(f, data):
-        def callback(f):
-            try:
-                logger.debug(f.result())
-                futures.pop(data)
-            except Exception:
-                logger.error("Please handle %s for %s.", f.exception(), data)
-
-        return callback
-
-    futures.update({data: None})
-    # When you publish a message, the client returns a future.
-    future = publisher.publish(topic_path, data.encode("utf-8"))
-    futures[data] = future
-    # Publish failures shall be handled in the callback function.
-    future.add_done_callback(get_callback(future, data))
-
-    # Wait for all the publish futures to resolve before exiting.
-    while futures:
-        time.sleep(5)
-
-    logger.info("Published message %s with error handler to %s", data, str(topic_path))
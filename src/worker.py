@@ -6,13 +6,24 @@ https://tecadmin.net/setup-autorun-python-script-using-systemd/
 
 Core functionality taken from https://cloud.google.com/pubsub/docs/pull
 """
+import argparse
+from concurrent.futures import Future, ThreadPoolExecutor
+import signal
+import threading
 import time
-from concurrent.futures import TimeoutError  # pylint: disable=redefined-builtin
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
 
 from google.cloud import pubsub_v1
+from google.cloud.pubsub_v1.subscriber.scheduler import ThreadScheduler
+from sqlalchemy.exc import ArgumentError
 
 from src import backend_pre_start
+from src.adapters import orm
+from src.adapters.publisher import publisher
+from src.adapters.session import engine
 from src.config import settings
+from src.services import handlers, outbox as outbox_service, unit_of_work
+from src.supervisor import ChildStatus, Supervisor
 from src.utils import create_topic, create_pull_subscription, get_logger
 
 
@@ -28,39 +39,373 @@ def init_pubsub(project_id: str, topic_id: str, subscription_id: str):
         create_pull_subscription(project_id, topic_id, subscription_id)
 
 
-def callback(message):
-    """Simplest callback for a pubsub message"""
-    # simply write to the log
-    logger.info("Received message: '%s'", str(message))
-    message.ack()
+class MessageCallback:
+    """Subscriber callback running the registered handler of each message.
 
+    Called from the scheduler threads; each thread has a unit of work
+    of its own. A message is acked when its handler is done with it,
+    nacked (so redelivered) when it returns False or raises. Events with
+    only a batch handler are handled in batches of one.
+    """
 
-backend_pre_start.main()
+    def __init__(
+        self,
+        uow_factory: Callable[[], unit_of_work.AbstractUnitOfWork] = (
+            unit_of_work.SqlAlchemyUnitOfWork
+        ),
+        handler_map: Mapping[str, handlers.Handler] = handlers.HANDLERS,
+        batch_handler_map: Mapping[str, handlers.BatchHandler] = (
+            handlers.BATCH_HANDLERS
+        ),
+    ):
+        self.uow_factory = uow_factory
+        self.handler_map = handler_map
+        self.batch_handler_map = batch_handler_map
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.acked = 0
+        self.nacked = 0
 
-init_pubsub(
-    settings.PUBSUB_PROJECT_ID,
-    settings.TOPIC_ID,
-    settings.SUBSCRIPTION_ID,
-)
+    @property
+    def uow(self) -> unit_of_work.AbstractUnitOfWork:
+        if not hasattr(self._local, "uow"):
+            self._local.uow = self.uow_factory()
+        return self._local.uow
 
-subscriber = pubsub_v1.SubscriberClient()
-# The `subscription_path` method creates a fully qualified identifier
-# in the form `projects/{project_id}/subscriptions/{subscription_id}`
-subscription_path = subscriber.subscription_path(
-    settings.PUBSUB_PROJECT_ID, settings.SUBSCRIPTION_ID
-)
+    def __call__(self, message) -> None:
+        try:
+            done = handlers.dispatch(
+                self.uow,
+                message.data,
+                message.attributes,
+                self.handler_map,
+                self.batch_handler_map,
+            )
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Handling message %s failed", message.message_id)
+            done = False
 
-streaming_pull_future = subscriber.subscribe(subscription_path, callback=callback)
-logger.info("Listening for messages on %s..\n", str(subscription_path))
+        if done:
+            message.ack()
+        else:
+            message.nack()
 
-# Wrap subscriber in a 'with' block to automatically call close() when done.
-with subscriber:
-    try:
-        # When `timeout` is not set, result() will block indefinitely,
-        # unless an exception is encountered first.
-        time.sleep(5)
+        with self._lock:
+            if done:
+                self.acked += 1
+            else:
+                self.nacked += 1
+
+
+class MessageBatcher(MessageCallback):
+    """Subscriber callback handling messages of a batch handler together.
+
+    Such messages are held until `max_messages` of an event are pending,
+    or the oldest has waited `max_latency` seconds, and then go to the
+    batch handler, which writes all of them in one transaction. They are
+    acked after it committed. A failed batch is retried one message at a
+    time. Messages the handler rejects are nacked or, with
+    `dead_letter_topic`, published there; those failing are nacked to be
+    redelivered, and dead-lettered only from delivery attempt
+    `max_attempts`. Other messages are handled one by one as by
+    MessageCallback.
+
+    Flow control must let at least `max_messages` be outstanding,
+    or batches are only ever sent by `max_latency`.
+    """
+
+    def __init__(
+        self,
+        max_messages: int,
+        max_latency: float,
+        uow_factory: Callable[[], unit_of_work.AbstractUnitOfWork] = (
+            unit_of_work.SqlAlchemyUnitOfWork
+        ),
+        handler_map: Mapping[str, handlers.Handler] = handlers.HANDLERS,
+        batch_handler_map: Mapping[str, handlers.BatchHandler] = (
+            handlers.BATCH_HANDLERS
+        ),
+        dead_letter_topic: Optional[str] = None,
+        max_attempts: int = 5,
+    ):
+        super().__init__(uow_factory, handler_map, batch_handler_map)
+        self.max_messages = max_messages
+        self.max_latency = max_latency
+        self.dead_letter_topic = dead_letter_topic
+        self.max_attempts = max_attempts
+        # event -> (time the first message came, messages)
+        self._pending = {}  # type: Dict[str, Tuple[float, List]]
+        self._ready = threading.Condition(self._lock)
+        self._closed = False
+        self.batches = 0
+        self.dead_lettered = 0
+        self._flusher = threading.Thread(
+            target=self._flush_expired, name="batch-flusher", daemon=True
+        )
+        self._flusher.start()
+
+    def __call__(self, message) -> None:
+        event = message.attributes.get("event", "")
+        if event not in self.batch_handler_map:
+            super().__call__(message)
+            return
+
+        with self._lock:
+            if self._closed:
+                # nothing would flush it, left to be redelivered
+                message.nack()
+                self.nacked += 1
+                return
+
+            _, messages = self._pending.setdefault(event, (time.monotonic(), []))
+            messages.append(message)
+            if len(messages) < self.max_messages:
+                if len(messages) == 1:
+                    # the flusher gets a deadline to wait for
+                    self._ready.notify()
+                return
+
+            del self._pending[event]
+
+        self._handle_batch(event, messages)
+
+    def _flush_expired(self) -> None:
         while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._ready.wait()
+                if self._closed:
+                    return
+
+                now = time.monotonic()
+                expired = [
+                    event
+                    for event, (started, _) in self._pending.items()
+                    if now - started >= self.max_latency
+                ]
+                if not expired:
+                    oldest = min(started for started, _ in self._pending.values())
+                    self._ready.wait(oldest + self.max_latency - now)
+                    continue
+
+                batches = [(event, self._pending.pop(event)[1]) for event in expired]
+
+            for event, messages in batches:
+                self._handle_batch(event, messages)
+
+    def _handle_batch(self, event: str, messages: List) -> None:
+        fn = self.batch_handler_map[event]
+        try:
+            batch = [(message.data, message.attributes) for message in messages]
+            rejected = set(fn(self.uow, batch) or ())
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Batch of %d %s messages failed", len(messages), event)
+            if len(messages) > 1:
+                # find out which ones fail, a transaction each
+                for message in messages:
+                    self._handle_batch(event, [message])
+            elif (messages[0].delivery_attempt or 0) >= self.max_attempts:
+                self._reject(messages[0])
+            else:
+                # may well pass once redelivered, e.g. after a deadlock
+                self._nack(messages[0])
+            return
+
+        for index, message in enumerate(messages):
+            if index in rejected:
+                self._reject(message)
+            else:
+                message.ack()
+
+        with self._lock:
+            self.batches += 1
+            self.acked += len(messages) - len(rejected)
+
+    def _nack(self, message) -> None:
+        message.nack()
+        with self._lock:
+            self.nacked += 1
+
+    def _reject(self, message) -> None:
+        if self.dead_letter_topic is None:
+            self._nack(message)
+            return
+
+        future = publisher.publish(
+            settings.PUBSUB_PROJECT_ID,
+            self.dead_letter_topic,
+            message.data,
+            **message.attributes,
+        )
+
+        def dead_lettered(future: Future) -> None:
+            # kept for redelivery while the dead-letter topic can't take it
+            if future.cancelled() or future.exception() is not None:
+                message.nack()
+            else:
+                message.ack()
+
+        future.add_done_callback(dead_lettered)
+        with self._lock:
+            self.dead_lettered += 1
+
+    def close(self, flush: bool = True) -> None:
+        """Handle the pending batches, or nack them, and stop the flusher.
+
+        Must be called while the stream is open, its acks are lost after.
+        Messages coming later are nacked.
+        """
+        with self._lock:
+            self._closed = True
+            batches = list(self._pending.items())
+            self._pending.clear()
+            self._ready.notify()
+
+        for event, (_, messages) in batches:
+            if flush:
+                self._handle_batch(event, messages)
+            else:
+                for message in messages:
+                    message.nack()
+                with self._lock:
+                    self.nacked += len(messages)
+        self._flusher.join()
+
+
+def subscribe(
+    subscriber: pubsub_v1.SubscriberClient, callback: Callable
+) -> pubsub_v1.subscriber.futures.StreamingPullFuture:
+    """Stream messages of SUBSCRIPTION_ID to `callback`.
+
+    At most WORKER_THREADS run at once, and flow control stops pulling
+    past WORKER_FLOW_CONTROL_MAX_MESSAGES/MAX_BYTES messages outstanding.
+    """
+    # The `subscription_path` method creates a fully qualified identifier
+    # in the form `projects/{project_id}/subscriptions/{subscription_id}`
+    subscription_path = subscriber.subscription_path(
+        settings.PUBSUB_PROJECT_ID, settings.SUBSCRIPTION_ID
+    )
+    executor = ThreadPoolExecutor(
+        max_workers=settings.WORKER_THREADS, thread_name_prefix="worker"
+    )
+    future = subscriber.subscribe(
+        subscription_path,
+        callback=callback,
+        flow_control=pubsub_v1.types.FlowControl(
+            max_messages=settings.WORKER_FLOW_CONTROL_MAX_MESSAGES,
+            max_bytes=settings.WORKER_FLOW_CONTROL_MAX_BYTES,
+        ),
+        scheduler=ThreadScheduler(executor),
+    )
+    logger.info("Listening for messages on %s..\n", str(subscription_path))
+    return future
+
+
+def _report_status(callback: MessageCallback, status: ChildStatus) -> None:
+    while True:
+        status.report(callback.acked, callback.nacked)
+        time.sleep(settings.WORKER_HEARTBEAT_SECONDS)
+
+
+def run(status: ChildStatus = None) -> None:
+    """Handle messages in this process until interrupted or terminated.
+
+    Under a supervisor, `status` gets its heartbeat and message counts.
+    """
+    init_pubsub(
+        settings.PUBSUB_PROJECT_ID,
+        settings.TOPIC_ID,
+        settings.SUBSCRIPTION_ID,
+    )
+
+    # handlers work on entities through the service layer
+    try:
+        orm.start_mappers()
+    except ArgumentError:
+        pass
+
+    if settings.OUTBOX_RELAY_IN_WORKER:
+        threading.Thread(
+            target=outbox_service.relay,
+            args=(unit_of_work.SqlAlchemyUnitOfWork(), publisher, threading.Event()),
+            name="outbox-relay",
+            daemon=True,
+        ).start()
+
+    if settings.WORKER_BATCH_MAX_MESSAGES > 1:
+        callback = MessageBatcher(
+            max_messages=settings.WORKER_BATCH_MAX_MESSAGES,
+            max_latency=settings.WORKER_BATCH_MAX_LATENCY_MS / 1000,
+            dead_letter_topic=settings.WORKER_DEAD_LETTER_TOPIC_ID,
+            max_attempts=settings.WORKER_DEAD_LETTER_MAX_ATTEMPTS,
+        )  # type: MessageCallback
+    else:
+        callback = MessageCallback()
+
+    if status is not None:
+        threading.Thread(
+            target=_report_status,
+            args=(callback, status),
+            name="status",
+            daemon=True,
+        ).start()
+
+    subscriber = pubsub_v1.SubscriberClient()
+    streaming_pull_future = subscribe(subscriber, callback)
+    stop = threading.Event()
+    streaming_pull_future.add_done_callback(lambda future: stop.set())
+    # stopped like by Ctrl-C, letting the messages being handled finish
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+
+    # Wrap subscriber in a 'with' block to automatically call close() when done.
+    with subscriber:
+        try:
+            # until the stream fails, or on SIGTERM/Ctrl-C
+            stop.wait()
+        except KeyboardInterrupt:
+            pass
+
+        try:
+            if isinstance(callback, MessageBatcher):
+                # before cancelling, which stops sending acks; a failed
+                # stream takes none, its held messages aren't committed
+                callback.close(flush=not streaming_pull_future.done())
+            streaming_pull_future.cancel()
+            # wait for the messages being handled
             streaming_pull_future.result()
+        finally:
+            publisher.stop()
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Handle Pub/Sub messages.")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=settings.WORKER_PROCESSES,
+        help="subscriber processes on the subscription, restarted if they crash",
+    )
+    args = parser.parse_args(argv)
+
+    backend_pre_start.main()
+
+    if args.processes <= 1:
+        run()
+        return
+
+    # the children must not share the connections of the pre-start check
+    engine.dispose()
+    supervisor = Supervisor(
+        args.processes,
+        run,
+        health_file=settings.WORKER_HEALTH_FILE,
+        health_interval=settings.WORKER_HEALTH_INTERVAL_SECONDS,
+        stale_after=3 * settings.WORKER_HEARTBEAT_SECONDS,
+    )
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, supervisor.stop)
+    supervisor.run()
+
 
-    except TimeoutError:
-        streaming_pull_future.cancel()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Per-call overhead of the repository hot queries.
+
+Compares the `session.query(...)` chains the repositories used to build on
+every call ("query") with their cached statements ("cached"), against the
+in-memory SQLite test database so that query construction and compilation
+dominate. Run with the test settings, e.g.
+`set -a; . tests/test.env; set +a; python -m tests.benchmarks.repository`.
+"""
+import timeit
+from typing import Callable, Dict
+
+from src.adapters.repository import item as item_repo, user as user_repo
+from src.config import settings
+from src.domain.item import Item
+from src.domain.user import User
+from src.services import unit_of_work
+from tests.session import SQLITE_SESSION_FACTORY
+from tests.utils.item import create_random_item
+
+NUMBER = 2000
+
+
+def _legacy_calls(session, item: Item) -> Dict[str, Callable[[], object]]:
+    return {
+        # expunged first, so that the lookup reaches the database
+        "get": lambda: (
+            session.expunge_all(),
+            session.query(Item).get(item.id),
+        ),
+        "get_by_email": lambda: session.query(User)
+        .filter_by(email=settings.FIRST_SUPERUSER)
+        .one_or_none(),
+        "list": lambda: session.query(Item)
+        .filter(Item.id > 0)
+        .order_by(Item.id)
+        .offset(0)
+        .limit(10)
+        .all(),
+        "list_by_owner": lambda: session.query(Item)
+        .filter_by(owner_id=item.owner_id)
+        .order_by(Item.id)
+        .offset(0)
+        .limit(10)
+        .all(),
+        "remove": lambda: session.query(Item).filter_by(id=-1).delete(),
+    }
+
+
+def _cached_calls(session, item: Item) -> Dict[str, Callable[[], object]]:
+    items = item_repo.SqlAlchemyRepository(session)
+    users = user_repo.SqlAlchemyRepository(session)
+    return {
+        "get": lambda: (session.expunge_all(), items.get(item.id)),
+        "get_by_email": lambda: users.get_by_email(settings.FIRST_SUPERUSER),
+        "list": lambda: items.list(0, 10, after_id=0),
+        "list_by_owner": lambda: items.list_by_owner(item.owner_id, 0, 10),
+        "remove": lambda: items.remove(-1),
+    }
+
+
+def main() -> None:
+    item = create_random_item(unit_of_work.SqlAlchemyUnitOfWork(SQLITE_SESSION_FACTORY))
+
+    session = SQLITE_SESSION_FACTORY()
+    try:
+        legacy = _legacy_calls(session, item)
+        cached = _cached_calls(session, item)
+        print(f"{'method':<16} {'query µs':>10} {'cached µs':>10} {'saved':>7}")
+        for name in legacy:
+            # warm up the compiled cache of both variants
+            legacy[name]()
+            cached[name]()
+            before = timeit.timeit(legacy[name], number=NUMBER) / NUMBER * 1e6
+            after = timeit.timeit(cached[name], number=NUMBER) / NUMBER * 1e6
+            print(
+                f"{name:<16} {before:>10.1f} {after:>10.1f} "
+                f"{1 - after / before:>7.0%}"
+            )
+    finally:
+        session.rollback()
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
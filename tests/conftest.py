@@ -5,8 +5,11 @@ from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
 from src.adapters.init_db import init_db
+from src.adapters.session import DeadlineExceeded
 from src.api import deps
 from src.api.api_v1.api import api_router
+from src.api.deadlines import deadline_exceeded_handler
+from src.api.middleware import QueryStatsMiddleware
 from src.config import settings
 from src.services import unit_of_work
 
@@ -31,6 +34,8 @@ def client() -> Generator:
     app = FastAPI(
         title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json"
     )
+    app.add_middleware(QueryStatsMiddleware)
+    app.add_exception_handler(DeadlineExceeded, deadline_exceeded_handler)
     app.include_router(api_router, prefix=settings.API_V1_STR)
 
     app.dependency_overrides[deps.get_uow] = deps.get_uow_sqlite_memory
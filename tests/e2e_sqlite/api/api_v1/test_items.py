@@ -1,8 +1,19 @@
+import csv
+import io
+import json
+
+import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event, text
 
+from src.adapters.session import slow_query_log
+from src.api.deadlines import timeouts
 from src.config import settings
-from src.services import unit_of_work
+from src.services import item as item_service, unit_of_work, user as user_service
+from tests.session import engine
+from tests.utils.db import query_count
 from tests.utils.item import create_random_item
+from tests.utils.utils import random_lower_string
 
 
 def test_create_item(
@@ -43,3 +54,330 @@ def test_read_item(
     assert content["description"] == item.description
     assert content["id"] == item.id
     assert content["owner_id"] == item.owner_id
+
+
+def test_read_items_by_cursor(
+    client: TestClient,
+    superuser_token_headers: dict,
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    for _ in range(3):
+        create_random_item(uow_sqlite)
+
+    first = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"limit": 2},
+    )
+    assert first.status_code == 200
+    cursor = first.headers["X-Next-Cursor"]
+    assert 'rel="next"' in first.headers["Link"]
+
+    second = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"limit": 2, "cursor": cursor},
+    )
+    assert second.status_code == 200
+    first_ids = [item["id"] for item in first.json()]
+    second_ids = [item["id"] for item in second.json()]
+    assert second_ids
+    assert max(first_ids) < min(second_ids)
+
+
+def test_read_items_invalid_cursor(
+    client: TestClient, superuser_token_headers: dict
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"cursor": "garbage"},
+    )
+    assert response.status_code == 400
+
+
+def test_update_item_checks_out_one_connection(
+    client: TestClient,
+    superuser_token_headers: dict,
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    item = create_random_item(uow_sqlite)
+    # make the authentication hit the database as well
+    user_service.principal_cache.clear()
+
+    checkouts = []
+    listener = lambda *args: checkouts.append(args)  # noqa: E731
+    event.listen(engine, "checkout", listener)
+    try:
+        response = client.put(
+            f"{settings.API_V1_STR}/items/{item.id}",
+            headers=superuser_token_headers,
+            json={"title": "updated"},
+        )
+    finally:
+        event.remove(engine, "checkout", listener)
+
+    assert response.status_code == 200
+    assert response.json()["title"] == "updated"
+    assert len(checkouts) == 1
+
+
+def test_bulk_items(
+    client: TestClient,
+    superuser_token_headers: dict,
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    created = client.post(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=superuser_token_headers,
+        json=[{"title": "one"}, {"title": "two", "description": "2"}],
+    )
+    assert created.status_code == 200
+    assert [r["status"] for r in created.json()] == ["created", "created"]
+    ids = [r["id"] for r in created.json()]
+
+    updated = client.put(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=superuser_token_headers,
+        json=[{"id": ids[0], "description": "1"}, {"id": -1, "title": "none"}],
+    )
+    assert updated.status_code == 200
+    assert [r["status"] for r in updated.json()] == ["updated", "not_found"]
+    assert updated.json()[0]["item"]["title"] == "one"
+    assert updated.json()[0]["item"]["description"] == "1"
+
+    deleted = client.delete(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=superuser_token_headers,
+        json=ids,
+    )
+    assert deleted.status_code == 200
+    assert [r["status"] for r in deleted.json()] == ["deleted", "deleted"]
+    response = client.get(
+        f"{settings.API_V1_STR}/items/{ids[0]}", headers=superuser_token_headers
+    )
+    assert response.status_code == 404
+
+
+def test_search_items(
+    client: TestClient,
+    superuser_token_headers: dict,
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    word = random_lower_string()
+    ids = [
+        client.post(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+            json={"title": f"{word} {i}"},
+        ).json()["id"]
+        for i in range(2)
+    ]
+
+    first = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=superuser_token_headers,
+        params={"q": word, "limit": 1},
+    )
+    assert first.status_code == 200
+    second = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=superuser_token_headers,
+        params={"q": word, "limit": 1, "cursor": first.headers["X-Next-Cursor"]},
+    )
+    assert second.status_code == 200
+    found = [item["id"] for item in first.json() + second.json()]
+    assert sorted(found) == sorted(ids)
+
+
+def test_read_items_total_count(
+    client: TestClient,
+    normal_user_token_headers: dict,
+) -> None:
+    for count in ("exact", "estimated"):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=normal_user_token_headers,
+            params={"count": count},
+        )
+        assert response.status_code == 200
+        assert int(response.headers["X-Total-Count"]) == len(response.json())
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers
+    )
+    assert "X-Total-Count" not in response.headers
+
+
+def test_read_items_query_count(
+    client: TestClient,
+    superuser_token_headers: dict,
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    for _ in range(3):
+        create_random_item(uow_sqlite)
+    user_service.principal_cache.clear()
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    # the principal + the page, however many items it has
+    assert query_count(response) == 2
+
+    # the principal is cached now
+    response = client.get(
+        f"{settings.API_V1_STR}/items/", headers=superuser_token_headers
+    )
+    assert query_count(response) == 1
+
+
+def test_slow_queries(
+    client: TestClient,
+    superuser_token_headers: dict,
+    normal_user_token_headers: dict,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(slow_query_log, "threshold", 1e-9)
+    slow_query_log.clear()
+    client.get(f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers)
+
+    response = client.get(
+        f"{settings.API_V1_STR}/basic_utils/slow-queries",
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 200
+    queries = response.json()["queries"]
+    assert any(
+        "item.owner_id = ?" in query["statement"] and query["plan"]
+        for query in queries
+    )
+
+    response = client.get(
+        f"{settings.API_V1_STR}/basic_utils/slow-queries",
+        headers=normal_user_token_headers,
+    )
+    assert response.status_code == 400
+
+
+def test_read_items_past_deadline(
+    client: TestClient,
+    superuser_token_headers: dict,
+    normal_user_token_headers: dict,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    def slow_list(uow: unit_of_work.AbstractUnitOfWork, **kwargs) -> list:
+        with uow:
+            uow.session.execute(
+                text(
+                    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c "
+                    "LIMIT 100000000) SELECT count(*) FROM c"
+                )
+            )
+        return []
+
+    monkeypatch.setattr(settings, "DB_DEADLINE_MS", 50)
+    monkeypatch.setattr(item_service, "get_list_by_owner", slow_list)
+    timeouts.clear()
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    response = client.get(
+        f"{settings.API_V1_STR}/basic_utils/db-timeouts",
+        headers=superuser_token_headers,
+    )
+    assert response.json()["timeouts"] == {f"GET {settings.API_V1_STR}/items/": 1}
+
+
+def test_read_items_with_owner(
+    client: TestClient,
+    superuser_token_headers: dict,
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    for _ in range(3):
+        create_random_item(uow_sqlite)
+    user_service.principal_cache.clear()
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/with-owner", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    items = response.json()
+    assert len(items) >= 3
+    assert all(item["owner"]["id"] == item["owner_id"] for item in items)
+    # the principal + the page joined with the owners
+    assert query_count(response) == 2
+
+
+def test_export_items(
+    client: TestClient,
+    superuser_token_headers: dict,
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    for _ in range(3):
+        create_random_item(uow_sqlite)
+    total = item_service.count(uow_sqlite)
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/export", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == total
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/export",
+        headers=superuser_token_headers,
+        params={"format": "csv"},
+    )
+    assert response.status_code == 200
+    csv_rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(csv_rows) == total
+    assert int(csv_rows[0]["id"]) == rows[0]["id"]
+
+
+def test_import_items(
+    client: TestClient,
+    normal_user_token_headers: dict,
+) -> None:
+    title = random_lower_string()
+    body = f"title,description\n{title},imported\n,no title\n"
+    response = client.post(
+        f"{settings.API_V1_STR}/items/import",
+        headers=normal_user_token_headers,
+        params={"format": "csv"},
+        files={"file": ("items.csv", body, "text/csv")},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"accepted": 1, "rejected": 1}
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=normal_user_token_headers,
+        params={"q": title},
+    )
+    assert [item["description"] for item in response.json()] == ["imported"]
+
+
+def test_import_items_rejects_non_utf8_file(
+    client: TestClient,
+    normal_user_token_headers: dict,
+) -> None:
+    body = '{"title": "before"}\n'.encode() + b'{"title": "\xff"}\n'
+    response = client.post(
+        f"{settings.API_V1_STR}/items/import",
+        headers=normal_user_token_headers,
+        files={"file": ("items.ndjson", body, "application/x-ndjson")},
+    )
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert (detail["accepted"], detail["rejected"]) == (1, 0)
+    assert detail["message"].startswith("Unreadable input")
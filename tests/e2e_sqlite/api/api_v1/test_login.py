@@ -1,8 +1,18 @@
-from typing import Dict
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, List
 
+from fastapi.concurrency import run_in_threadpool
 from fastapi.testclient import TestClient
+import pytest
 
+from src.api.api_v1.endpoints.login import login_access_token
 from src.config import settings
+from src.domain.schemas import UserCreate
+from src.services import security, unit_of_work, user as user_service
+from tests.session import SQLITE_SESSION_FACTORY
+from tests.utils.utils import random_email, random_lower_string
 
 
 def test_get_access_token(client: TestClient) -> None:
@@ -27,3 +37,61 @@ def test_use_access_token(
     result = r.json()
     assert r.status_code == 200
     assert "email" in result
+
+
+def test_login_leaves_threadpool_free_while_hashing(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    password = random_lower_string()
+    user = user_service.create(
+        uow_sqlite, UserCreate(email=random_email(), password=password)
+    )
+    submitted = []  # type: List[Future]
+
+    class PendingExecutor:
+        """Holds the hashes back until the test lets them finish."""
+
+        def submit(self, fn, *args) -> Future:
+            future = Future()  # type: Future
+            submitted.append(future)
+            future.job = (fn, args)
+            return future
+
+    monkeypatch.setattr(security, "hashing_executor", PendingExecutor())
+
+    async def scenario() -> List[dict]:
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=1)
+        )
+        form = SimpleNamespace(username=user.email, password=password)
+        uows = [
+            unit_of_work.RequestScopedUnitOfWork(SQLITE_SESSION_FACTORY)
+            for _ in range(3)
+        ]
+        logins = [asyncio.ensure_future(login_access_token(form, uow)) for uow in uows]
+        try:
+            for _ in range(500):
+                if len(submitted) == 3:
+                    break
+                await asyncio.sleep(0.01)
+
+            # all three logins wait for their hash, yet the only thread is free
+            free = await asyncio.wait_for(run_in_threadpool(lambda: "free"), 5)
+            assert free == "free"
+
+            for future in submitted:
+                fn, args = future.job
+                future.set_result(fn(*args))
+            return await asyncio.gather(*logins)
+        finally:
+            for uow in uows:
+                uow.close()
+
+    # a loop of its own, the client's must stay current
+    loop = asyncio.new_event_loop()
+    try:
+        tokens = loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+
+    assert [token["token_type"] for token in tokens] == ["bearer"] * 3
@@ -1,10 +1,15 @@
+import json
 from typing import Dict
 
 from fastapi.testclient import TestClient
 
+from src.api.pagination import encode_cursor
 from src.config import settings
 from src.domain.schemas.user import UserCreate
 from src.services import unit_of_work, user as user_service
+from tests.utils.db import query_count
+from tests.utils.item import create_random_item
+from tests.utils.user import create_random_user
 from tests.utils.utils import random_email, random_lower_string
 
 
@@ -133,3 +138,44 @@ def test_retrieve_users(
     assert len(all_users) > 1
     for item in all_users:
         assert "email" in item
+
+
+def test_read_users_with_items(
+    client: TestClient,
+    superuser_token_headers: Dict[str, str],
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    user = create_random_user(uow_sqlite)
+    items = [create_random_item(uow_sqlite, owner_id=user.id) for _ in range(2)]
+    user_service.principal_cache.clear()
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/with-items",
+        headers=superuser_token_headers,
+        params={"limit": 1, "cursor": encode_cursor(user.id - 1)},
+    )
+    assert r.status_code == 200
+    [user_data] = r.json()
+    assert user_data["id"] == user.id
+    assert [item["id"] for item in user_data["items"]] == [item.id for item in items]
+    # the principal, the page of users and one query for all their items
+    assert query_count(r) == 3
+
+
+def test_export_users(
+    client: TestClient,
+    superuser_token_headers: Dict[str, str],
+    normal_user_token_headers: Dict[str, str],
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/export", headers=superuser_token_headers
+    )
+    assert r.status_code == 200
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert settings.FIRST_SUPERUSER in {row["email"] for row in rows}
+    assert all("hashed_password" not in row for row in rows)
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/export", headers=normal_user_token_headers
+    )
+    assert r.status_code == 400
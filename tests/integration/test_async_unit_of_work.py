@@ -0,0 +1,96 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+
+from src.adapters.cache import LRUCache
+from src.adapters.orm import metadata
+from src.adapters.session import create_async_session_factory
+from src.domain.schemas.item import ItemCreate
+from src.domain.schemas.user import UserCreate
+from src.services import item as item_service, unit_of_work, user as user_service
+from src.services.security import verify_password
+from tests.utils.utils import random_email, random_lower_string
+
+
+@pytest.fixture
+def async_uow(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> unit_of_work.AsyncSqlAlchemyUnitOfWork:
+    # ids restart in the fresh database
+    monkeypatch.setattr(user_service, "principal_cache", LRUCache(maxsize=10, ttl=60))
+    db_path = tmp_path / "app.db"
+    metadata.create_all(create_engine(f"sqlite:///{db_path}"))
+    session_factory = create_async_session_factory(f"sqlite+aiosqlite:///{db_path}")
+    return unit_of_work.AsyncSqlAlchemyUnitOfWork(session_factory)
+
+
+def test_async_repositories(async_uow: unit_of_work.AsyncSqlAlchemyUnitOfWork) -> None:
+    async def scenario() -> None:
+        user = await async_uow.run(
+            user_service.create,
+            UserCreate(email=random_email(), password=random_lower_string()),
+        )
+
+        async with async_uow:
+            stored_user = await async_uow.users.get(user.id)
+            batches = [
+                batch async for batch in async_uow.users.stream_rows(["email"], 10)
+            ]
+
+        assert stored_user
+        assert stored_user.email == user.email
+        assert batches == [[{"email": user.email}]]
+
+    asyncio.run(scenario())
+
+
+def test_run_sync_services(async_uow: unit_of_work.AsyncSqlAlchemyUnitOfWork) -> None:
+    password = random_lower_string()
+
+    async def scenario() -> None:
+        user = await async_uow.run(
+            user_service.create, UserCreate(email=random_email(), password=password)
+        )
+        assert verify_password(password, user.hashed_password)
+
+        item = await async_uow.run(
+            item_service.create,
+            obj_in=ItemCreate(title="title", description="description"),
+            owner_id=user.id,
+        )
+        items = await async_uow.run(
+            item_service.get_list_by_owner, owner_id=user.id, skip=0, limit=10
+        )
+        assert [i.id for i in items] == [item.id]
+
+        principal = await user_service.get_principal_async(async_uow, user.id)
+        assert principal
+        assert principal.email == user.email
+
+    asyncio.run(scenario())
+
+
+def test_export_rows_async(async_uow: unit_of_work.AsyncSqlAlchemyUnitOfWork) -> None:
+    async def scenario() -> None:
+        user = await async_uow.run(
+            user_service.create,
+            UserCreate(email=random_email(), password=random_lower_string()),
+        )
+        item_ids = []
+        for i in range(3):
+            item = await async_uow.run(
+                item_service.create, obj_in=ItemCreate(title=str(i)), owner_id=user.id
+            )
+            item_ids.append(item.id)
+
+        batches = [
+            batch
+            async for batch in item_service.export_rows_async(async_uow, batch_size=2)
+        ]
+        assert [len(batch) for batch in batches] == [2, 1]
+        assert [row["id"] for batch in batches for row in batch] == item_ids
+        assert set(batches[0][0]) == set(item_service.EXPORT_COLUMNS)
+
+    asyncio.run(scenario())
@@ -0,0 +1,15 @@
+from src.adapters.index_stats import index_stats
+from src.index_audit import report
+from tests.session import engine
+
+
+def test_sqlite_index_stats() -> None:
+    with engine.connect() as connection:
+        stats = {(s.table, s.name): s for s in index_stats(connection)}
+
+    assert ("item", "ix_item_owner_id_id") in stats
+    assert stats[("user", "ix_user_email")].unique
+    assert ("item", "ix_item_description") not in stats
+    # no scan counts in SQLite, so nothing is reported as unused
+    assert not any(s.unused for s in stats.values())
+    assert "ix_item_owner_id_id" in report(list(stats.values()))
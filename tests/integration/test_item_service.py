@@ -1,5 +1,15 @@
-from src.domain.schemas.item import ItemCreate, ItemUpdate
+import csv
+
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+from src.config import settings
+from src.domain.item import Item
+from src.domain.schemas.item import ItemBulkUpdate, ItemCreate, ItemUpdate
 from src.services import unit_of_work, item as item_service
+from tests.session import engine
+from tests.utils.db import capture_statements
+from tests.utils.item import create_random_item
 from tests.utils.user import create_random_user
 from tests.utils.utils import random_lower_string
 
@@ -57,3 +67,235 @@ def test_delete_item(uow_sqlite: unit_of_work.AbstractUnitOfWork) -> None:
     assert item2.title == title
     assert item2.description == description
     assert item2.owner_id == user.id
+
+
+def test_get_list_by_owner_after_id(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    user = create_random_user(uow_sqlite)
+    items = [
+        item_service.create(
+            uow_sqlite,
+            obj_in=ItemCreate(title=random_lower_string()),
+            owner_id=user.id,
+        )
+        for _ in range(3)
+    ]
+    page = item_service.get_list_by_owner(
+        uow_sqlite, owner_id=user.id, skip=0, limit=10, after_id=items[0].id
+    )
+    assert [item.id for item in page] == [items[1].id, items[2].id]
+
+
+def test_update_item_writes_changed_columns_only(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    item = create_random_item(uow_sqlite)
+    with capture_statements(engine) as statements:
+        item_service.update(
+            uow_sqlite, item_id=item.id, obj_in=ItemUpdate(description="changed")
+        )
+
+    updates = [s for s in statements if s.startswith("UPDATE")]
+    assert updates == ["UPDATE item SET description=? WHERE item.id = ?"]
+
+
+def test_add_item_with_explicit_id_upserts(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    user = create_random_user(uow_sqlite)
+    item_id = create_random_item(uow_sqlite).id + 1000
+
+    for title in ("first", "second"):
+        with uow_sqlite:
+            with capture_statements(engine) as statements:
+                uow_sqlite.items.add(
+                    Item(id=item_id, title=title, description=None, owner_id=user.id)
+                )
+                uow_sqlite.session.flush()
+            assert len(statements) == 1
+            assert statements[0].startswith("INSERT INTO item")
+            uow_sqlite.commit()
+
+    stored_item = item_service.get_by_id(uow_sqlite, item_id=item_id)
+    assert stored_item
+    assert stored_item.title == "second"
+
+
+def test_create_many_items_in_chunks(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "BULK_CHUNK_SIZE", 2)
+    user = create_random_user(uow_sqlite)
+    items_in = [ItemCreate(title=random_lower_string()) for _ in range(3)]
+
+    results = item_service.create_many(uow_sqlite, items_in, owner_id=user.id)
+
+    assert [result.index for result in results] == [0, 1, 2]
+    assert {result.status for result in results} == {"created"}
+    assert [result.item.title for result in results] == [i.title for i in items_in]
+    for result in results:
+        stored_item = item_service.get_by_id(uow_sqlite, item_id=result.id)
+        assert stored_item.owner_id == user.id
+
+
+def test_import_items(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "IMPORT_CHUNK_SIZE", 2)
+    user = create_random_user(uow_sqlite)
+    lines = [
+        '{"title": "first", "description": "tab\\there"}\n',
+        "not json\n",
+        "\n",
+        '{"description": "no title"}\n',
+        '{"title": "second"}\n',
+    ]
+
+    result = item_service.import_items(uow_sqlite, lines, "ndjson", user.id)
+
+    assert (result.accepted, result.rejected) == (2, 2)
+    items = item_service.get_list_by_owner(uow_sqlite, user.id, skip=0, limit=10)
+    assert [(i.title, i.description) for i in items] == [
+        ("first", "tab\there"),
+        ("second", None),
+    ]
+    assert item_service.count(uow_sqlite, owner_id=user.id, estimated=True) == 2
+
+    csv_lines = ["title,description\r\n", '"multi\r\n', 'line",\r\n', ",x\r\n"]
+    result = item_service.import_items(uow_sqlite, csv_lines, "csv", user.id)
+
+    assert (result.accepted, result.rejected) == (1, 1)
+    items = item_service.get_list_by_owner(uow_sqlite, user.id, skip=2, limit=10)
+    assert [(i.title, i.description) for i in items] == [("multi\r\nline", None)]
+
+
+def test_import_items_stops_at_unreadable_input(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "IMPORT_CHUNK_SIZE", 2)
+    user = create_random_user(uow_sqlite)
+    # a field past the csv module's size limit
+    too_large = "x" * (csv.field_size_limit() + 1)
+    lines = ["title\n", "a\n", "b\n", ",\n", f'"{too_large}"\n', "c\n"]
+
+    with pytest.raises(item_service.ItemImportException) as exc_info:
+        item_service.import_items(uow_sqlite, lines, "csv", user.id)
+
+    # the rows read before are loaded
+    assert exc_info.value.result.dict() == {"accepted": 2, "rejected": 1}
+    items = item_service.get_list_by_owner(uow_sqlite, user.id, skip=0, limit=10)
+    assert [item.title for item in items] == ["a", "b"]
+
+
+def test_update_many_items_checks_owner(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    owner = create_random_user(uow_sqlite)
+    own_item = create_random_item(uow_sqlite, owner_id=owner.id)
+    other_item = create_random_item(uow_sqlite)
+
+    results = item_service.update_many(
+        uow_sqlite,
+        [
+            ItemBulkUpdate(id=own_item.id, title="updated"),
+            ItemBulkUpdate(id=other_item.id, title="updated"),
+            ItemBulkUpdate(id=-1, title="updated"),
+        ],
+        owner_id=owner.id,
+    )
+
+    assert [result.status for result in results] == [
+        "updated",
+        "forbidden",
+        "not_found",
+    ]
+    assert results[0].item.title == "updated"
+    assert results[0].item.description == own_item.description
+    stored_item = item_service.get_by_id(uow_sqlite, item_id=other_item.id)
+    assert stored_item.title == other_item.title
+
+
+def test_delete_many_items_checks_owner(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    owner = create_random_user(uow_sqlite)
+    own_item = create_random_item(uow_sqlite, owner_id=owner.id)
+    other_item = create_random_item(uow_sqlite)
+
+    results = item_service.delete_many(
+        uow_sqlite, [own_item.id, other_item.id, -1], owner_id=owner.id
+    )
+
+    assert [result.status for result in results] == [
+        "deleted",
+        "forbidden",
+        "not_found",
+    ]
+    assert results[0].item.id == own_item.id
+    assert item_service.get_by_id(uow_sqlite, item_id=own_item.id) is None
+    assert item_service.get_by_id(uow_sqlite, item_id=other_item.id)
+
+
+def test_search_items(uow_sqlite: unit_of_work.AbstractUnitOfWork) -> None:
+    word = random_lower_string()
+    owner = create_random_user(uow_sqlite)
+    best = item_service.create(
+        uow_sqlite,
+        obj_in=ItemCreate(title=f"{word} {word}", description=word),
+        owner_id=owner.id,
+    )
+    other = item_service.create(
+        uow_sqlite,
+        obj_in=ItemCreate(title="other", description=f"{word} and more text"),
+        owner_id=owner.id,
+    )
+    foreign = create_random_item(uow_sqlite)
+    item_service.update(uow_sqlite, foreign.id, ItemUpdate(description=word))
+
+    results = item_service.search(uow_sqlite, text=word, limit=10)
+    assert {item.id for item, _ in results} == {best.id, other.id, foreign.id}
+    assert results[0][0].id == best.id
+
+    owned = item_service.search(uow_sqlite, text=word, limit=10, owner_id=owner.id)
+    assert [item.id for item, _ in owned] == [best.id, other.id]
+
+    first_page = item_service.search(uow_sqlite, text=word, limit=1, owner_id=owner.id)
+    item, rank = first_page[0]
+    second_page = item_service.search(
+        uow_sqlite, text=word, limit=1, owner_id=owner.id, after=(rank, item.id)
+    )
+    assert [item.id for item, _ in second_page] == [other.id]
+
+    assert item_service.search(uow_sqlite, text='"', limit=10) == []
+
+
+def test_count_items(uow_sqlite: unit_of_work.AbstractUnitOfWork) -> None:
+    owner = create_random_user(uow_sqlite)
+    items = [create_random_item(uow_sqlite, owner_id=owner.id) for _ in range(3)]
+    item_service.create_many(
+        uow_sqlite, [ItemCreate(title=random_lower_string())], owner_id=owner.id
+    )
+    item_service.delete(uow_sqlite, item_id=items[0].id)
+    item_service.delete_many(uow_sqlite, [items[1].id])
+
+    assert item_service.count(uow_sqlite, owner_id=owner.id) == 2
+    assert item_service.count(uow_sqlite, owner_id=owner.id, estimated=True) == 2
+    # no planner statistics on SQLite: the total is counted exactly
+    total = item_service.count(uow_sqlite)
+    assert item_service.count(uow_sqlite, estimated=True) == total
+
+
+def test_relationships_are_not_lazy_loaded(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    item = create_random_item(uow_sqlite)
+    stored_item = item_service.get_by_id(uow_sqlite, item_id=item.id)
+
+    with pytest.raises(InvalidRequestError):
+        stored_item.owner
+
+    [loaded] = item_service.get_list_with_owner(
+        uow_sqlite, skip=0, limit=1, after_id=item.id - 1
+    )
+    assert loaded.owner.id == item.owner_id
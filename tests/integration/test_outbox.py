@@ -0,0 +1,168 @@
+from concurrent.futures import Future
+import json
+from typing import List, Tuple
+
+import pytest
+
+from src.config import settings
+from src.domain import schemas
+from src.domain.item import Item
+from src.services import (
+    item as item_service,
+    outbox as outbox_service,
+    unit_of_work,
+    user as user_service,
+)
+from tests.session import SQLITE_SESSION_FACTORY
+from tests.utils.user import create_random_user
+from tests.utils.utils import random_lower_string
+
+
+class FakePublisher:
+    """Resolves publish futures at once, failing messages containing `failing`."""
+
+    def __init__(self, failing: str = None):
+        self.failing = failing
+        self.published = []  # type: List[Tuple[str, str, dict]]
+
+    def publish(self, project_id: str, topic_id: str, data: str, **attrs) -> Future:
+        future = Future()  # type: Future
+        if self.failing and self.failing in data:
+            future.set_exception(RuntimeError("unavailable"))
+        else:
+            self.published.append((topic_id, attrs["event"], json.loads(data)))
+            future.set_result("1")
+        return future
+
+
+@pytest.fixture
+def events_topic(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork, monkeypatch: pytest.MonkeyPatch
+) -> str:
+    drain(uow_sqlite)
+    monkeypatch.setattr(settings, "EVENTS_TOPIC_ID", "events")
+    return "events"
+
+
+def drain(uow: unit_of_work.AbstractUnitOfWork) -> FakePublisher:
+    publisher = FakePublisher()
+    while outbox_service.relay_batch(uow, publisher, batch_size=100):
+        pass
+    return publisher
+
+
+def test_events_are_written_with_the_change(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork, events_topic: str
+) -> None:
+    user = create_random_user(uow_sqlite)
+    item = item_service.create(
+        uow_sqlite, schemas.ItemCreate(title=random_lower_string()), owner_id=user.id
+    )
+    with pytest.raises(RuntimeError):
+        with uow_sqlite:
+            outbox_service.record_event(uow_sqlite, "item.seen", schemas.Item, item)
+            raise RuntimeError("rolled back")
+
+    published = drain(uow_sqlite).published
+
+    assert [(topic, event) for topic, event, _ in published] == [
+        (events_topic, "user.created"),
+        (events_topic, "item.created"),
+    ]
+    assert published[0][2]["email"] == user.email
+    assert "hashed_password" not in published[0][2]
+    assert published[1][2] == {
+        "id": item.id,
+        "title": item.title,
+        "description": None,
+        "owner_id": user.id,
+    }
+
+
+def test_relay_keeps_failed_messages(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork, events_topic: str
+) -> None:
+    user = create_random_user(uow_sqlite)
+    for title in ("sent", "failing"):
+        item_service.create(
+            uow_sqlite, schemas.ItemCreate(title=title), owner_id=user.id
+        )
+
+    publisher = FakePublisher(failing="failing")
+    assert outbox_service.relay_batch(uow_sqlite, publisher, batch_size=100) == 2
+    assert [payload.get("title") for _, _, payload in publisher.published] == [
+        None,
+        "sent",
+    ]
+
+    # published by the next batch
+    published = drain(uow_sqlite).published
+    assert [payload["title"] for _, _, payload in published] == ["failing"]
+
+
+def test_no_events_without_topic(uow_sqlite: unit_of_work.AbstractUnitOfWork) -> None:
+    drain(uow_sqlite)
+    create_random_user(uow_sqlite)
+
+    assert drain(uow_sqlite).published == []
+
+
+def test_bulk_changes_record_an_event_per_item(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork, events_topic: str
+) -> None:
+    user = create_random_user(uow_sqlite)
+    drain(uow_sqlite)
+
+    created = item_service.create_many(
+        uow_sqlite,
+        [schemas.ItemCreate(title="a"), schemas.ItemCreate(title="b")],
+        user.id,
+    )
+    item_service.create_batch(uow_sqlite, [(schemas.ItemCreate(title="c"), user.id)])
+    imported = item_service.import_items(
+        uow_sqlite, ['{"title": "d"}'], "ndjson", user.id
+    )
+    item_service.update_many(
+        uow_sqlite, [schemas.ItemBulkUpdate(id=created[0].id, title="a2")]
+    )
+    item_service.delete_many(uow_sqlite, [created[1].id])
+    user_service.update_by_id(uow_sqlite, user.id, {"full_name": "Updated"})
+
+    published = drain(uow_sqlite).published
+
+    assert imported.accepted == 1
+    assert [(event, payload.get("title")) for _, event, payload in published] == [
+        ("item.created", "a"),
+        ("item.created", "b"),
+        ("item.created", "c"),
+        ("item.created", "d"),
+        ("item.updated", "a2"),
+        ("item.deleted", "b"),
+        ("user.updated", None),
+    ]
+    assert all(payload["id"] for _, _, payload in published)
+    assert published[-1][2]["full_name"] == "Updated"
+
+
+def test_import_with_events_keeps_no_items_in_memory(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+    events_topic: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "IMPORT_CHUNK_SIZE", 10)
+    user = create_random_user(uow_sqlite)
+    drain(uow_sqlite)
+    uow = unit_of_work.RequestScopedUnitOfWork(SQLITE_SESSION_FACTORY)
+    try:
+        lines = [f'{{"title": "{i}"}}\n' for i in range(100)]
+        result = item_service.import_items(uow, lines, "ndjson", user.id)
+
+        assert result.accepted == 100
+        # each chunk is let go once committed
+        assert not uow.items.modified
+        assert not uow.outbox.pending
+        assert not any(isinstance(obj, Item) for obj in uow.session)
+    finally:
+        uow.close()
+
+    assert len(drain(uow_sqlite).published) == 100
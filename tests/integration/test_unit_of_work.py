@@ -0,0 +1,153 @@
+from pathlib import Path
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+from src.adapters.orm import metadata
+from src.adapters.session import ReplicaSet
+from src.config import settings
+from src.domain.item import Item
+from src.domain.schemas.item import ItemCreate, ItemUpdate
+from src.domain.schemas.user import UserCreate
+from src.services import item as item_service, unit_of_work, user as user_service
+from tests.session import SQLITE_SESSION_FACTORY, engine
+from tests.utils.db import capture_statements
+from tests.utils.user import create_random_user
+from tests.utils.utils import random_email, random_lower_string
+
+
+def test_commit_does_not_reload_written_entities(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    user = create_random_user(uow_sqlite)
+    with capture_statements(engine) as statements:
+        item = item_service.create(
+            uow_sqlite, obj_in=ItemCreate(title="title"), owner_id=user.id
+        )
+
+    # the item + its owner's item counter
+    assert [statement.split()[0] for statement in statements] == ["INSERT", "INSERT"]
+    assert item.id
+    assert item.title == "title"
+    assert item.owner_id == user.id
+
+
+def test_commit_fills_defaults_without_reload(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    with capture_statements(engine) as statements:
+        user = user_service.create(uow_sqlite, user_data=user_in)
+
+    # lookup by email + INSERT
+    assert [statement.split()[0] for statement in statements] == ["SELECT", "INSERT"]
+    assert user.id
+    assert user.is_active is True
+    assert user.is_superuser is False
+
+
+def test_commit_with_refresh_reloads_written_entities() -> None:
+    uow = unit_of_work.SqlAlchemyUnitOfWork(
+        SQLITE_SESSION_FACTORY, refresh_on_commit=True
+    )
+    user = create_random_user(uow)
+    with capture_statements(engine) as statements:
+        item = item_service.create(
+            uow, obj_in=ItemCreate(title="title"), owner_id=user.id
+        )
+
+    assert [statement.split()[0] for statement in statements] == [
+        "INSERT",
+        "INSERT",
+        "SELECT",
+    ]
+    assert item.title == "title"
+
+
+@pytest.fixture
+def replica_engine(tmp_path: Path) -> Engine:
+    # an empty database: whatever is found there was not read from the primary
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    metadata.create_all(replica)
+    return replica
+
+
+def test_read_only_services_use_replica(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork, replica_engine: Engine
+) -> None:
+    item = item_service.create(
+        uow_sqlite,
+        obj_in=ItemCreate(title="title"),
+        owner_id=create_random_user(uow_sqlite).id,
+    )
+    uow = unit_of_work.RequestScopedUnitOfWork(
+        SQLITE_SESSION_FACTORY, replicas=ReplicaSet([replica_engine], retry_after=30)
+    )
+    try:
+        assert item_service.get_by_id(uow, item_id=item.id) is None
+
+        item_service.update(uow, item.id, ItemUpdate(title="updated"))
+
+        # read-your-writes: the primary serves the rest of the request
+        assert item_service.get_by_id(uow, item_id=item.id).title == "updated"
+    finally:
+        uow.close()
+
+
+def test_read_only_services_fall_back_to_primary(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    def refuse():
+        raise sqlite3.OperationalError("unable to open database file")
+
+    down = create_engine("sqlite://", creator=refuse)
+    replicas = ReplicaSet([down], retry_after=30)
+    item = item_service.create(
+        uow_sqlite,
+        obj_in=ItemCreate(title="title"),
+        owner_id=create_random_user(uow_sqlite).id,
+    )
+    uow = unit_of_work.SqlAlchemyUnitOfWork(SQLITE_SESSION_FACTORY, replicas=replicas)
+
+    assert item_service.get_by_id(uow, item_id=item.id).title == "title"
+    assert not replicas.is_up(down)
+
+
+def test_auth_lookups_read_the_primary(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork, replica_engine: Engine
+) -> None:
+    password = random_lower_string()
+    user = user_service.create(
+        uow_sqlite, UserCreate(email=random_email(), password=password)
+    )
+    uow = unit_of_work.SqlAlchemyUnitOfWork(
+        SQLITE_SESSION_FACTORY, replicas=ReplicaSet([replica_engine], retry_after=30)
+    )
+    user_service.principal_cache.delete(user.id)
+
+    # the empty replica stands for one lagging behind
+    assert user_service.get_principal(uow, user.id).email == user.email
+    assert user_service.authenticate(uow, user.email, password) is not None
+    assert user_service.generate_auth_token(uow, user.email, password)
+
+
+def test_request_scoped_blocks_forget_what_they_committed(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "BULK_CHUNK_SIZE", 10)
+    owner = create_random_user(uow_sqlite)
+    uow = unit_of_work.RequestScopedUnitOfWork(SQLITE_SESSION_FACTORY)
+    try:
+        results = item_service.create_many(
+            uow, [ItemCreate(title=str(i)) for i in range(100)], owner.id
+        )
+
+        assert len(results) == 100
+        assert not uow.items.modified
+        assert not uow.users.modified
+        assert not uow.committed
+        assert not any(isinstance(obj, Item) for obj in uow.session)
+    finally:
+        uow.close()
@@ -1,8 +1,11 @@
 from fastapi.encoders import jsonable_encoder
+import pytest
 
+from src.adapters.cache import RedisCache
 from src.services import unit_of_work, user as user_service
 from src.services.security import verify_password
 from src.domain.schemas.user import UserCreate, UserUpdate
+from tests.utils.cache import FakeRedis
 from tests.utils.utils import random_email, random_lower_string
 
 
@@ -95,3 +98,27 @@ def test_update_user(uow_sqlite: unit_of_work.AbstractUnitOfWork) -> None:
     assert user_2
     assert user.email == user_2.email
     assert verify_password(new_password, user_2.hashed_password)
+
+
+def test_get_principal_is_invalidated_on_update(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(
+        user_service, "principal_cache", RedisCache(FakeRedis(), ttl=60)
+    )
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = user_service.create(uow_sqlite, user_data=user_in)
+
+    principal = user_service.get_principal(uow_sqlite, user_id=user.id)
+    assert principal
+    assert principal.is_superuser is False
+    assert user_service.principal_cache.get(user.id)
+
+    user_service.update_by_id(
+        uow_sqlite, user_id=user.id, obj_in=UserUpdate(is_superuser=True)
+    )
+    assert user_service.principal_cache.get(user.id) is None
+
+    principal = user_service.get_principal(uow_sqlite, user_id=user.id)
+    assert principal
+    assert principal.is_superuser is True
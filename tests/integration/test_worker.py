@@ -0,0 +1,269 @@
+from concurrent.futures import Future
+import json
+import threading
+import time
+from typing import Dict, List, Mapping
+
+import pytest
+
+from src import worker
+from src.services import handlers, item as item_service, unit_of_work
+from src.worker import MessageBatcher, MessageCallback
+from tests.session import SQLITE_SESSION_FACTORY
+from tests.utils.item import create_random_item
+from tests.utils.user import create_random_user
+
+
+class FakeMessage:
+    def __init__(self, data: bytes, attributes: Dict[str, str] = None):
+        self.message_id = "1"
+        self.data = data
+        self.attributes = attributes or {}
+        self.delivery_attempt = None  # type: int
+        self.outcome = None  # type: str
+
+    def ack(self) -> None:
+        self.outcome = "ack"
+
+    def nack(self) -> None:
+        self.outcome = "nack"
+
+
+def test_message_callback_dispatches_by_event(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    item = create_random_item(uow_sqlite)
+    titles = []  # type: List[str]
+    uows = set()
+
+    def get_item(
+        uow: unit_of_work.AbstractUnitOfWork, data: bytes, attributes: Mapping
+    ) -> bool:
+        uows.add(uow)
+        found = item_service.get_by_id(uow, int(data))
+        if found is None:
+            return False
+        titles.append(found.title)
+        return True
+
+    def failing(*args) -> None:
+        raise RuntimeError("broken")
+
+    callback = MessageCallback(
+        lambda: unit_of_work.SqlAlchemyUnitOfWork(SQLITE_SESSION_FACTORY),
+        {"item.get": get_item, "item.fail": failing},
+    )
+    messages = [
+        FakeMessage(str(item.id).encode(), {"event": "item.get"}),
+        FakeMessage(b"-1", {"event": "item.get"}),
+        FakeMessage(b"", {"event": "item.fail"}),
+        FakeMessage(b"hello"),
+        FakeMessage(b"\xff not utf-8"),
+    ]
+    for message in messages:
+        callback(message)
+
+    assert [message.outcome for message in messages] == [
+        "ack",
+        "nack",
+        "nack",
+        "ack",
+        "ack",
+    ]
+    assert titles == [item.title]
+    assert (callback.acked, callback.nacked) == (3, 2)
+
+    # another thread gets a unit of work of its own
+    thread = threading.Thread(target=callback, args=(messages[0],))
+    thread.start()
+    thread.join()
+    assert len(uows) == 2
+
+
+def test_handler_registration() -> None:
+    @handlers.handler("test.registered")
+    def registered(*args) -> bool:
+        return False
+
+    try:
+        assert handlers.HANDLERS["test.registered"] is registered
+        assert not handlers.dispatch(None, b"", {"event": "test.registered"})
+    finally:
+        del handlers.HANDLERS["test.registered"]
+
+
+class CountingUnitOfWork(unit_of_work.SqlAlchemyUnitOfWork):
+    commits = 0
+
+    def commit(self):
+        super().commit()
+        CountingUnitOfWork.commits += 1
+
+
+def item_message(owner_id: int, title: str) -> FakeMessage:
+    data = json.dumps({"owner_id": owner_id, "title": title}).encode()
+    return FakeMessage(data, {"event": "item.create"})
+
+
+def test_message_batcher_commits_once_per_batch(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    owners = [create_random_user(uow_sqlite) for _ in range(2)]
+    CountingUnitOfWork.commits = 0
+    batcher = MessageBatcher(
+        max_messages=5,
+        max_latency=60,
+        uow_factory=lambda: CountingUnitOfWork(SQLITE_SESSION_FACTORY),
+    )
+    messages = [item_message(owners[i % 2].id, f"batched {i}") for i in range(4)]
+    messages.append(FakeMessage(b"{}", {"event": "item.create"}))
+    try:
+        for message in messages[:-1]:
+            batcher(message)
+        # held until the batch is full
+        assert {message.outcome for message in messages} == {None}
+
+        batcher(messages[-1])
+    finally:
+        batcher.close()
+
+    assert [message.outcome for message in messages] == ["ack"] * 4 + ["nack"]
+    assert CountingUnitOfWork.commits == 1
+    for owner in owners:
+        items = item_service.get_list_by_owner(uow_sqlite, owner.id, skip=0, limit=10)
+        assert len(items) == 2
+        assert item_service.count(uow_sqlite, owner.id, estimated=True) == 2
+
+
+def test_message_batcher_flushes_after_max_latency(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    owner = create_random_user(uow_sqlite)
+    batcher = MessageBatcher(
+        max_messages=100,
+        max_latency=0.05,
+        uow_factory=lambda: unit_of_work.SqlAlchemyUnitOfWork(SQLITE_SESSION_FACTORY),
+    )
+    message = item_message(owner.id, "late")
+    try:
+        batcher(message)
+        deadline = time.monotonic() + 5
+        while message.outcome is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        batcher.close()
+
+    assert message.outcome == "ack"
+
+
+def test_message_batcher_isolates_failing_messages(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    def create(uow: unit_of_work.AbstractUnitOfWork, batch: List) -> List[int]:
+        if any(data == b"poison" for data, _ in batch):
+            raise RuntimeError("constraint violated")
+        return [index for index, (data, _) in enumerate(batch) if data == b"invalid"]
+
+    class FakePublisher:
+        published = []  # type: List
+
+        def publish(self, project_id, topic_id, data, **attrs) -> Future:
+            future = Future()  # type: Future
+            future.set_result("1")
+            self.published.append((topic_id, data, attrs))
+            return future
+
+    fake_publisher = FakePublisher()
+    monkeypatch.setattr(worker, "publisher", fake_publisher)
+    batcher = MessageBatcher(
+        max_messages=4,
+        max_latency=60,
+        uow_factory=lambda: None,
+        batch_handler_map={"test.batch": create},
+        dead_letter_topic="dead-letter",
+        max_attempts=3,
+    )
+    messages = [
+        FakeMessage(data, {"event": "test.batch"})
+        for data in (b"a", b"poison", b"invalid", b"b")
+    ]
+    try:
+        for message in messages:
+            batcher(message)
+
+        # failing again at the last attempt, it's dead-lettered too
+        messages[1].delivery_attempt = 3
+        batcher.max_messages = 1
+        batcher(messages[1])
+    finally:
+        batcher.close()
+
+    # the failing message was first nacked to be retried, the rejected one
+    # is acked once published to the dead-letter topic
+    assert [message.outcome for message in messages] == ["ack"] * 4
+    assert fake_publisher.published == [
+        ("dead-letter", b"invalid", {"event": "test.batch"}),
+        ("dead-letter", b"poison", {"event": "test.batch"}),
+    ]
+    assert (batcher.acked, batcher.nacked, batcher.dead_lettered) == (2, 1, 2)
+
+
+def test_message_batcher_nacks_failing_messages_for_redelivery() -> None:
+    def create(uow: unit_of_work.AbstractUnitOfWork, batch: List) -> None:
+        raise RuntimeError("deadlock detected")
+
+    batcher = MessageBatcher(
+        max_messages=2,
+        max_latency=60,
+        uow_factory=lambda: None,
+        batch_handler_map={"test.batch": create},
+        dead_letter_topic="dead-letter",
+    )
+    messages = [FakeMessage(b"a", {"event": "test.batch"}) for _ in range(2)]
+    try:
+        for message in messages:
+            batcher(message)
+    finally:
+        batcher.close()
+
+    assert [message.outcome for message in messages] == ["nack", "nack"]
+    assert (batcher.nacked, batcher.dead_lettered) == (2, 0)
+
+
+def test_message_batcher_close_without_flush_nacks_pending() -> None:
+    handled = []  # type: List[List]
+    batcher = MessageBatcher(
+        max_messages=10,
+        max_latency=60,
+        uow_factory=lambda: None,
+        batch_handler_map={"test.batch": lambda uow, batch: handled.append(batch)},
+    )
+    pending = FakeMessage(b"a", {"event": "test.batch"})
+    batcher(pending)
+    batcher.close(flush=False)
+
+    late = FakeMessage(b"b", {"event": "test.batch"})
+    batcher(late)
+
+    assert handled == []
+    assert (pending.outcome, late.outcome) == ("nack", "nack")
+    assert batcher.nacked == 2
+
+
+def test_message_callback_runs_batch_handlers_one_by_one(
+    uow_sqlite: unit_of_work.AbstractUnitOfWork,
+) -> None:
+    owner = create_random_user(uow_sqlite)
+    callback = MessageCallback(
+        lambda: unit_of_work.SqlAlchemyUnitOfWork(SQLITE_SESSION_FACTORY)
+    )
+    messages = [
+        item_message(owner.id, "unbatched"),
+        FakeMessage(b"{}", {"event": "item.create"}),
+    ]
+    for message in messages:
+        callback(message)
+
+    assert [message.outcome for message in messages] == ["ack", "nack"]
+    items = item_service.get_list_by_owner(uow_sqlite, owner.id, skip=0, limit=10)
+    assert [item.title for item in items] == ["unbatched"]
@@ -6,6 +6,7 @@ from sqlalchemy.orm import sessionmaker
 
 from src.adapters.init_db import init_db
 from src.adapters.orm import metadata, start_mappers
+from src.adapters.session import instrument_engine
 from src.services import unit_of_work
 
 
@@ -16,10 +17,17 @@ from src.services import unit_of_work
 
 
 def creator():
-    return sqlite3.connect("file::memory:?cache=shared", uri=True)
+    # a request-scoped session may be used from several threadpool threads
+    return sqlite3.connect(
+        "file::memory:?cache=shared", uri=True, check_same_thread=False
+    )
 
 
-engine = create_engine("sqlite://", creator=creator)
+# a connection per thread (SingletonThreadPool); past pool_size the pool closes
+# connections of other, possibly live, threads
+engine = instrument_engine(
+    create_engine("sqlite://", creator=creator, pool_size=100)
+)
 metadata.create_all(engine)
 SQLITE_SESSION_FACTORY = sessionmaker(bind=engine)
 
@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+from jose import jwt
+import pytest
+
+from src.adapters.cache import LRUCache, RedisCache
+from src.config import Settings
+from src.services import security
+from tests.utils.cache import FakeRedis
+
+
+class FakeTimer:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_lru_cache_evicts_least_recently_used() -> None:
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_lru_cache_entry_expires_after_ttl() -> None:
+    timer = FakeTimer()
+    cache = LRUCache(maxsize=10, ttl=60, timer=timer)
+    cache.set("a", 1)
+    timer.now += 59
+    assert cache.get("a") == 1
+    timer.now += 1
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_lru_cache_entry_never_outlives_expires_at() -> None:
+    timer = FakeTimer()
+    cache = LRUCache(maxsize=10, ttl=60, timer=timer)
+    cache.set("a", 1, expires_at=timer.now + 5)
+    timer.now += 5
+    assert cache.get("a") is None
+
+
+def test_lru_cache_disabled() -> None:
+    cache = LRUCache(maxsize=0, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_decode_access_token_is_cached(monkeypatch: pytest.MonkeyPatch) -> None:
+    token = security.create_access_token(42, expires_delta=timedelta(minutes=5))
+    assert security.decode_access_token(token).sub == 42
+
+    def fail(*args, **kwargs):  # type: ignore
+        raise AssertionError("signature must not be verified again")
+
+    monkeypatch.setattr(security.jwt, "decode", fail)
+    assert security.decode_access_token(token).sub == 42
+
+
+def test_decode_access_token_does_not_cache_invalid_tokens() -> None:
+    with pytest.raises(jwt.JWTError):
+        security.decode_access_token("not-a-token")
+    assert security.token_cache.get("not-a-token") is None
+
+
+def test_redis_cache_round_trip() -> None:
+    client = FakeRedis()
+    cache = RedisCache(client, ttl=60, prefix="p:")
+    cache.set(1, {"id": 1, "is_active": True})
+    assert client.ttls["p:1"] == 60
+    assert cache.get(1) == {"id": 1, "is_active": True}
+    cache.delete(1)
+    assert cache.get(1) is None
+
+
+def test_principal_cache_is_shared_by_default_with_redis() -> None:
+    assert Settings().PRINCIPAL_CACHE_BACKEND == "memory"
+    assert Settings(REDIS_URL="redis://cache").PRINCIPAL_CACHE_BACKEND == "redis"
+    assert (
+        Settings(REDIS_URL="redis://cache", PRINCIPAL_CACHE_BACKEND="none")
+        .PRINCIPAL_CACHE_BACKEND
+        == "none"
+    )
@@ -0,0 +1,86 @@
+import asyncio
+from concurrent.futures import Future
+from typing import Any, List, Tuple
+
+from google.cloud import pubsub_v1
+
+from src.adapters.publisher import Publisher
+
+
+class FakeClient:
+    """Stands for PublisherClient, publish futures are resolved by the test."""
+
+    instances = []  # type: List[FakeClient]
+
+    def __init__(self, **kwargs: Any):
+        self.kwargs = kwargs
+        self.published = []  # type: List[Tuple[str, bytes, Future]]
+        self.stopped = False
+        FakeClient.instances.append(self)
+
+    @staticmethod
+    def topic_path(project_id: str, topic_id: str) -> str:
+        return f"projects/{project_id}/topics/{topic_id}"
+
+    def publish(self, topic: str, data: bytes, **attrs: str) -> Future:
+        future = Future()  # type: Future
+        self.published.append((topic, data, future))
+        return future
+
+    def stop(self) -> None:
+        self.stopped = True
+
+
+def create_publisher() -> Publisher:
+    FakeClient.instances.clear()
+    return Publisher(
+        batch_settings=pubsub_v1.types.BatchSettings(max_messages=10),
+        flow_control=pubsub_v1.types.PublishFlowControl(message_limit=100),
+        client_factory=FakeClient,
+    )
+
+
+def test_publisher_shares_one_client() -> None:
+    publisher = create_publisher()
+
+    first = publisher.publish("project", "topic", "one")
+    second = publisher.publish("project", "topic", b"two")
+
+    assert len(FakeClient.instances) == 1
+    client = FakeClient.instances[0]
+    assert client.kwargs["batch_settings"].max_messages == 10
+    assert client.kwargs["publisher_options"].flow_control.message_limit == 100
+    assert [(topic, data) for topic, data, _ in client.published] == [
+        ("projects/project/topics/topic", b"one"),
+        ("projects/project/topics/topic", b"two"),
+    ]
+    # handed back before the client resolves them
+    assert not first.done() and not second.done()
+    assert publisher.stats() == {"pending": 2, "published": 0, "failed": 0}
+
+    publisher.stop()
+    assert client.stopped
+
+
+def test_publisher_counts_outcomes_from_callbacks() -> None:
+    publisher = create_publisher()
+    ok = publisher.publish("project", "topic", "ok")
+    failing = publisher.publish("project", "topic", "failing")
+
+    ok.set_result("1")
+    failing.set_exception(RuntimeError("unavailable"))
+
+    assert publisher.stats() == {"pending": 0, "published": 1, "failed": 1}
+
+
+def test_publish_async() -> None:
+    publisher = create_publisher()
+
+    async def scenario() -> str:
+        awaitable = await publisher.publish_async("project", "topic", "async")
+        _, _, future = FakeClient.instances[0].published[0]
+        future.set_result("42")
+        return await awaitable
+
+    assert asyncio.run(scenario()) == "42"
+    assert publisher.stats()["published"] == 1
@@ -0,0 +1,130 @@
+import time
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from src.adapters.session import (
+    DeadlineExceeded,
+    QueryStats,
+    SlowQueryLog,
+    _explain,
+    collect_query_stats,
+    db_deadline,
+    instrument_engine,
+    slow_query_log,
+)
+
+
+def test_query_stats_flags_repeated_statements() -> None:
+    stats = QueryStats()
+    for i in range(3):
+        stats.record("SELECT * FROM item WHERE id = ?", 0.001)
+    stats.record("SELECT * FROM user", 0.005)
+
+    assert stats.count == 4
+    assert stats.slowest_statement == "SELECT * FROM user"
+    assert stats.repeated(2) == [("SELECT * FROM item WHERE id = ?", 3)]
+    assert stats.repeated(3) == []
+    assert stats.repeated(0) == []
+
+
+def test_collect_query_stats() -> None:
+    engine = instrument_engine(create_engine("sqlite://"))
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        with collect_query_stats() as stats:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 2"))
+
+    assert stats.count == 2
+    assert stats.total_time > 0
+
+
+def test_slow_query_log_keeps_latest_with_plan(monkeypatch: pytest.MonkeyPatch) -> None:
+    log = SlowQueryLog(threshold=1e-9, maxlen=2)
+    monkeypatch.setattr("src.adapters.session.slow_query_log", log)
+    engine = instrument_engine(create_engine("sqlite://"))
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)"))
+        connection.execute(text("SELECT * FROM t WHERE id = :id"), {"id": 1})
+        connection.execute(text("SELECT * FROM t WHERE name = :name"), {"name": "a"})
+
+    entries = log.entries()
+    assert len(entries) == 2
+    assert entries[0]["statement"] == "SELECT * FROM t WHERE name = ?"
+    assert entries[0]["parameters"] == ["str"]
+    assert any("SCAN" in line for line in entries[0]["plan"])
+    assert any("SEARCH" in line for line in entries[1]["plan"])
+
+
+def test_slow_query_log_disabled_by_default() -> None:
+    assert not slow_query_log.enabled
+
+
+def test_db_deadline_interrupts_sqlite_statement() -> None:
+    engine = instrument_engine(create_engine("sqlite://"))
+    slow = text(
+        "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c "
+        "LIMIT 100000000) SELECT count(*) FROM c"
+    )
+
+    with engine.connect() as conn:
+        with db_deadline(0.05):
+            with pytest.raises(DeadlineExceeded):
+                conn.execute(slow)
+
+        # 0 sets no deadline
+        with db_deadline(0):
+            assert conn.execute(text("SELECT 2")).scalar() == 2
+
+
+def test_db_deadline_stops_statements_starting_after_it() -> None:
+    engine = instrument_engine(create_engine("sqlite://"))
+
+    with engine.connect() as conn:
+        with db_deadline(0.01):
+            assert conn.execute(text("SELECT 1")).scalar() == 1
+            time.sleep(0.02)
+            with pytest.raises(DeadlineExceeded):
+                conn.execute(text("SELECT 2"))
+
+        assert not conn.info["query_start_time"]
+
+
+class RecordingCursor:
+    def __init__(self, executed: List[str]):
+        self.executed = executed
+
+    def execute(self, statement: str, parameters=None) -> None:
+        self.executed.append(statement)
+
+    def fetchall(self) -> List[tuple]:
+        return [("Seq Scan on item",)]
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.mark.parametrize(
+    "statement, prefix",
+    [
+        ("SELECT * FROM item", "EXPLAIN (ANALYZE, BUFFERS) "),
+        ("WITH d AS (DELETE FROM item RETURNING id) SELECT * FROM d", "EXPLAIN "),
+    ],
+)
+def test_explain_never_keeps_what_analyze_ran(statement: str, prefix: str) -> None:
+    executed = []  # type: List[str]
+    conn = SimpleNamespace(
+        dialect=SimpleNamespace(name="postgresql"),
+        connection=SimpleNamespace(cursor=lambda: RecordingCursor(executed)),
+    )
+
+    assert _explain(conn, statement, {}) == ["Seq Scan on item"]
+    assert executed == [
+        "SAVEPOINT slow_query_explain",
+        prefix + statement,
+        "ROLLBACK TO SAVEPOINT slow_query_explain",
+        "RELEASE SAVEPOINT slow_query_explain",
+    ]
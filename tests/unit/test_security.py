@@ -0,0 +1,28 @@
+import asyncio
+
+from src.services import security
+
+
+def test_hashing_executor_runs_in_process_pool() -> None:
+    executor = security.HashingExecutor(max_workers=1, max_pending=2)
+    try:
+        hashed = executor.submit(security._hash, "secret").result()
+        assert executor.submit(security._verify, "secret", hashed).result()
+        assert not executor.submit(security._verify, "wrong", hashed).result()
+    finally:
+        # waits for the done callbacks too, `result` returns before they ran
+        executor.shutdown()
+
+    stats = executor.stats()
+    assert stats["completed"] == 3
+    assert stats["pending"] == 0
+    assert stats["queue_depth"] == 0
+    assert stats["max_latency_ms"] > 0
+
+
+def test_async_password_helpers() -> None:
+    async def run() -> bool:
+        hashed = await security.get_password_hash_async("secret")
+        return await security.verify_password_async("secret", hashed)
+
+    assert asyncio.run(run())
@@ -0,0 +1,20 @@
+from src.adapters.repository.sql import _copy_text, _copy_value
+
+
+def test_copy_value_escapes_text_format() -> None:
+    assert _copy_value(None) == "\\N"
+    assert _copy_value(3) == "3"
+    assert _copy_value("a\\b\tc\nd\re") == "a\\\\b\\tc\\nd\\re"
+    # a literal \N is data, not NULL
+    assert _copy_value("\\N") == "\\\\N"
+
+
+def test_copy_text_writes_a_line_per_row_in_column_order() -> None:
+    rows = [
+        {"owner_id": 1, "title": "tab\there", "description": None},
+        {"owner_id": 2, "title": "two\nlines", "description": "x"},
+    ]
+
+    buffer = _copy_text(rows, ["title", "description", "owner_id"])
+
+    assert buffer.read() == "tab\\there\t\\N\t1\ntwo\\nlines\tx\t2\n"
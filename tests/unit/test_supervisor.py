@@ -0,0 +1,77 @@
+import multiprocessing
+import signal
+import sys
+import threading
+import time
+from typing import Callable
+
+from src.supervisor import ChildStatus, Supervisor
+
+
+def crash_once(processes: int) -> Callable[[ChildStatus], None]:
+    """Each of the first `processes` runs acks one message and exits with an
+    error, later runs keep reporting one acked message."""
+    crashes = multiprocessing.get_context("fork").Value("i", 0)
+
+    def target(status: ChildStatus) -> None:
+        status.report(1, 0)
+        with crashes.get_lock():
+            crash = crashes.value < processes
+            crashes.value += 1
+        if crash:
+            sys.exit(1)
+
+        while True:
+            time.sleep(0.01)
+            status.report(1, 0)
+
+    return target
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_supervisor_restarts_crashed_children() -> None:
+    supervisor = Supervisor(2, crash_once(2), restart_delay=0.05, shutdown_timeout=5)
+    thread = threading.Thread(target=supervisor.run)
+    thread.start()
+    try:
+        assert wait_for(lambda: supervisor.health()["healthy"])
+    finally:
+        supervisor.stop()
+        thread.join()
+
+    health = supervisor.health()
+    assert health["processes"] == 2
+    assert health["restarts"] == 2
+    # the crashed children's acks are kept after their restart
+    assert health["acked"] == 4
+    assert [child["acked"] for child in health["children"]] == [2, 2]
+    assert health["alive"] == 0
+    assert not health["healthy"]
+
+
+def report_sigint_disposition(status: ChildStatus) -> None:
+    ignored = signal.getsignal(signal.SIGINT) == signal.SIG_IGN
+    while True:
+        status.report(int(ignored), int(not ignored))
+        time.sleep(0.01)
+
+
+def test_supervisor_children_ignore_sigint() -> None:
+    supervisor = Supervisor(1, report_sigint_disposition, shutdown_timeout=5)
+    thread = threading.Thread(target=supervisor.run)
+    thread.start()
+    try:
+        assert wait_for(lambda: supervisor.health()["healthy"])
+    finally:
+        supervisor.stop()
+        thread.join()
+
+    assert (supervisor.health()["acked"], supervisor.health()["nacked"]) == (1, 0)
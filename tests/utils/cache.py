@@ -0,0 +1,21 @@
+from typing import Dict, Optional
+
+
+class FakeRedis:
+    """Local stand-in for `redis.Redis` (expiration is only recorded)."""
+
+    def __init__(self) -> None:
+        self.data = {}  # type: Dict[str, str]
+        self.ttls = {}  # type: Dict[str, int]
+
+    def get(self, name: str) -> Optional[str]:
+        return self.data.get(name)
+
+    def set(self, name: str, value: str, ex: Optional[int] = None) -> None:
+        self.data[name] = value
+        if ex is not None:
+            self.ttls[name] = ex
+
+    def delete(self, name: str) -> None:
+        self.data.pop(name, None)
+        self.ttls.pop(name, None)
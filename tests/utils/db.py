@@ -0,0 +1,32 @@
+from contextlib import contextmanager
+import re
+from typing import Any, Iterator, List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from requests import Response
+
+
+@contextmanager
+def capture_statements(engine: Engine) -> Iterator[List[str]]:
+    """Collect SQL statements executed on the engine."""
+    statements = []  # type: List[str]
+
+    def before_cursor_execute(
+        conn: Any, cursor: Any, statement: str, *args: Any
+    ) -> None:
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def query_count(response: Response) -> int:
+    """Number of SQL statements run for the request, from `Server-Timing`."""
+    server_timing = response.headers["Server-Timing"]
+    match = re.search(r'db;[^,]*desc="(\d+) queries"', server_timing)
+    assert match, server_timing
+    return int(match.group(1))